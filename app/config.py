@@ -1,4 +1,4 @@
-from typing import ClassVar
+from typing import ClassVar, List, Literal
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
@@ -10,6 +10,13 @@ class Settings(BaseSettings):
     MONGODB_URL: str
     MONGODB_DATABASE: str
 
+    # Configuración del pool de conexiones de MongoDB
+    MONGODB_MAX_POOL_SIZE: int = 100
+    MONGODB_MIN_POOL_SIZE: int = 10
+    MONGODB_MAX_IDLE_TIME_MS: int = 300000
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = 3000
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: int = 10000
+
     # Configuración de seguridad
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
@@ -20,11 +27,102 @@ class Settings(BaseSettings):
     RABBITMQ_PORT: int
     RABBITMQ_USER: str = "guest"
     RABBITMQ_PASSWORD: str = "guest"
+    # Envío de claves de seguridad: RabbitMQ + SendGrid, o "memory" para
+    # desarrollo y pruebas de carga sin esos servicios
+    SECURITY_KEY_PUBLISHER: Literal["rabbitmq", "memory"] = "rabbitmq"
 
     # Configuración de almacenamiento de archivos
     UPLOAD_FOLDER: str
     MAX_FILE_SIZE: int = 5368709120
 
+    # Subidas por partes: tamaño de parte por defecto y límites
+    UPLOAD_PART_SIZE: int = 64 * 1024 * 1024
+    UPLOAD_MIN_PART_SIZE: int = 1024 * 1024
+    UPLOAD_MAX_PARTS: int = 10000
+    UPLOAD_SESSION_TTL_SECONDS: int = 3600  # Sin partes nuevas, la subida caduca
+    UPLOAD_INGEST_POLL_SECONDS: float = 2.0  # Espera entre comprobaciones de partes nuevas
+    UPLOAD_COMPLETE_WAIT_SECONDS: float = 300  # Tras esto, /complete responde 202 y la ingesta sigue
+
+    # Esquema de almacenamiento de variantes: una colección por archivo o una
+    # sola colección "variants" particionada por file_id
+    VARIANT_STORAGE_LAYOUT: Literal["per_collection", "consolidated"] = "per_collection"
+    # Esquema de documento: nombres completos o claves cortas con diccionarios por archivo
+    VARIANT_SCHEMA: Literal["full", "compact"] = "full"
+
+    # Cargas reanudables: cada cuántos bloques se guarda el progreso y cuánto
+    # dura la reserva de un trabajo antes de que otro proceso lo retome
+    INGEST_CHECKPOINT_INTERVAL: int = 5
+    INGEST_LEASE_SECONDS: int = 300
+    INGEST_RECOVERY_INTERVAL: int = 60
+    # Errores transitorios de MongoDB tras los que una carga se retoma desde
+    # su último checkpoint antes de darla por fallida
+    INGEST_MAX_ATTEMPTS: int = 5
+    # Inserciones con write concern w=1 sin journal durante la carga; los
+    # checkpoints siguen usando el write concern por defecto
+    INGEST_BULK_LOAD: bool = True
+
+    # Planificador de cargas: cargas simultáneas en total y por usuario, y
+    # presupuesto de disco para los archivos en UPLOAD_FOLDER (0 = sin
+    # presupuesto, solo se comprueba que quede el espacio libre mínimo)
+    INGEST_MAX_CONCURRENT: int = 4
+    INGEST_MAX_PER_USER: int = 2
+    INGEST_QUEUE_POLL_SECONDS: float = 1.0
+    INGEST_QUEUE_LEASE_SECONDS: int = 30
+    INGEST_DISK_BUDGET_BYTES: int = 0
+    INGEST_DISK_MIN_FREE_BYTES: int = 1024 * 1024 * 1024
+    # Las inserciones se pausan mientras la latencia media de búsqueda supera
+    # el objetivo (0 = sin pausas), hasta INGEST_THROTTLE_MAX_DELAY por bloque
+    SEARCH_LATENCY_TARGET_SECONDS: float = 0.5
+    SEARCH_LATENCY_PUBLISH_SECONDS: float = 1.0
+    INGEST_THROTTLE_MAX_DELAY: float = 2.0
+
+    # Índices de variantes construidos tras la carga (ver VARIANT_INDEXES en
+    # app/db/variant_store.py). info_index y format_index son opcionales: sus
+    # cadenas largas los hacen grandes y las búsquedas de texto no los usan
+    VARIANT_INDEX_SET: List[str] = [
+        "genomic_position_index",
+        "filter_status_quality_index",
+        "quality_index",
+        "id_index",
+        "allele_frequency_index",
+        "call_rate_index",
+    ]
+    INDEX_PROGRESS_INTERVAL: float = 5.0  # Segundos entre lecturas del progreso de los índices
+
+    # Teselas de densidad: series adicionales a "all" por FILTER o tipo de
+    # variante, y máximo de intervalos por respuesta de /search/density
+    DENSITY_TILE_SPLITS: List[Literal["filter", "type"]] = []
+    DENSITY_MAX_BINS: int = 10000
+
+    # Snapshots columnares de colecciones terminadas (vacío = desactivados);
+    # con SNAPSHOT_AUTO_BUILD se construyen al terminar los índices
+    SNAPSHOT_FOLDER: str = ""
+    SNAPSHOT_AUTO_BUILD: bool = False
+    SNAPSHOT_BUILD_BATCH: int = 10000
+
+    # Configuración de búsquedas
+    SEARCH_UNINDEXED_SORT_LIMIT: int = 100000  # Máximo de documentos para ordenar sin índice
+    ID_LOOKUP_MAX_IDS: int = 10000  # Identificadores por petición en /search/ids
+    ID_BLOOM_FILTER_ENABLED: bool = False
+    ID_BLOOM_FILTER_ERROR_RATE: float = 0.01
+
+    # Registro de búsquedas lentas en la colección limitada slow_queries, con
+    # el plan de explain ("executionStats" vuelve a ejecutar la consulta)
+    SLOW_QUERY_LOG_ENABLED: bool = False
+    SLOW_QUERY_THRESHOLD_SECONDS: float = 1.0
+    SLOW_QUERY_EXPLAIN_VERBOSITY: Literal["queryPlanner", "executionStats"] = "executionStats"
+    SLOW_QUERY_EXPLAIN_MAX_TIME_MS: int = 30000
+    SLOW_QUERY_LOG_BYTES: int = 64 * 1024 * 1024
+
+    # Usuarios con acceso a los endpoints de /admin
+    ADMIN_EMAILS: List[str] = []
+
+    # Configuración del servidor de producción (serve.py)
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    WEB_CONCURRENCY: int = 0  # 0 = un worker por CPU
+    GRACEFUL_TIMEOUT: int = 600  # Segundos para drenar cargas y búsquedas en curso
+
     # Configuración de SendGrid
     SENDGRID: str
     SENDGRID_EMAIL: str
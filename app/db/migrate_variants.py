@@ -0,0 +1,158 @@
+"""
+Migración de colecciones genes_* al esquema consolidado.
+
+Copia cada colección a "variants" (o "variants_compact") con su file_id
+y un _id prefijado con el nombre del archivo mediante $merge (en el servidor, sin pasar los datos por la aplicación),
+verifica el conteo,
+marca el archivo como consolidado en uploaded_files y opcionalmente
+elimina la colección original. Se puede relanzar sin duplicar datos.
+
+Los workers en marcha guardan la ubicación de cada archivo durante
+SCOPE_CACHE_TTL segundos, así que con --drop las colecciones originales
+se eliminan al final, pasado ese tiempo, y no hace falta reiniciarlos.
+
+Uso: python -m app.db.migrate_variants [--drop] [genes_xxx ...]
+"""
+import argparse
+import asyncio
+import logging
+
+from app.db.mongodb import connect_to_mongo, close_mongo_connection, get_async_database
+from app.db.variant_schema import COMPACT, FULL
+from app.db.variant_store import (
+    CONSOLIDATED,
+    SCOPE_CACHE_TTL,
+    consolidated_collection_name,
+    ensure_consolidated_indexes,
+)
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Margen sobre SCOPE_CACHE_TTL antes de eliminar las colecciones originales
+DROP_GRACE_SECONDS = 5
+
+
+async def migrate_collection(database, collection_name: str, schema: str = FULL) -> bool:
+    source = database[collection_name]
+    target = consolidated_collection_name(schema)
+    source_count = await source.count_documents({})
+
+    # En la colección consolidada el _id lleva el nombre del archivo delante,
+    # con el mismo formato que VariantScope.record_id para los _id numéricos
+    id_text = {"$toString": "$_id"}
+    padded_id = {
+        "$substrCP": [
+            {"$concat": ["000000000000", id_text]},
+            {"$strLenCP": id_text},
+            12,
+        ]
+    }
+    pipeline = [
+        {
+            "$addFields": {
+                "file_id": collection_name,
+                "_id": {
+                    "$concat": [
+                        f"{collection_name}:",
+                        {"$cond": [{"$isNumber": "$_id"}, padded_id, id_text]},
+                    ]
+                },
+            }
+        },
+        {
+            "$merge": {
+                "into": target,
+                "on": "_id",
+                "whenMatched": "keepExisting",
+                "whenNotMatched": "insert",
+            }
+        },
+    ]
+    await source.aggregate(pipeline).to_list(length=None)
+
+    migrated = await database[target].count_documents(
+        {"file_id": collection_name}
+    )
+    if migrated != source_count:
+        logger.error(
+            f"{collection_name}: {migrated} de {source_count} documentos migrados; "
+            "se conserva la colección original"
+        )
+        return False
+
+    await database.uploaded_files.update_one(
+        {"collection_name": collection_name},
+        {"$set": {"storage_layout": CONSOLIDATED}},
+    )
+    logger.info(f"{collection_name}: {migrated} documentos migrados")
+    return True
+
+
+async def migrate(collection_names=None, drop: bool = False):
+    await connect_to_mongo()
+    try:
+        database = get_async_database()
+        for schema in (FULL, COMPACT):
+            await ensure_consolidated_indexes(database, schema)
+
+        query = {"storage_layout": {"$ne": CONSOLIDATED}}
+        if collection_names:
+            query["collection_name"] = {"$in": list(collection_names)}
+        records = await database.uploaded_files.find(
+            query, {"collection_name": 1, "variant_schema": 1}
+        ).to_list(length=None)
+
+        failed, migrated = [], []
+        for record in records:
+            schema = record.get("variant_schema", FULL)
+            if await migrate_collection(database, record["collection_name"], schema):
+                migrated.append(record["collection_name"])
+            else:
+                failed.append(record["collection_name"])
+
+        if drop:
+            # También las ya migradas en una ejecución anterior sin --drop
+            query = {"storage_layout": CONSOLIDATED}
+            if collection_names:
+                query["collection_name"] = {"$in": list(collection_names)}
+            existing = set(await database.list_collection_names())
+            async for record in database.uploaded_files.find(query, {"collection_name": 1}):
+                name = record["collection_name"]
+                if name in existing and name not in migrated:
+                    migrated.append(name)
+
+        if drop and migrated:
+            # Hasta que caduque su caché, los workers siguen buscando en las
+            # colecciones originales
+            wait = SCOPE_CACHE_TTL + DROP_GRACE_SECONDS
+            logger.info(f"Esperando {wait} s antes de eliminar las colecciones originales")
+            await asyncio.sleep(wait)
+            for collection_name in migrated:
+                await database[collection_name].drop()
+                logger.info(f"{collection_name}: colección original eliminada")
+        return failed
+    finally:
+        await close_mongo_connection()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Migrar colecciones genes_* a la colección consolidada de variantes"
+    )
+    parser.add_argument("collections", nargs="*", help="Colecciones a migrar (todas por defecto)")
+    parser.add_argument(
+        "--drop",
+        action="store_true",
+        help="Eliminar las colecciones originales al terminar la migración",
+    )
+    args = parser.parse_args()
+
+    failed = asyncio.run(migrate(args.collections, args.drop))
+    if failed:
+        raise SystemExit(f"Fallaron: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,162 @@
+import asyncio
+import logging
+import threading
+import time
+
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import MongoClient
+from pymongo import monitoring
 from app.config import settings
 
+logger = logging.getLogger(__name__)
 
-# Cliente asíncrono para operaciones no bloqueantes
-class AsyncMongoDB:
-    client: AsyncIOMotorClient = None
-    db = None
 
+class PoolStatsListener(monitoring.ConnectionPoolListener):
+    """Acumula estadísticas del pool de conexiones para planificación de capacidad."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.open_connections = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.total_created = 0
+        self.total_checkouts = 0
+        self.checkout_failures = 0
+        self.pool_clears = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.pool_clears += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self.total_created += 1
+            self.open_connections += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open_connections -= 1
 
-# Cliente síncrono para operaciones que lo requieran
-class SyncMongoDB:
-    client: MongoClient = None
+    def connection_check_out_started(self, event):
+        # Motor ejecuta cada operación en un hilo, así que inicio y fin del
+        # checkout ocurren en el mismo hilo.
+        self._local.started = time.perf_counter()
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.waiting -= 1
+            self.checkout_failures += 1
+
+    def connection_checked_out(self, event):
+        wait = getattr(event, "duration", None)
+        if wait is None:
+            started = getattr(self._local, "started", None)
+            wait = time.perf_counter() - started if started is not None else 0.0
+        with self._lock:
+            self.waiting -= 1
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self.total_checkouts += 1
+            self.total_wait_seconds += wait
+            self.max_wait_seconds = max(self.max_wait_seconds, wait)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            avg_wait = (
+                self.total_wait_seconds / self.total_checkouts
+                if self.total_checkouts
+                else 0.0
+            )
+            return {
+                "open_connections": self.open_connections,
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "waiting": self.waiting,
+                "max_waiting": self.max_waiting,
+                "total_created": self.total_created,
+                "total_checkouts": self.total_checkouts,
+                "checkout_failures": self.checkout_failures,
+                "pool_clears": self.pool_clears,
+                "avg_wait_ms": avg_wait * 1000,
+                "max_wait_ms": self.max_wait_seconds * 1000,
+            }
+
+
+# Cliente asíncrono compartido por todos los servicios
+class AsyncMongoDB:
+    client: AsyncIOMotorClient = None
     db = None
+    pool_stats: PoolStatsListener = None
 
 
 async def connect_to_mongo():
-    # Configuración para conexión asíncrona
-    AsyncMongoDB.client = AsyncIOMotorClient(settings.MONGODB_URL)
+    """Crear el cliente compartido y precalentar el pool de conexiones"""
+    if AsyncMongoDB.client is not None:
+        return
+
+    AsyncMongoDB.pool_stats = PoolStatsListener()
+    AsyncMongoDB.client = AsyncIOMotorClient(
+        settings.MONGODB_URL,
+        maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+        minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+        maxIdleTimeMS=settings.MONGODB_MAX_IDLE_TIME_MS,
+        serverSelectionTimeoutMS=settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+        waitQueueTimeoutMS=settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+        retryWrites=True,
+        event_listeners=[AsyncMongoDB.pool_stats],
+    )
     AsyncMongoDB.db = AsyncMongoDB.client[settings.MONGODB_DATABASE]
-    AsyncMongoDB.db.max_pool_size = 15000
-    AsyncMongoDB.db.max_idle_time_ms = 3000
-    AsyncMongoDB.db.server_selection_timeout_ms = 3000
-    AsyncMongoDB.db.retry_writes = True
+
+    # Abrir las conexiones mínimas en paralelo para que las primeras
+    # peticiones no paguen el handshake
+    start = time.perf_counter()
+    warm_up = max(settings.MONGODB_MIN_POOL_SIZE, 1)
+    await asyncio.gather(
+        *(AsyncMongoDB.client.admin.command("ping") for _ in range(warm_up))
+    )
+    logger.info(
+        f"Conexión a MongoDB lista ({warm_up} conexiones precalentadas "
+        f"en {(time.perf_counter() - start) * 1000:.1f} ms)"
+    )
+
 
 async def close_mongo_connection():
-    AsyncMongoDB.client.close()
-    SyncMongoDB.client.close()
+    if AsyncMongoDB.client is not None:
+        AsyncMongoDB.client.close()
+    AsyncMongoDB.client = None
+    AsyncMongoDB.db = None
 
 
 def get_async_database():
     return AsyncMongoDB.db
 
+
+def get_pool_stats() -> dict:
+    """Estadísticas actuales del pool junto con su configuración"""
+    stats = AsyncMongoDB.pool_stats.snapshot() if AsyncMongoDB.pool_stats else {}
+    stats["max_pool_size"] = settings.MONGODB_MAX_POOL_SIZE
+    stats["min_pool_size"] = settings.MONGODB_MIN_POOL_SIZE
+    return stats
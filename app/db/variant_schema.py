@@ -0,0 +1,226 @@
+import re
+from typing import Dict, List, Optional
+
+# Esquemas de documento de variantes
+FULL = "full"  # Nombres de campo completos y cadenas repetidas en cada documento
+COMPACT = "compact"  # Claves cortas y diccionarios por archivo
+
+# Claves cortas del esquema compacto
+COMPACT_KEYS = {
+    "chromosome": "c",
+    "position": "p",
+    "id": "i",
+    "reference": "r",
+    "alternate": "a",
+    "quality": "q",
+    "filter_status": "f",
+    "info": "n",
+    "format": "t",
+    "outputs": "o",
+    "allele_count": "ac",
+    "allele_number": "an",
+    "allele_frequency": "af",
+    "het_count": "he",
+    "hom_alt_count": "ho",
+    "missing_count": "mi",
+    "call_rate": "cr",
+}
+LOGICAL_KEYS = {short: name for name, short in COMPACT_KEYS.items()}
+
+# Campos con pocos valores distintos por archivo, guardados como códigos enteros
+DICTIONARY_FIELDS = ("chromosome", "filter_status", "format")
+
+COMPARISONS = {
+    "$ne": lambda value, arg: value != arg,
+    "$gt": lambda value, arg: value > arg,
+    "$gte": lambda value, arg: value >= arg,
+    "$lt": lambda value, arg: value < arg,
+    "$lte": lambda value, arg: value <= arg,
+    "$in": lambda value, arg: value in arg,
+    "$nin": lambda value, arg: value not in arg,
+}
+
+
+class VariantDictionaries:
+    """Diccionarios por archivo: código entero -> cadena, y nombres de muestras."""
+
+    def __init__(self, values: Optional[Dict[str, List[str]]] = None, samples=None):
+        self.values = {
+            field: list((values or {}).get(field, [])) for field in DICTIONARY_FIELDS
+        }
+        self.codes = {
+            field: {value: code for code, value in enumerate(self.values[field])}
+            for field in DICTIONARY_FIELDS
+        }
+        self.samples = list(samples) if samples is not None else None
+
+    def encode(self, field: str, value: str) -> int:
+        """Código del valor, asignando uno nuevo si no existe"""
+        codes = self.codes[field]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self.values[field])
+            self.values[field].append(value)
+        return code
+
+    def decode(self, field: str, code: int) -> str:
+        return self.values[field][code]
+
+    def ranked_codes(self, field: str) -> List[int]:
+        """Códigos ordenados por su valor, como MongoDB ordena las cadenas"""
+        values = self.values[field]
+        return sorted(
+            range(len(values)),
+            key=lambda code: (values[code] is not None, values[code] or ""),
+        )
+
+    def matching_codes(self, field: str, condition) -> List[int]:
+        """Códigos cuyos valores cumplen una condición de consulta de MongoDB"""
+        return [
+            code
+            for code, value in enumerate(self.values[field])
+            if _value_matches(value, condition)
+        ]
+
+    def to_dict(self) -> dict:
+        return {"values": self.values, "samples": self.samples}
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "VariantDictionaries":
+        data = data or {}
+        return cls(data.get("values"), data.get("samples"))
+
+
+def _value_matches(value: str, condition) -> bool:
+    if not isinstance(condition, dict):
+        return value == condition
+    for operator, argument in condition.items():
+        if operator == "$options":
+            continue
+        if operator == "$regex":
+            flags = re.IGNORECASE if "i" in condition.get("$options", "") else 0
+            if not re.search(argument, value, flags):
+                return False
+        elif operator in COMPARISONS:
+            if not COMPARISONS[operator](value, argument):
+                return False
+        else:
+            raise ValueError(f"Operador no soportado en el esquema compacto: {operator}")
+    return True
+
+
+class VariantCodec:
+    """
+    Traduce documentos, consultas y órdenes entre los nombres lógicos de
+    los campos y el esquema físico de la colección.
+
+    En el esquema compacto las condiciones sobre campos de diccionario se
+    evalúan contra el diccionario del archivo y se convierten en un $in de
+    códigos. Ordenar por uno de esos campos necesita un campo auxiliar con
+    el rango del código: los códigos siguen el orden de aparición en el
+    archivo, no el de los valores.
+    """
+
+    def __init__(self, schema: str = FULL, dictionaries: VariantDictionaries = None):
+        self.schema = schema
+        self.dictionaries = dictionaries or VariantDictionaries()
+
+    @property
+    def compact(self) -> bool:
+        return self.schema == COMPACT
+
+    def field(self, name: str) -> str:
+        if not self.compact:
+            return name
+        return COMPACT_KEYS.get(name, name)
+
+    def logical(self, key: str) -> str:
+        if not self.compact:
+            return key
+        return LOGICAL_KEYS.get(key, key)
+
+    def encode_document(self, doc: dict) -> dict:
+        if not self.compact:
+            return doc
+        dictionaries = self.dictionaries
+        encoded = {}
+        for name, value in doc.items():
+            if name in DICTIONARY_FIELDS:
+                value = dictionaries.encode(name, value)
+            elif name == "outputs":
+                # Las muestras son las mismas en todo el archivo: guardar solo los valores
+                if dictionaries.samples is None:
+                    dictionaries.samples = list(value)
+                value = list(value.values())
+            elif value is None:
+                continue
+            encoded[COMPACT_KEYS.get(name, name)] = value
+        return encoded
+
+    def decode_document(self, doc: dict) -> dict:
+        if not self.compact:
+            return doc
+        dictionaries = self.dictionaries
+        decoded = {}
+        for key, value in doc.items():
+            name = LOGICAL_KEYS.get(key, key)
+            if name in DICTIONARY_FIELDS:
+                value = dictionaries.decode(name, value)
+            elif name == "outputs":
+                value = dict(zip(dictionaries.samples or [], value))
+            decoded[name] = value
+        return decoded
+
+    def translate_query(self, query):
+        """Traducir un filtro de MongoDB escrito con nombres lógicos"""
+        if not self.compact:
+            return query
+        if isinstance(query, list):
+            return [self.translate_query(item) for item in query]
+        if not isinstance(query, dict):
+            return query
+
+        translated = {}
+        for key, condition in query.items():
+            if key.startswith("$"):
+                translated[key] = self.translate_query(condition)
+            elif key in DICTIONARY_FIELDS:
+                translated[self.field(key)] = {
+                    "$in": self.dictionaries.matching_codes(key, condition)
+                }
+            else:
+                translated[self.field(key)] = condition
+        return translated
+
+    def translate_keys(self, keys):
+        """Traducir una lista de (campo, dirección) para orden o índices"""
+        return [(self.field(name), direction) for name, direction in keys]
+
+    def dictionary_sort(self, sort) -> bool:
+        """Si un orden ya traducido incluye campos de diccionario"""
+        return self.compact and any(
+            self.logical(key) in DICTIONARY_FIELDS for key, _ in sort
+        )
+
+    def sort_stages(self, sort) -> List[dict]:
+        """
+        Etapas de aggregate que ordenan por valor un orden ya traducido.
+        Los campos de diccionario se sustituyen por el rango de su código
+        en el diccionario ordenado, que $project descarta después.
+        """
+        if not self.dictionary_sort(sort):
+            return [{"$sort": dict(sort)}]
+        ranks, keys = {}, {}
+        for key, direction in sort:
+            name = self.logical(key)
+            if name in DICTIONARY_FIELDS:
+                rank_key = f"_{key}_rank"
+                ranks[rank_key] = {
+                    "$indexOfArray": [self.dictionaries.ranked_codes(name), f"${key}"]
+                }
+                key = rank_key
+            keys[key] = direction
+        return [{"$addFields": ranks}, {"$sort": keys}]
+
+    def translate_projection(self, projection: dict) -> dict:
+        return {self.field(name): value for name, value in projection.items()}
@@ -0,0 +1,176 @@
+import time
+from dataclasses import dataclass
+from typing import List, Tuple
+
+from bson import ObjectId
+from pymongo import IndexModel
+
+from app.config import settings
+from app.db.variant_schema import FULL, COMPACT, VariantCodec, VariantDictionaries
+
+# Esquemas de almacenamiento de variantes
+PER_COLLECTION = "per_collection"  # Una colección genes_* por archivo
+CONSOLIDATED = "consolidated"  # Una sola colección particionada por file_id
+
+VARIANTS_COLLECTION = "variants"
+# Los documentos compactos van aparte para no mezclar claves en los índices
+COMPACT_VARIANTS_COLLECTION = "variants_compact"
+
+# Estado de los índices de un archivo en uploaded_files
+INDEXES_BUILDING = "building"
+INDEXES_READY = "ready"
+INDEXES_FAILED = "failed"
+
+# Índices de variantes disponibles (en el esquema consolidado se anteponen con
+# file_id); settings.VARIANT_INDEX_SET elige cuáles se construyen. La
+# comparación usa genomic_position_index y el filtro de Bloom, id_index
+VARIANT_INDEXES: List[Tuple[str, List[Tuple[str, int]]]] = [
+    (
+        "genomic_position_index",
+        [("chromosome", 1), ("position", 1), ("reference", 1), ("alternate", 1)],
+    ),
+    ("filter_status_quality_index", [("filter_status", 1), ("quality", 1)]),
+    ("quality_index", [("quality", 1)]),
+    ("id_index", [("id", 1)]),
+    ("info_index", [("info", 1)]),
+    ("format_index", [("format", 1)]),
+    ("allele_frequency_index", [("allele_frequency", 1)]),
+    ("call_rate_index", [("call_rate", 1)]),
+]
+
+# El esquema de una colección solo cambia al migrarla
+SCOPE_CACHE_TTL = 60
+_SCOPE_CACHE = {}
+
+
+def new_collection_name() -> str:
+    """Nombre único para un archivo nuevo, aunque dos lleguen en el mismo segundo"""
+    return f"genes_{ObjectId()}"
+
+
+def consolidated_collection_name(schema: str) -> str:
+    return COMPACT_VARIANTS_COLLECTION if schema == COMPACT else VARIANTS_COLLECTION
+
+
+def index_models(layout: str, schema: str = FULL, names=None) -> List[IndexModel]:
+    """Índices a construir, por defecto los de settings.VARIANT_INDEX_SET"""
+    codec = VariantCodec(schema)
+    names = settings.VARIANT_INDEX_SET if names is None else names
+    prefix = [("file_id", 1)] if layout == CONSOLIDATED else []
+    return [
+        IndexModel(prefix + codec.translate_keys(keys), name=name)
+        for name, keys in VARIANT_INDEXES
+        if name in names
+    ]
+
+
+@dataclass
+class VariantScope:
+    """Ubicación de las variantes de un archivo subido."""
+
+    name: str
+    layout: str
+    collection: object
+    codec: VariantCodec
+    total_genes: int = None
+    # False mientras se construyen los índices tras la carga
+    indexes_ready: bool = True
+
+    @property
+    def base_filter(self) -> dict:
+        if self.layout == CONSOLIDATED:
+            return {"file_id": self.name}
+        return {}
+
+    def match(self, query: dict) -> dict:
+        """Restringir una consulta a las variantes de este archivo"""
+        if self.layout != CONSOLIDATED:
+            return query
+        if not query:
+            return self.base_filter
+        return {"$and": [self.base_filter, query]}
+
+    def record_id(self, seq: int):
+        """
+        _id determinista del registro número seq del archivo, para que
+        reintentar un bloque tras una caída no duplique variantes
+        """
+        if self.layout == CONSOLIDATED:
+            return f"{self.name}:{seq:012d}"
+        return seq
+
+    def prepare(self, doc: dict, seq: int = None) -> dict:
+        """Documento listo para insertar"""
+        doc = self.codec.encode_document(doc)
+        if seq is not None:
+            doc["_id"] = self.record_id(seq)
+        if self.layout == CONSOLIDATED:
+            doc["file_id"] = self.name
+        return doc
+
+    async def document_count(self) -> int:
+        if self.layout == CONSOLIDATED:
+            if self.total_genes is not None:
+                return self.total_genes
+            return await self.collection.count_documents(self.base_filter)
+        return await self.collection.estimated_document_count()
+
+
+def new_scope(
+    database,
+    collection_name: str,
+    layout: str = None,
+    schema: str = None,
+    dictionaries: VariantDictionaries = None,
+) -> VariantScope:
+    layout = layout or settings.VARIANT_STORAGE_LAYOUT
+    schema = schema or settings.VARIANT_SCHEMA
+    if layout == CONSOLIDATED:
+        collection = database[consolidated_collection_name(schema)]
+    else:
+        collection = database[collection_name]
+    return VariantScope(
+        collection_name, layout, collection, VariantCodec(schema, dictionaries)
+    )
+
+
+async def resolve_scope(database, collection_name: str) -> VariantScope:
+    """Ubicación y esquema de las variantes de un archivo según uploaded_files"""
+    cached = _SCOPE_CACHE.get(collection_name)
+    if cached and time.monotonic() - cached[0] < SCOPE_CACHE_TTL:
+        return cached[1]
+
+    record = await database.uploaded_files.find_one(
+        {"collection_name": collection_name},
+        {
+            "_id": 0,
+            "storage_layout": 1,
+            "variant_schema": 1,
+            "dictionaries": 1,
+            "total_genes": 1,
+            "index_status": 1,
+        },
+    )
+    # Los archivos anteriores a estas opciones no registran esquema ni diccionarios
+    record = record or {}
+    scope = new_scope(
+        database,
+        collection_name,
+        record.get("storage_layout", PER_COLLECTION),
+        record.get("variant_schema", FULL),
+        VariantDictionaries.from_dict(record.get("dictionaries")),
+    )
+    scope.total_genes = record.get("total_genes")
+    scope.indexes_ready = record.get("index_status", INDEXES_READY) == INDEXES_READY
+    # Mientras se construyen los índices el estado cambia pronto: no cachear
+    if record and scope.indexes_ready:
+        _SCOPE_CACHE[collection_name] = (time.monotonic(), scope)
+    return scope
+
+
+async def ensure_consolidated_indexes(database, schema: str = None):
+    """Índices de la colección consolidada, con file_id como primera clave"""
+    schema = schema or settings.VARIANT_SCHEMA
+    await database[consolidated_collection_name(schema)].create_indexes(
+        index_models(CONSOLIDATED, schema)
+    )
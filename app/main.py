@@ -1,12 +1,52 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.routes import user, gene_search, file_upload
+from app.db.mongodb import connect_to_mongo, close_mongo_connection, get_pool_stats
+from app.routes import user, gene_search, file_upload, admin
+from app.services.auth_service import auth_service
+from app.services.file_processor import FileProcessorService, cancel_background_jobs
+from app.services.ingest_scheduler import IngestSchedulerService
+from app.services.multipart_upload_service import MultipartUploadService
+from app.services.slow_query_service import SlowQueryLogService
+from app.services.variant_snapshot_service import cancel_snapshot_builds
+from app.services.variant_density_service import VariantDensityService
+from app.utils.metrics import RequestTimingMiddleware, render_metrics
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Un único cliente de MongoDB para toda la aplicación
+    await connect_to_mongo()
+    await auth_service.ensure_indexes()
+    processor = FileProcessorService()
+    await processor.ensure_indexes()
+    await MultipartUploadService().ensure_indexes()
+    await VariantDensityService().ensure_indexes()
+    await SlowQueryLogService().ensure_indexes()
+    scheduler = IngestSchedulerService()
+    await scheduler.ensure_indexes()
+    # Retomar las cargas interrumpidas por una caída o un reinicio
+    recovery = asyncio.create_task(processor.recovery_loop())
+    # Compartir la latencia de búsqueda con las cargas de los demás workers
+    latency = asyncio.create_task(scheduler.latency_loop())
+    yield
+    for task in (recovery, latency):
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    await cancel_background_jobs()
+    await cancel_snapshot_builds()
+    await close_mongo_connection()
+
 
 app = FastAPI(
     title="Gene Search Backend for Vineyard Research",
     description="Backend for searching and analyzing gene data from grape varieties",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # Configuración de CORS
@@ -18,12 +58,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Medición de la duración de cada petición
+app.add_middleware(RequestTimingMiddleware)
+
 # Incluir routers
 app.include_router(user.router, prefix="/users", tags=["users"])
 app.include_router(gene_search.router, prefix="/search", tags=["gene-search"])
 app.include_router(file_upload.router, prefix="/upload", tags=["file-upload"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
 
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to Gene Search Backend", "status": "operational"}
+
+
+@app.get("/health/db")
+async def database_health():
+    """Estadísticas del pool de conexiones de MongoDB"""
+    return get_pool_stats()
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Métricas en formato de texto de Prometheus"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
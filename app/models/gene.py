@@ -8,11 +8,39 @@ class WineType(str, Enum):
     CABERNET = "cabernet"
 
 
+class FilterOperator(str, Enum):
+    EQ = "="
+    NE = "!="
+    GT = ">"
+    GTE = ">="
+    LT = "<"
+    LTE = "<="
+    IN = "in"
+    BETWEEN = "between"
+
+
+class GenePredicate(BaseModel):
+    field: str
+    operator: FilterOperator
+    value: Any
+
+
+class CompareMode(str, Enum):
+    INTERSECTION = "intersection"
+    LEFT_ONLY = "left_only"
+    RIGHT_ONLY = "right_only"
+    DIFFERENCE = "difference"  # Variantes presentes en solo una de las dos
+
+
 class GeneSearchCriteria(BaseModel):
     search: Optional[str] = None
     format: Optional[str] = None
     sort_by: Optional[str] = None
     sort_direction: Optional[str] = Field(None, pattern="^(asc|desc)$")
+    min_allele_frequency: Optional[float] = Field(None, ge=0, le=1)
+    max_allele_frequency: Optional[float] = Field(None, ge=0, le=1)
+    min_call_rate: Optional[float] = Field(None, ge=0, le=1)
+    filters: List[GenePredicate] = []
 
 
 class GeneBase(BaseModel):
@@ -35,12 +63,21 @@ class GeneCreate(BaseModel):
     id: str
     reference: str
     alternate: str
-    quality: float
+    quality: Optional[float] = None  # QUAL "." (sin valor)
     filter_status: str
     info: str
     format: str
     outputs: Dict[str, Any]  # Almacenará las columnas variables
 
+    # Resúmenes de genotipos calculados durante la ingesta
+    allele_count: Optional[int] = None
+    allele_number: Optional[int] = None
+    allele_frequency: Optional[float] = None
+    het_count: Optional[int] = None
+    hom_alt_count: Optional[int] = None
+    missing_count: Optional[int] = None
+    call_rate: Optional[float] = None
+
 
 class GeneInDB(GeneBase):
     id: str
@@ -56,4 +93,16 @@ class GeneSearchResult(BaseModel):
     total_results: int
     page: int
     per_page: int
-    results: List[GeneCreate]
\ No newline at end of file
+    results: List[GeneCreate]
+
+
+class VariantIdLookupRequest(BaseModel):
+    collection_name: str
+    ids: List[str] = Field(..., min_length=1)
+
+
+class VariantIdLookupResult(BaseModel):
+    requested: int
+    found: int
+    missing: List[str]
+    results: List[GeneCreate]
@@ -0,0 +1,10 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+
+class UploadInitRequest(BaseModel):
+    filename: str = Field(..., min_length=1)
+    file_size: int = Field(..., gt=0, description="Tamaño total del archivo en bytes")
+    part_size: Optional[int] = Field(
+        None, gt=0, description="Tamaño de cada parte salvo la última"
+    )
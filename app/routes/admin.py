@@ -0,0 +1,70 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+
+from app.models.user import UserResponse
+from app.services.auth_service import get_admin_user
+from app.services.slow_query_service import SlowQueryLogService
+from app.services.variant_snapshot_service import VariantSnapshotService
+
+router = APIRouter()
+
+
+@router.get("/slow-queries")
+async def get_slow_queries(
+    current_user: UserResponse = Depends(get_admin_user),
+    collection_name: Optional[str] = Query(None, description="Colección consultada"),
+    min_duration_ms: float = Query(0, ge=0, description="Duración mínima en milisegundos"),
+    limit: int = Query(50, ge=1, le=500, description="Máximo de registros"),
+):
+    """
+    Búsquedas lentas más recientes con su pipeline, documentos examinados
+    frente a devueltos y plan ganador según explain.
+    - Requiere SLOW_QUERY_LOG_ENABLED y un usuario de ADMIN_EMAILS
+    """
+    return await SlowQueryLogService().recent(collection_name, min_duration_ms, limit)
+
+
+@router.get("/slow-queries/shapes")
+async def get_slow_query_shapes(
+    current_user: UserResponse = Depends(get_admin_user),
+    collection_name: Optional[str] = Query(None, description="Colección consultada"),
+):
+    """
+    Búsquedas lentas agrupadas por colección y campos de filtro y orden,
+    primero las que recorren la colección entera (COLLSCAN): indican qué
+    índices faltan.
+    """
+    return await SlowQueryLogService().shapes(collection_name)
+
+
+@router.post("/snapshots/{collection_name}", status_code=202)
+async def build_snapshot(
+    collection_name: str,
+    current_user: UserResponse = Depends(get_admin_user),
+):
+    """
+    Construye en segundo plano el snapshot columnar de una colección cuya
+    carga terminó; las búsquedas que puede resolver dejan de usar MongoDB.
+    - Requiere SNAPSHOT_FOLDER
+    """
+    return await VariantSnapshotService().start_build(collection_name)
+
+
+@router.get("/snapshots/{collection_name}")
+async def get_snapshot(
+    collection_name: str,
+    current_user: UserResponse = Depends(get_admin_user),
+):
+    """Estado del snapshot: filas, tamaño en disco y tiempo de construcción"""
+    return await VariantSnapshotService().status(collection_name)
+
+
+@router.delete("/snapshots/{collection_name}")
+async def delete_snapshot(
+    collection_name: str,
+    current_user: UserResponse = Depends(get_admin_user),
+):
+    """Elimina el snapshot; las búsquedas vuelven a MongoDB"""
+    await VariantSnapshotService().delete(collection_name)
+    return {"message": "Snapshot eliminado", "collection_name": collection_name}
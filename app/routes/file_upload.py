@@ -1,32 +1,70 @@
+import asyncio
+from typing import Optional
+
 from fastapi import (
     APIRouter,
     File,
     UploadFile,
     HTTPException,
     Depends,
+    Header,
+    Query,
+    Request,
+    Response,
 )
+from app.config import settings
+from app.models.upload import UploadInitRequest
+from app.models.user import UserResponse
+from app.services.auth_service import get_current_user, get_optional_user
 from app.services.file_processor import FileProcessorService
+from app.services.ingest_scheduler import IngestSchedulerService
+from app.services.multipart_upload_service import MultipartUploadService
 from app.db.mongodb import get_async_database
 
 router = APIRouter()
 
 
+def _uploader(request: Request, current_user: Optional[UserResponse]) -> str:
+    """Identidad para el límite de cargas por usuario: el usuario o, sin sesión, la IP"""
+    return IngestSchedulerService.user_key(
+        current_user, request.client.host if request.client else None
+    )
+
+
 @router.post("/upload")
 async def upload_file(
+    request: Request,
+    response: Response,
     file: UploadFile = File(...),
+    wait: bool = Query(
+        True, description="Esperar a que termine la carga; si es false responde 202 en cola"
+    ),
+    current_user: Optional[UserResponse] = Depends(get_optional_user),
 ):
     """
-    Endpoint para subir archivos vía CURL
+    Endpoint para subir archivos vía CURL. La carga espera turno en el
+    planificador; con wait=false se encola y se consulta en /upload/jobs o
+    /upload/status/{collection_name}.
     """
     # Obtener el tamaño del archivo
-    file_content = await file.read()
-    file_size = len(file_content)
-    await file.seek(0)  # Regresar al inicio del archivo
-    
-    
+    file_size = file.size
+
     processor = FileProcessorService()
-    result = await processor.process_file(file)
-    
+    result = await processor.process_file(
+        file, _uploader(request, current_user), wait
+    )
+
+    if result['status'] == "queued":
+        response.status_code = 202
+        return {
+            "message": "Archivo en cola para su carga",
+            "file_id": str(result['data']['file_path']),
+            "file_size": file_size,
+            "filename": file.filename,
+            "collection_name": result['data']['collection_name'],
+            "queue": result['data']['queue'],
+        }
+
     if result['status'] == "error":
         raise HTTPException(
             status_code=500,
@@ -38,10 +76,119 @@ async def upload_file(
         "file_id": str(result['data']['file_path']),
         "total_genes": result['data']['total_genes'],
         "file_size": file_size,
-        "filename": file.filename
+        "filename": file.filename,
+        "collection_name": result['data']['collection_name'],
+    }
+
+
+@router.post("/multipart", status_code=201)
+async def initiate_multipart_upload(
+    upload: UploadInitRequest,
+    request: Request,
+    current_user: UserResponse = Depends(get_current_user),
+):
+    """
+    Inicia una subida por partes. Las partes se envían con
+    PUT /upload/multipart/{upload_id}/parts/{n}, en paralelo y en cualquier
+    orden; la ingesta pide turno al planificador cuando llega la primera
+    parte y empieza con las partes contiguas.
+    - Requiere autenticación; solo el mismo usuario puede continuar la subida
+    """
+    uploader = _uploader(request, current_user)
+    uploads = MultipartUploadService()
+    session = await uploads.initiate(upload, uploader)
+    await FileProcessorService().start_upload_job(session, uploader)
+    return uploads.describe(session)
+
+
+@router.put("/multipart/{upload_id}/parts/{part_number}")
+async def upload_part(
+    upload_id: str,
+    part_number: int,
+    request: Request,
+    x_checksum_sha256: str = Header(..., description="SHA-256 de la parte en hexadecimal"),
+    current_user: UserResponse = Depends(get_current_user),
+):
+    """
+    Sube una parte; el cuerpo es el contenido binario de la parte.
+    Reintentar una parte ya aceptada con el mismo checksum no tiene efecto.
+    """
+    return await MultipartUploadService().upload_part(
+        upload_id, part_number, x_checksum_sha256, request.stream(), current_user.email
+    )
+
+
+@router.get("/multipart/{upload_id}")
+async def get_multipart_upload(
+    upload_id: str, current_user: UserResponse = Depends(get_current_user)
+):
+    """
+    Estado de una subida por partes, con las partes que faltan para reanudarla
+    """
+    uploads = MultipartUploadService()
+    return uploads.describe(await uploads.get_session(upload_id, current_user.email))
+
+
+@router.post("/multipart/{upload_id}/complete")
+async def complete_multipart_upload(
+    upload_id: str,
+    response: Response,
+    current_user: UserResponse = Depends(get_current_user),
+):
+    """
+    Cierra la subida cuando llegaron todas las partes y espera a que
+    termine la ingesta. Si tarda más de UPLOAD_COMPLETE_WAIT_SECONDS
+    responde 202 y la carga se consulta en /upload/status/{collection_name}.
+    """
+    session = await MultipartUploadService().complete(upload_id, current_user.email)
+    try:
+        async with asyncio.timeout(settings.UPLOAD_COMPLETE_WAIT_SECONDS):
+            result = await FileProcessorService().wait_for_job(session["collection_name"])
+    except asyncio.TimeoutError:
+        response.status_code = 202
+        return {
+            "message": "Subida completa; la carga sigue en curso",
+            "file_size": session["file_size"],
+            "filename": session["filename"],
+            "collection_name": session["collection_name"],
+        }
+
+    if result['status'] == "error":
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al procesar el archivo: {result['message']}"
+        )
+
+    return {
+        "message": "Archivo subido exitosamente",
+        "file_id": str(result['data']['file_path']),
+        "total_genes": result['data']['total_genes'],
+        "file_size": session["file_size"],
+        "filename": session["filename"],
+        "collection_name": session["collection_name"],
     }
 
 
+@router.delete("/multipart/{upload_id}")
+async def abort_multipart_upload(
+    upload_id: str, current_user: UserResponse = Depends(get_current_user)
+):
+    """
+    Cancela una subida por partes y elimina lo ya procesado
+    """
+    await MultipartUploadService().abort(upload_id, current_user.email)
+    return {"message": "Subida cancelada", "upload_id": upload_id}
+
+
+@router.get("/jobs")
+async def get_ingest_jobs():
+    """
+    Cargas en curso y en espera con su posición en la cola, límites del
+    planificador, disco reservado y latencia de búsqueda que frena las inserciones.
+    """
+    return await IngestSchedulerService().describe_queue()
+
+
 @router.get("/uploaded-files")
 async def get_uploaded_files():
     """
@@ -61,4 +208,74 @@ async def get_uploaded_files():
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error al consultar archivos subidos: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@router.get("/stats/{collection_name}")
+async def get_collection_stats(collection_name: str):
+    """
+    Estadísticas precalculadas durante la ingesta de un archivo:
+    variantes por cromosoma, histograma de QUAL, estados de FILTER y tipos de variante.
+    """
+    database = get_async_database()
+    file_record = await database.uploaded_files.find_one(
+        {"collection_name": collection_name},
+        {"_id": 0, "collection_name": 1, "total_genes": 1, "stats": 1},
+    )
+    if file_record is None:
+        raise HTTPException(status_code=404, detail="Colección no encontrada")
+    if "stats" not in file_record:
+        raise HTTPException(
+            status_code=404,
+            detail="La colección no tiene estadísticas precalculadas",
+        )
+    return file_record
+
+
+@router.get("/status/{collection_name}")
+async def get_ingest_status(collection_name: str):
+    """
+    Estado de la carga de un archivo: progreso de la ingesta, si ya se puede
+    consultar, avance de la construcción de índices y tiempos de inserción
+    frente a índices.
+    """
+    database = get_async_database()
+    job = await database.ingest_jobs.find_one(
+        {"_id": collection_name},
+        {
+            "_id": 0,
+            "status": 1,
+            "phase": 1,
+            "records_committed": 1,
+            "byte_offset": 1,
+            "file_size": 1,
+            "error": 1,
+        },
+    )
+    file_record = await database.uploaded_files.find_one(
+        {"collection_name": collection_name},
+        {
+            "_id": 0,
+            "total_genes": 1,
+            "queryable": 1,
+            "index_status": 1,
+            "index_progress": 1,
+            "timings": 1,
+        },
+    )
+    if job is None and file_record is None:
+        raise HTTPException(status_code=404, detail="Colección no encontrada")
+    queue = await IngestSchedulerService().describe(collection_name)
+
+    # Los archivos anteriores a estas opciones ya tienen sus índices
+    file_record = file_record or {}
+    return {
+        "collection_name": collection_name,
+        "ingest": job,
+        "queue": queue,
+        "queryable": file_record.get("queryable", bool(file_record)),
+        "index_status": file_record.get("index_status", "ready" if file_record else None),
+        "index_progress": file_record.get("index_progress"),
+        "total_genes": file_record.get("total_genes"),
+        "timings": file_record.get("timings"),
+    }
@@ -1,15 +1,23 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from typing import Optional
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 
 from app.models.gene import (
+    CompareMode,
     GeneSearchCriteria,
     GeneSearchResult,
+    VariantIdLookupRequest,
+    VariantIdLookupResult,
 )
 from app.services.auth_service import (
     get_current_user,
 )
 from app.models.user import UserResponse
 from app.services.gene_search_service import GeneSearchService
+from app.services.gene_query_planner import parse_predicate
+from app.services.variant_id_service import VariantIdLookupService
+from app.services.variant_compare_service import VariantCompareService
+from app.services.variant_density_service import VariantDensityService
 
 router = APIRouter()
 
@@ -25,10 +33,33 @@ async def search_genes(
     collection_name: Optional[str] = Query(
         None, description="Nombre de la colección donde buscar"
     ),  # Parámetro opcional # Nuevo parámetro
+    min_allele_frequency: Optional[float] = Query(
+        None, ge=0, le=1, description="Frecuencia mínima del alelo alternativo"
+    ),
+    max_allele_frequency: Optional[float] = Query(
+        None, ge=0, le=1, description="Frecuencia máxima del alelo alternativo"
+    ),
+    min_call_rate: Optional[float] = Query(
+        None, ge=0, le=1, description="Tasa mínima de genotipos llamados"
+    ),
+    filter: List[str] = Query(
+        [],
+        description=(
+            "Filtros tipados, p. ej. quality>=30, filter_status=PASS, "
+            "chromosome in chr01,chr02, position between 1000..5000"
+        ),
+    ),
+    format: Optional[str] = Query(None, description="Valor exacto de FORMAT"),
+    sort_by: Optional[str] = Query(None, description="Campo indexado para ordenar"),
+    sort_direction: Optional[str] = Query(
+        None, pattern="^(asc|desc)$", description="Dirección del orden"
+    ),
 ):
     """
     Búsqueda avanzada de genes con múltiples criterios
     - Soporta filtrado por cromosoma, tipo de vino, estado
+    - Filtros por frecuencia alélica y tasa de llamado resueltos con índices
+    - Filtros tipados y orden sobre campos indexados
     - Paginación de resultados
     - Requiere autenticación
     """
@@ -38,10 +69,22 @@ async def search_genes(
             status_code=400, detail="El término de búsqueda no puede estar vacío"
         )
 
+    try:
+        predicates = [parse_predicate(text) for text in filter]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     search_service = GeneSearchService()
 
     search_criteria = GeneSearchCriteria(
         search=search,
+        min_allele_frequency=min_allele_frequency,
+        max_allele_frequency=max_allele_frequency,
+        min_call_rate=min_call_rate,
+        format=format,
+        sort_by=sort_by,
+        sort_direction=sort_direction,
+        filters=predicates,
     )
 
     if collection_name is None:
@@ -52,7 +95,73 @@ async def search_genes(
     else:
         results = await search_service.search(
             criteria=search_criteria,
+            page=page,
             per_page=per_page,
             collection_name=collection_name,
         )
     return results
+
+
+@router.post("/ids", response_model=VariantIdLookupResult)
+async def lookup_variant_ids(
+    request: VariantIdLookupRequest,
+    current_user: UserResponse = Depends(get_current_user),
+):
+    """
+    Búsqueda puntual de variantes por identificador (rsID u otros)
+    - Acepta miles de identificadores por petición
+    - Se resuelven con una sola consulta sobre el índice de id
+    - Requiere autenticación
+    """
+    lookup_service = VariantIdLookupService()
+    return await lookup_service.lookup(request.collection_name, request.ids)
+
+
+@router.get("/compare")
+async def compare_collections(
+    left: str = Query(..., description="Colección de la primera variedad"),
+    right: str = Query(..., description="Colección de la segunda variedad"),
+    mode: CompareMode = Query(
+        CompareMode.INTERSECTION, description="Variantes a devolver"
+    ),
+    current_user: UserResponse = Depends(get_current_user),
+):
+    """
+    Comparar las variantes de dos archivos subidos
+    - Variantes compartidas, exclusivas de cada lado o su diferencia simétrica
+    - Resultado en NDJSON con una línea final de resumen
+    - Memoria constante: ambas colecciones se recorren ordenadas por índice
+    - Requiere autenticación
+    """
+    compare_service = VariantCompareService()
+    await compare_service.validate(left, right)
+    return StreamingResponse(
+        compare_service.compare(left, right, mode),
+        media_type="application/x-ndjson",
+    )
+
+
+@router.get("/density")
+async def variant_density(
+    collection_name: str = Query(..., description="Colección del archivo"),
+    chromosome: str = Query(..., description="Cromosoma"),
+    start: int = Query(0, ge=0, description="Inicio de la ventana"),
+    end: int = Query(..., gt=0, description="Fin de la ventana (exclusivo)"),
+    resolution: int = Query(
+        100_000, description="Ancho del intervalo: 1000, 10000, 100000 o 1000000"
+    ),
+    category: str = Query(
+        "all", description="Serie: all, filter:<FILTER> o type:<tipo de variante>"
+    ),
+    current_user: UserResponse = Depends(get_current_user),
+):
+    """
+    Densidad de variantes en una ventana de un cromosoma
+    - Conteos por intervalo precalculados durante la ingesta
+    - El costo depende del número de intervalos, no del de variantes
+    - Requiere autenticación
+    """
+    density_service = VariantDensityService()
+    return await density_service.window(
+        collection_name, chromosome, start, end, resolution, category
+    )
@@ -1,8 +1,7 @@
+import asyncio
 import secrets
 from datetime import datetime, timedelta, timezone
-import threading
 from typing import Optional
-import json
 
 import jwt
 from fastapi import Depends, HTTPException, status
@@ -10,15 +9,16 @@ from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
 from pydantic import EmailStr
 from bson import ObjectId
-import pika  # Importar pika para RabbitMQ
+from pymongo.errors import DuplicateKeyError
 
+from app.config import settings
 from app.models.user import UserCreate, UserInDB, UserResponse
-from app.db.mongodb import get_async_database, connect_to_mongo
+from app.db.mongodb import get_async_database
+from app.services.security_key_publisher import get_security_key_publisher
+from app.utils.metrics import AUTH_OPERATIONS
 
 import logging
 
-from app.services.security_key_consumer import start_consumer
-
 # Configurar nivel de logging para silenciar mensajes de RabbitMQ (pika)
 logging.getLogger("pika").setLevel(logging.WARNING)
 
@@ -31,6 +31,8 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login")
+# Para endpoints que aceptan peticiones anónimas
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="users/login", auto_error=False)
 
 
 class AuthService:
@@ -40,11 +42,15 @@ class AuthService:
 
     async def get_database(self):
         if self.db is None:
-            await connect_to_mongo()
             self.db = get_async_database()
             self.users_collection = self.db["users"]
         return self.db
 
+    async def ensure_indexes(self):
+        """Crear los índices de la colección de usuarios"""
+        db = await self.get_database()
+        await db.users.create_index([("email", 1)], name="email_unique", unique=True)
+
     async def get_user_by_email(self, email: str) -> Optional[UserInDB]:
         db = await self.get_database()
         user_dict = await db.users.find_one({"email": email})
@@ -63,10 +69,7 @@ class AuthService:
 
     async def create_user(self, user: UserCreate) -> UserResponse:
         """Crear nuevo usuario"""
-        # Verificar si el usuario ya existe
-        existing_user = await self.get_user_by_email(user.email)
-        if existing_user:
-            raise ValueError("El usuario ya existe")
+        await self.get_database()
 
         # Crear usuario con contraseña hasheada
         hashed_password = self.get_password_hash(user.password)
@@ -80,25 +83,21 @@ class AuthService:
             hours=24
         )
 
-        # Insertar usuario en base de datos
-        result = await self.users_collection.insert_one(user_dict)
+        # Insertar usuario en base de datos; el índice único sobre email
+        # detecta los duplicados sin una lectura previa
+        try:
+            result = await self.users_collection.insert_one(user_dict)
+        except DuplicateKeyError:
+            AUTH_OPERATIONS.labels("register", "duplicate").inc()
+            raise ValueError("El usuario ya existe")
+        AUTH_OPERATIONS.labels("register", "success").inc()
         user_dict["id"] = str(result.inserted_id)
-        consumer_thread = threading.Thread(target=start_consumer, daemon=True)
-        consumer_thread.start()
 
         return UserResponse(**user_dict)
 
     def publish_security_key_email(self, email: str, security_key: str):
-        """Publicar un mensaje en RabbitMQ para enviar la clave de seguridad"""
-        connection = pika.BlockingConnection(pika.ConnectionParameters("localhost"))
-        channel = connection.channel()
-        channel.queue_declare(queue="security_key_queue")
-
-        message = {"email": email, "security_key": security_key}
-        channel.basic_publish(
-            exchange="", routing_key="security_key_queue", body=json.dumps(message)
-        )
-        connection.close()
+        """Publicar un mensaje para enviar la clave de seguridad por correo"""
+        get_security_key_publisher().publish(email, security_key)
 
     def generate_security_key(self) -> str:
         """Generar clave de seguridad aleatoria"""
@@ -107,17 +106,17 @@ class AuthService:
     async def authenticate_user(self, email: str, password: str) -> Optional[UserInDB]:
         """Autenticar usuario"""
         user = await self.get_user_by_email(email)
-        if not user:
-            return None
-        if not self.verify_password(password, user.hashed_password):
+        if not user or not self.verify_password(password, user.hashed_password):
+            AUTH_OPERATIONS.labels("login", "failure").inc()
             return None
 
         # Generar nueva clave de seguridad al iniciar sesión
         new_security_key = self.generate_security_key()
         expires_at = datetime.now(tz=timezone.utc) + timedelta(hours=24)
 
-        # Actualizar usuario con la nueva clave
-        await self.users_collection.update_one(
+        # Guardar la clave antes de enviarla: una clave que no quedó
+        # registrada nunca se podría verificar
+        result = await self.users_collection.update_one(
             {"email": email},
             {
                 "$set": {
@@ -126,10 +125,13 @@ class AuthService:
                 }
             },
         )
+        if result.matched_count == 0:
+            AUTH_OPERATIONS.labels("login", "failure").inc()
+            return None
+        # La publicación en RabbitMQ es bloqueante y va en un hilo
+        await asyncio.to_thread(self.publish_security_key_email, email, new_security_key)
 
-        # Publicar un mensaje en RabbitMQ para enviar la clave de seguridad
-        self.publish_security_key_email(email, new_security_key)
-
+        AUTH_OPERATIONS.labels("login", "success").inc()
         return user
 
     def create_access_token(
@@ -160,16 +162,14 @@ class AuthService:
 
     async def request_security_key(self, email: EmailStr) -> None:
         """Generar y almacenar una nueva clave de seguridad para un usuario"""
-        user = await self.get_user_by_email(email)
-        if not user:
-            raise ValueError("Usuario no encontrado")
+        await self.get_database()
 
         # Generar nueva clave de seguridad
         new_security_key = self.generate_security_key()
         expires_at = datetime.now(tz=timezone.utc) + timedelta(hours=24)
 
         # Actualizar usuario con la nueva clave
-        await self.users_collection.update_one(
+        result = await self.users_collection.update_one(
             {"email": email},
             {
                 "$set": {
@@ -178,39 +178,44 @@ class AuthService:
                 }
             },
         )
+        if result.matched_count == 0:
+            AUTH_OPERATIONS.labels("request_security_key", "failure").inc()
+            raise ValueError("Usuario no encontrado")
+        AUTH_OPERATIONS.labels("request_security_key", "success").inc()
 
     async def verify_security_key(self, email: EmailStr, security_key: str) -> bool:
         """Verificar si la clave de seguridad es válida"""
-        user = await self.get_user_by_email(email)
-        if not user:
-            raise ValueError("Usuario no encontrado")
-
-        if user.security_key != security_key:
-            raise ValueError("Clave de seguridad incorrecta")
-
-        # Asegúrate de que user.security_key_expires tenga zona horaria
-        if user.security_key_expires.tzinfo is None:
-            user.security_key_expires = user.security_key_expires.replace(
-                tzinfo=timezone.utc
-            )
-
-        # Comparar con la fecha y hora actual
-        if user.security_key_expires < datetime.now(tz=timezone.utc):
-            raise ValueError("Clave de seguridad expirada")
+        db = await self.get_database()
+        now = datetime.now(tz=timezone.utc)
 
-        # Limpiar la clave de seguridad después de su uso
-        await self.users_collection.update_one(
-            {"email": email},
+        # Verificar y consumir la clave en una sola operación atómica
+        user = await db.users.find_one_and_update(
+            {
+                "email": email,
+                "security_key": security_key,
+                "security_key_expires": {"$gt": now},
+            },
             {
                 "$set": {
                     "security_key": None,
                     "security_key_expires": None,
-                    "last_login": datetime.now(tz=timezone.utc),
+                    "last_login": now,
                 }
             },
+            projection={"_id": 1},
         )
+        if user:
+            AUTH_OPERATIONS.labels("verify_security_key", "success").inc()
+            return True
 
-        return True
+        # Solo en caso de fallo se consulta el motivo
+        AUTH_OPERATIONS.labels("verify_security_key", "failure").inc()
+        user = await self.get_user_by_email(email)
+        if not user:
+            raise ValueError("Usuario no encontrado")
+        if user.security_key != security_key:
+            raise ValueError("Clave de seguridad incorrecta")
+        raise ValueError("Clave de seguridad expirada")
 
 
 # Funciones de conveniencia para inyección de dependencias
@@ -221,6 +226,28 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserResponse:
     return await auth_service.get_current_user(token)
 
 
+async def get_optional_user(
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+) -> Optional[UserResponse]:
+    """Usuario del token si se envió uno; un token inválido sigue siendo un 401"""
+    if token is None:
+        return None
+    return await auth_service.get_current_user(token)
+
+
+async def get_admin_user(
+    current_user: UserResponse = Depends(get_current_user),
+) -> UserResponse:
+    """Usuario autenticado que figura en ADMIN_EMAILS"""
+    admins = {email.lower() for email in settings.ADMIN_EMAILS}
+    if current_user.email.lower() not in admins:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Se requieren permisos de administrador",
+        )
+    return current_user
+
+
 def create_user(user: UserCreate):
     return auth_service.create_user(user)
 
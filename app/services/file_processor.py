@@ -1,17 +1,108 @@
 import os
+import time
+import socket
+import asyncio
 import logging
 import multiprocessing
-from fastapi import UploadFile
-from datetime import datetime
+from fastapi import HTTPException, UploadFile
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument, WriteConcern
+from pymongo.errors import (
+    BulkWriteError,
+    ConnectionFailure,
+    ExecutionTimeout,
+    WriteConcernError,
+    WTimeoutError,
+)
 
 from app.utils.FileStorageService import FileStorageService
 from app.utils.VCFParserService import VCFParserService
+from app.utils.VariantStatsService import VariantStatsService
+from app.utils.GenotypeSummaryService import GenotypeSummaryService
+from app.utils.DensityTileService import TILE_RESOLUTIONS, DensityTileService
 from app.db.mongodb import get_async_database
+from app.db.variant_schema import VariantDictionaries
+from app.services.variant_density_service import VariantDensityService
+from app.services.ingest_scheduler import ANONYMOUS_USER, IngestSchedulerService
+from app.services.variant_snapshot_service import VariantSnapshotService
+from app.services.multipart_upload_service import (
+    SESSION_ABORTED,
+    SESSION_COMPLETE,
+    uploaded_bytes,
+)
+from app.db.variant_store import (
+    CONSOLIDATED,
+    INDEXES_BUILDING,
+    INDEXES_FAILED,
+    INDEXES_READY,
+    ensure_consolidated_indexes,
+    index_models,
+    new_collection_name,
+    new_scope,
+)
+from app.config import settings
+from app.utils.metrics import (
+    INDEX_BUILD_SECONDS,
+    INSERT_BATCH_SECONDS,
+    PARSE_SECONDS,
+    RECORDS_INGESTED,
+    UPLOAD_SAVE_SECONDS,
+)
 
 # Logging Configuration
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Estados de un trabajo de carga en la colección ingest_jobs
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+# Fases de un trabajo en curso: esperando turno del planificador, o la
+# carga terminó y se construyen los índices
+PHASE_QUEUED = "queued"
+PHASE_INDEXING = "indexing"
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+def _is_transient(error: Exception) -> bool:
+    """Whether a MongoDB error can succeed on retry, unlike a parse error."""
+    transient = (ConnectionFailure, ExecutionTimeout, WriteConcernError, WTimeoutError)
+    if isinstance(error, transient):
+        return True
+    if isinstance(error, BulkWriteError):
+        details = error.details
+        return bool(details.get("writeConcernErrors")) and all(
+            write_error.get("code") == DUPLICATE_KEY_ERROR
+            for write_error in details.get("writeErrors", [])
+        )
+    return False
+
+# Cargas en segundo plano de este proceso, canceladas al apagar el servidor
+_BACKGROUND_JOBS = set()
+
+
+class IngestLeaseLost(Exception):
+    """Another process took over the ingest job after its lease expired."""
+
+
+async def cancel_background_jobs():
+    """Cancel this process's background ingests, releasing their leases."""
+    for task in list(_BACKGROUND_JOBS):
+        task.cancel()
+    await asyncio.gather(*_BACKGROUND_JOBS, return_exceptions=True)
+
+
+def _upload_size(file: UploadFile) -> int:
+    """Size of an uploaded file, measured if the request did not report it."""
+    if file.size is not None:
+        return file.size
+    position = file.file.tell()
+    file.file.seek(0, os.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(position)
+    return size
+
 
 class FileProcessorService:
     """Orchestrates the entire file processing workflow."""
@@ -19,99 +110,753 @@ class FileProcessorService:
     def __init__(self):
         self.file_storage = FileStorageService()
         self.vcf_parser = VCFParserService()
+        self.genotype_summary = GenotypeSummaryService()
+        self.density = VariantDensityService()
+        self.scheduler = IngestSchedulerService()
         self.n_cores = multiprocessing.cpu_count()
         self.database = get_async_database()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    async def ensure_indexes(self):
+        """
+        Crea los índices de la colección de archivos subidos y, con el esquema
+        consolidado, los de la colección de variantes.
+        """
+        await self.database.uploaded_files.create_index(
+            [("collection_name", 1)], name="collection_name_unique", unique=True
+        )
+        await self.database.ingest_jobs.create_index(
+            [("status", 1), ("lease_expires", 1)], name="status_lease_index"
+        )
+        if settings.VARIANT_STORAGE_LAYOUT == CONSOLIDATED:
+            await ensure_consolidated_indexes(self.database)
+
+    async def _create_indexes(self, scope):
+        """
+        Crea el conjunto de índices configurado en settings.VARIANT_INDEX_SET,
+        compuestos para los filtros tipados (igualdad seguida de rango u orden).
+        En el esquema consolidado ya existen y no hay nada que crear.
+        """
+        if scope.layout == CONSOLIDATED:
+            return
+        await scope.collection.create_indexes(index_models(scope.layout, scope.codec.schema))
+        logger.info("Índices creados para búsquedas parciales.")
+
+    def _lease_expiration(self) -> datetime:
+        return datetime.now(tz=timezone.utc) + timedelta(
+            seconds=settings.INGEST_LEASE_SECONDS
+        )
+
+    async def _create_job(
+        self,
+        file_path: str,
+        filename: str,
+        scope,
+        upload_id: str = None,
+        user: str = ANONYMOUS_USER,
+        phase: str = None,
+    ) -> dict:
+        """
+        Registra el trabajo de carga con la posición del primer registro,
+        desde donde se reanuda si el proceso cae antes del primer checkpoint.
+        En una subida por partes la cabecera se lee cuando llega.
+        """
+        if upload_id is None:
+            sample_names, data_offset = self.vcf_parser.read_header(file_path)
+        else:
+            sample_names, data_offset = None, None
+        now = datetime.now(tz=timezone.utc)
+        job = {
+            "_id": scope.name,
+            "status": JOB_RUNNING,
+            "file_path": file_path,
+            "filename": filename,
+            "upload_id": upload_id,
+            "user": user,
+            "phase": phase,
+            "file_size": os.path.getsize(file_path),
+            "storage_layout": scope.layout,
+            "variant_schema": scope.codec.schema,
+            "sample_names": sample_names,
+            "byte_offset": data_offset,
+            "records_committed": 0,
+            "stats": None,
+            "dictionaries": scope.codec.dictionaries.to_dict(),
+            "owner": self.owner,
+            "lease_expires": self._lease_expiration(),
+            "attempts": 1,
+            "created_at": now,
+            "updated_at": now,
+        }
+        await self.database.ingest_jobs.insert_one(job)
+        return job
 
-    async def _create_indexes(self, genes_collection):
+    async def _checkpoint(self, job_id: str, fields: dict):
         """
-        Crea índices optimizados para búsquedas parciales con expresiones regulares.
+        Guarda el progreso y renueva la reserva del trabajo.
+
+        :raises IngestLeaseLost: Si otro proceso retomó el trabajo
         """
+        result = await self.database.ingest_jobs.update_one(
+            {"_id": job_id, "owner": self.owner, "status": JOB_RUNNING},
+            {
+                "$set": {
+                    **fields,
+                    "lease_expires": self._lease_expiration(),
+                    "updated_at": datetime.now(tz=timezone.utc),
+                }
+            },
+        )
+        if result.matched_count == 0:
+            raise IngestLeaseLost(f"El trabajo {job_id} pasó a otro proceso")
+
+    async def _release_job(self, job_id: str):
+        """Libera la reserva para que el trabajo se retome de inmediato"""
+        await self.database.ingest_jobs.update_one(
+            {"_id": job_id, "owner": self.owner, "status": JOB_RUNNING},
+            {
+                "$set": {"lease_expires": datetime.now(tz=timezone.utc)},
+                "$unset": {"owner": ""},
+            },
+        )
+
+    async def _fail_job(self, job: dict, scope, message: str):
+        """Marca el trabajo como fallido y elimina los datos parciales"""
         try:
-            await genes_collection.create_index(
-                [("chromosome", 1)], name="chromosome_index", background=True
-            )
-            await genes_collection.create_index(
-                [("filter_status", 1)], name="filter_status_index", background=True
-            )
-            await genes_collection.create_index(
-                [("info", 1)], name="info_index", background=True
-            )
-            await genes_collection.create_index(
-                [("format", 1)], name="format_index", background=True
+            if scope.layout == CONSOLIDATED:
+                await scope.collection.delete_many(scope.base_filter)
+            else:
+                await scope.collection.drop()
+            await self.density.discard(job["_id"])
+            await self.database.ingest_jobs.update_one(
+                {"_id": job["_id"]},
+                {
+                    "$set": {
+                        "status": JOB_FAILED,
+                        "error": message,
+                        "updated_at": datetime.now(tz=timezone.utc),
+                    },
+                    "$unset": {"owner": "", "lease_expires": ""},
+                },
             )
-            logger.info("Índices creados para búsquedas parciales.")
+            if job.get("upload_id"):
+                await self.database.upload_sessions.update_one(
+                    {"_id": job["upload_id"]}, {"$set": {"status": SESSION_ABORTED}}
+                )
         except Exception as e:
-            logger.error(f"Error creando índices: {e}")
+            logger.error(f"Error cleaning up failed ingest {job['_id']}: {e}")
+        if os.path.exists(job["file_path"]):
+            os.remove(job["file_path"])
 
     async def process_file(
         self,
         file: UploadFile,
+        user: str = ANONYMOUS_USER,
+        wait: bool = True,
     ):
         """
         Main method to process an uploaded file.
 
         :param file: Uploaded file
-        :return: Processed file record
+        :param user: Identity for the scheduler's per-user limit
+        :param wait: Wait for a scheduler slot and the ingest; otherwise save
+            the file, queue the ingest in the background and return at once
+        :return: Processed file record, or the queue position when not waiting
         """
-        start_time = datetime.now()
+        # Crear una colección (o partición) para el archivo subido
+        scope = new_scope(self.database, new_collection_name())
+        size = _upload_size(file)
+
+        if not wait:
+            # El archivo ocupa disco mientras espera turno
+            await self.scheduler.reserve_disk(scope.name, user, size)
+            try:
+                with UPLOAD_SAVE_SECONDS.time():
+                    file_path = await self.file_storage.save_uploaded_file(file)
+                await self.scheduler.mark_allocated(scope.name, size)
+                job = await self._create_job(
+                    file_path, file.filename, scope, user=user, phase=PHASE_QUEUED
+                )
+            except BaseException:
+                await self.scheduler.release(scope.name)
+                raise
+            self._start_background(self._run_scheduled(job, scope))
+            return {
+                "status": "queued",
+                "data": {
+                    "file_path": file_path,
+                    "collection_name": scope.name,
+                    "queue": await self.scheduler.describe(scope.name),
+                },
+            }
+
+        async with self.scheduler.slot(scope.name, user, size):
+            # Save the file
+            with UPLOAD_SAVE_SECONDS.time():
+                file_path = await self.file_storage.save_uploaded_file(file)
+            await self.scheduler.mark_allocated(scope.name, size)
+            job = await self._create_job(file_path, file.filename, scope, user=user)
+            return await self.run_job(job, scope)
+
+    async def start_upload_job(self, session: dict, user: str = ANONYMOUS_USER):
+        """
+        Inicia en segundo plano la ingesta de una subida por partes, que
+        procesa las partes contiguas a medida que llegan una vez el
+        planificador le da turno.
+
+        :param session: Sesión de subida recién creada
+        :param user: Identidad para el límite por usuario
+        """
+        scope = new_scope(self.database, session["collection_name"])
+        job = await self._create_job(
+            session["file_path"],
+            session["filename"],
+            scope,
+            session["_id"],
+            user=user,
+            phase=PHASE_QUEUED,
+        )
+        self._start_background(self._run_scheduled(job, scope))
+
+    def _job_scope(self, job: dict):
+        """Ámbito de variantes de un trabajo, con los diccionarios del último checkpoint"""
+        return new_scope(
+            self.database,
+            job["_id"],
+            job["storage_layout"],
+            job["variant_schema"],
+            VariantDictionaries.from_dict(job.get("dictionaries")),
+        )
+
+    async def _wait_for_upload_start(self, job: dict):
+        """
+        Espera a que llegue la primera parte de una subida antes de pedir
+        turno, renovando la reserva del trabajo y la de disco: una subida
+        sin datos no ocupa un hueco del planificador.
+        """
+        while True:
+            available, complete = await self._upload_progress(job["upload_id"])
+            if available or complete:
+                return
+            await self._checkpoint(job["_id"], {})
+            await self.scheduler.hold(
+                job["_id"],
+                job.get("user", ANONYMOUS_USER),
+                job["file_size"],
+                allocated=job["file_size"],
+            )
+            await asyncio.sleep(settings.UPLOAD_INGEST_POLL_SECONDS)
+
+    async def _run_scheduled(self, job: dict, scope=None):
+        """
+        Ejecuta el trabajo cuando el planificador le da turno, renovando su
+        reserva mientras espera. Una subida por partes pide turno cuando
+        llega su primera parte.
+        """
+        job_id = job["_id"]
+        scope = scope or self._job_scope(job)
+
+        async def on_wait():
+            await self._checkpoint(job_id, {})
+            if job.get("upload_id"):
+                # Detecta una subida cancelada sin esperar al turno
+                await self._upload_progress(job["upload_id"])
+
+        try:
+            if job.get("upload_id") and job.get("phase") == PHASE_QUEUED:
+                await self._wait_for_upload_start(job)
+            async with self.scheduler.slot(
+                job_id,
+                job.get("user", ANONYMOUS_USER),
+                job["file_size"],
+                on_disk=True,
+                on_wait=on_wait,
+                # El archivo ya está escrito o preasignado con su tamaño final
+                allocated=job["file_size"],
+            ):
+                if job.get("phase") == PHASE_QUEUED:
+                    await self._checkpoint(job_id, {"phase": None})
+                    job["phase"] = None
+                return await self.run_job(job, scope)
+        except IngestLeaseLost as e:
+            logger.warning(str(e))
+            return {"status": "error", "message": str(e)}
+        except ValueError as e:
+            await self._fail_job(job, scope, str(e))
+            # Una subida cancelada antes de pedir turno aún tiene su reserva de disco
+            await self.scheduler.release(job_id)
+            return {"status": "error", "message": str(e)}
+
+    async def wait_for_job(self, job_id: str) -> dict:
+        """
+        Espera a que termine la carga, la ejecute este proceso u otro; los
+        índices pueden seguir construyéndose.
+
+        :return: Resultado con el mismo formato que process_file
+        """
+        while True:
+            job = await self.database.ingest_jobs.find_one(
+                {"_id": job_id},
+                {
+                    "status": 1,
+                    "phase": 1,
+                    "file_path": 1,
+                    "records_committed": 1,
+                    "error": 1,
+                },
+            )
+            if job is None:
+                return {"status": "error", "message": "Carga no encontrada"}
+            if job["status"] == JOB_COMPLETED or job.get("phase") == PHASE_INDEXING:
+                return {
+                    "status": "success",
+                    "data": {
+                        "file_path": job["file_path"],
+                        "total_genes": job["records_committed"],
+                        "collection_name": job_id,
+                    },
+                }
+            if job["status"] == JOB_FAILED:
+                return {"status": "error", "message": job.get("error", "")}
+            await asyncio.sleep(settings.UPLOAD_INGEST_POLL_SECONDS)
 
-        # Save the file
-        file_path = await self.file_storage.save_uploaded_file(file)
+    async def _upload_progress(self, upload_id: str):
+        """
+        :return: Bytes contiguos recibidos y si la subida está completa
+        :raises ValueError: Si la subida se canceló o caducó
+        """
+        session = await self.database.upload_sessions.find_one(
+            {"_id": upload_id},
+            {"status": 1, "parts": 1, "part_size": 1, "file_size": 1},
+        )
+        if session is None or session["status"] == SESSION_ABORTED:
+            raise ValueError("La subida se canceló o caducó")
+        return uploaded_bytes(session), session["status"] == SESSION_COMPLETE
+
+    async def _wait_for_header(self, job: dict):
+        """Espera a que lleguen las partes con la cabecera completa"""
+        while True:
+            available, complete = await self._upload_progress(job["upload_id"])
+            header = self.vcf_parser.read_header(
+                job["file_path"], None if complete else available
+            )
+            if header is not None:
+                return header
+            await self._checkpoint(job["_id"], {})
+            await asyncio.sleep(settings.UPLOAD_INGEST_POLL_SECONDS)
 
-        # Crear una colección para el archivo subido
-        collection_name = f"genes_{int(datetime.now().timestamp())}"
-        genes_collection = self.database[collection_name]
+    async def _parse_chunks(self, job: dict, byte_offset: int, sample_names):
+        """
+        Bloques del archivo desde byte_offset. En una subida por partes se
+        procesa el prefijo contiguo recibido y se espera a las siguientes.
+        """
+        if job.get("upload_id") is None:
+            async for item in self.vcf_parser.parse_vcf_with_offsets(
+                job["file_path"], byte_offset, sample_names
+            ):
+                yield item
+            return
+
+        while True:
+            available, complete = await self._upload_progress(job["upload_id"])
+            async for genes_chunk, byte_offset in self.vcf_parser.parse_vcf_with_offsets(
+                job["file_path"],
+                byte_offset,
+                sample_names,
+                None if complete else available,
+            ):
+                yield genes_chunk, byte_offset
+            if complete:
+                return
+            # Renovar la reserva mientras llegan más partes
+            await self._checkpoint(job["_id"], {})
+            await asyncio.sleep(settings.UPLOAD_INGEST_POLL_SECONDS)
+
+    async def run_job(self, job: dict, scope=None):
+        """
+        Ingest a file from the job's last checkpoint until the end.
+
+        Records get deterministic ids from their position in the file, so
+        chunks written after the last checkpoint are skipped as duplicates
+        when the job is resumed.
+
+        :param job: Ingest job document
+        :param scope: Variant scope, rebuilt from the job when resuming
+        :return: Processed file record
+        """
+        start_time = datetime.now()
+        job_id = job["_id"]
+        file_path = job["file_path"]
+        if scope is None:
+            scope = self._job_scope(job)
 
         # Verificar y crear la colección de archivos subidos si no existe
         if "uploaded_files" not in await self.database.list_collection_names():
             await self.database.create_collection("uploaded_files")
 
+        if job.get("phase") == PHASE_INDEXING:
+            # La carga terminó antes de la interrupción: solo faltan los índices
+            await self._build_indexes(job, scope)
+            return {
+                "status": "success",
+                "data": {
+                    "file_path": file_path,
+                    "total_genes": job["records_committed"],
+                    "collection_name": job_id,
+                },
+            }
+
         try:
-            logger.info("Starting gene parsing...")
-            total_genes = 0
+            byte_offset = job["byte_offset"]
+            sample_names = job["sample_names"]
+            if byte_offset is None:
+                sample_names, byte_offset = await self._wait_for_header(job)
+                await self._checkpoint(
+                    job_id, {"sample_names": sample_names, "byte_offset": byte_offset}
+                )
+
+            logger.info(f"Starting gene parsing of {job_id} at byte {byte_offset}...")
+            total_genes = job["records_committed"]
+            stats = VariantStatsService.from_state(job.get("stats"))
+            # Conteos de densidad desde el último checkpoint
+            density_tiles = DensityTileService(settings.DENSITY_TILE_SPLITS)
+            density_start = total_genes
+            timings = {
+                "parse_seconds": 0.0,
+                "insert_seconds": 0.0,
+                "throttle_seconds": 0.0,
+                **(job.get("timings") or {}),
+            }
+            insert_collection = self._insert_collection(scope)
+            pending_chunks = 0
+            parse_seconds = 0.0
+            stage_start = time.perf_counter()
 
             # Parse genes y guarda en la nueva colección
-            async for genes_chunk in self.vcf_parser.parse_vcf(file_path):
-                total_genes += len(genes_chunk)
+            async for genes_chunk, byte_offset in self._parse_chunks(
+                job, byte_offset, sample_names
+            ):
+                insert_start = time.perf_counter()
+                parse_seconds += insert_start - stage_start
+                # Ceder a las búsquedas si su latencia supera el objetivo
+                throttled = await self.scheduler.throttle()
+                timings["throttle_seconds"] += throttled
+                stats.add_chunk(genes_chunk)
+                density_tiles.add_chunk(genes_chunk)
+                self.genotype_summary.summarize_chunk(genes_chunk)
                 await self._process_chunk_parallel(
-                    genes_chunk, genes_collection
+                    genes_chunk, scope, total_genes, insert_collection
                 )  # Procesar cada chunk en la nueva colección
+                total_genes += len(genes_chunk)
+                timings["insert_seconds"] += time.perf_counter() - insert_start - throttled
 
-            # Guardar información del archivo en la colección de archivos subidos
-            await self.database.uploaded_files.insert_one(
+                pending_chunks += 1
+                if pending_chunks >= settings.INGEST_CHECKPOINT_INTERVAL:
+                    await self.density.save_delta(job_id, density_start, density_tiles)
+                    await self._checkpoint(
+                        job_id,
+                        {
+                            "byte_offset": byte_offset,
+                            "records_committed": total_genes,
+                            "stats": stats.to_state(),
+                            "dictionaries": scope.codec.dictionaries.to_dict(),
+                            "timings": {
+                                **timings,
+                                "parse_seconds": timings["parse_seconds"] + parse_seconds,
+                            },
+                        },
+                    )
+                    pending_chunks = 0
+                    density_tiles.reset()
+                    density_start = total_genes
+                stage_start = time.perf_counter()
+            parse_seconds += time.perf_counter() - stage_start
+            PARSE_SECONDS.observe(parse_seconds)
+            timings["parse_seconds"] += parse_seconds
+            # MongoDB devuelve las fechas en UTC sin zona horaria
+            created_at = job["created_at"].replace(tzinfo=timezone.utc)
+            timings["load_seconds"] = (
+                datetime.now(tz=timezone.utc) - created_at
+            ).total_seconds()
+
+            # Último checkpoint, que confirma también las inserciones anteriores
+            await self.density.save_delta(job_id, density_start, density_tiles)
+            await self._checkpoint(
+                job_id,
                 {
-                    "file_path": file_path,
-                    "collection_name": collection_name,
-                    "total_genes": total_genes,
-                    "upload_time": datetime.now(),
-                }
+                    "byte_offset": byte_offset,
+                    "records_committed": total_genes,
+                    "stats": stats.to_state(),
+                    "dictionaries": scope.codec.dictionaries.to_dict(),
+                    "timings": timings,
+                },
             )
 
+            density_categories = await self.density.build(job_id)
+
+            # Guardar información del archivo en la colección de archivos
+            # subidos: se puede consultar mientras se construyen los índices
+            index_status = INDEXES_READY if scope.layout == CONSOLIDATED else INDEXES_BUILDING
+            await self.database.uploaded_files.update_one(
+                {"collection_name": job_id},
+                {
+                    "$set": {
+                        "file_path": file_path,
+                        "collection_name": job_id,
+                        "total_genes": total_genes,
+                        "storage_layout": scope.layout,
+                        "variant_schema": scope.codec.schema,
+                        "dictionaries": scope.codec.dictionaries.to_dict(),
+                        "upload_time": datetime.now(),
+                        "stats": stats.to_dict(),
+                        "density": {
+                            "resolutions": TILE_RESOLUTIONS,
+                            "categories": density_categories,
+                        },
+                        "queryable": True,
+                        "index_status": index_status,
+                        "index_progress": None,
+                        "timings": timings,
+                    }
+                },
+                upsert=True,
+            )
+            await self._checkpoint(job_id, {"phase": PHASE_INDEXING})
+
             # Calculate processing time and speed
             total_time = (datetime.now() - start_time).total_seconds() / 60
-            await self._create_indexes(genes_collection)  # Pasar la colección correcta
-
-            logger.info(f"Processing completed successfully in {total_time:.2f} min")
-            file_record = {"file_path": file_path, "total_genes": total_genes}
+            logger.info(f"Load completed successfully in {total_time:.2f} min")
+            file_record = {
+                "file_path": file_path,
+                "total_genes": total_genes,
+                "collection_name": job_id,
+            }
             os.remove(file_path)  # Remover el archivo temporal
 
-            return {"status": "success", "data": file_record}
+        except IngestLeaseLost as e:
+            logger.warning(str(e))
+            return {"status": "error", "message": str(e)}
+
+        except asyncio.CancelledError:
+            # Apagado del servidor: otro proceso retoma desde el último checkpoint
+            await self._release_job(job_id)
+            raise
 
         except Exception as e:
+            if _is_transient(e) and job.get("attempts", 1) < settings.INGEST_MAX_ATTEMPTS:
+                # Se conservan los datos: la recuperación retoma la carga
+                # desde el último checkpoint
+                logger.warning(f"Transient error ingesting {job_id}, releasing it: {e}")
+                await self._release_job(job_id)
+                return {
+                    "status": "error",
+                    "message": f"{e}; la carga se retomará desde el último checkpoint",
+                }
             logger.error(f"Processing error: {str(e)}")
+            await self._fail_job(job, scope, str(e))
             return {"status": "error", "message": str(e)}
 
-    async def _process_chunk_parallel(self, chunk, genes_collection):
+        # Los índices se construyen después de responder
+        self._start_background(self._build_indexes(job, scope))
+        return {"status": "success", "data": file_record}
+
+    def _start_background(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        _BACKGROUND_JOBS.add(task)
+        task.add_done_callback(_BACKGROUND_JOBS.discard)
+
+    def _insert_collection(self, scope):
+        """
+        Colección para las inserciones de la carga. En modo de carga masiva
+        usa w=1 sin journal: el checkpoint siguiente, con el write concern por
+        defecto, espera a que se confirmen también las inserciones anteriores.
+        """
+        if not settings.INGEST_BULK_LOAD:
+            return scope.collection
+        return scope.collection.with_options(write_concern=WriteConcern(w=1, j=False))
+
+    async def _index_build_progress(self, scope):
+        """Progreso de la construcción de índices según $currentOp, si está disponible"""
+        try:
+            operations = await self.database.client.admin.aggregate(
+                [
+                    {"$currentOp": {"allUsers": True}},
+                    {
+                        "$match": {
+                            "ns": f"{self.database.name}.{scope.collection.name}",
+                            "command.createIndexes": {"$exists": True},
+                        }
+                    },
+                ]
+            ).to_list(length=None)
+        except Exception:
+            return None
+        for operation in operations:
+            if "progress" in operation:
+                return {
+                    "done": operation["progress"].get("done"),
+                    "total": operation["progress"].get("total"),
+                    "message": operation.get("msg"),
+                }
+        return None
+
+    async def _watch_index_build(self, job_id: str, scope):
+        """Publica el progreso de los índices y renueva la reserva del trabajo"""
+        while True:
+            await asyncio.sleep(settings.INDEX_PROGRESS_INTERVAL)
+            try:
+                await self._checkpoint(job_id, {})
+            except IngestLeaseLost as e:
+                logger.warning(str(e))
+                return
+            progress = await self._index_build_progress(scope)
+            if progress is not None:
+                await self.database.uploaded_files.update_one(
+                    {"collection_name": job_id}, {"$set": {"index_progress": progress}}
+                )
+
+    async def _build_indexes(self, job: dict, scope):
+        """
+        Construye los índices del archivo con una sola llamada a
+        createIndexes, que los llena en un único recorrido de la colección.
+        """
+        job_id = job["_id"]
+        watcher = asyncio.create_task(self._watch_index_build(job_id, scope))
+        index_status = INDEXES_READY
+        index_start = time.perf_counter()
+        try:
+            with INDEX_BUILD_SECONDS.time():
+                await self._create_indexes(scope)  # Pasar la colección correcta
+        except asyncio.CancelledError:
+            # Otro proceso retoma la construcción; MongoDB continúa la que está en curso
+            await self._release_job(job_id)
+            raise
+        except Exception as e:
+            logger.error(f"Error creando índices: {e}")
+            index_status = INDEXES_FAILED
+        finally:
+            watcher.cancel()
+        index_seconds = time.perf_counter() - index_start
+
+        await self.database.uploaded_files.update_one(
+            {"collection_name": job_id},
+            {
+                "$set": {
+                    "index_status": index_status,
+                    "index_progress": None,
+                    "timings.index_seconds": index_seconds,
+                }
+            },
+        )
+        await self.density.delete_deltas(job_id)
+        await self.database.ingest_jobs.update_one(
+            {"_id": job_id},
+            {
+                "$set": {
+                    "status": JOB_COMPLETED,
+                    "updated_at": datetime.now(tz=timezone.utc),
+                },
+                "$unset": {"owner": "", "lease_expires": ""},
+            },
+        )
+        logger.info(f"Indexes for {job_id} {index_status} in {index_seconds:.1f} s")
+
+        if settings.SNAPSHOT_AUTO_BUILD and settings.SNAPSHOT_FOLDER:
+            try:
+                await VariantSnapshotService().build(job_id)
+            except HTTPException as e:
+                logger.warning(f"Snapshot of {job_id} not built: {e.detail}")
+
+    async def _claim_job(self):
+        """Reserva un trabajo en curso cuya reserva haya vencido"""
+        now = datetime.now(tz=timezone.utc)
+        return await self.database.ingest_jobs.find_one_and_update(
+            {"status": JOB_RUNNING, "lease_expires": {"$lt": now}},
+            {
+                "$set": {
+                    "owner": self.owner,
+                    "lease_expires": self._lease_expiration(),
+                    "updated_at": now,
+                },
+                "$inc": {"attempts": 1},
+            },
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def resume_jobs(self) -> int:
+        """
+        Retoma los trabajos interrumpidos por una caída o un reinicio.
+
+        :return: Número de trabajos retomados
+        """
+        resumed = 0
+        while True:
+            job = await self._claim_job()
+            if job is None:
+                return resumed
+            resumed += 1
+            if job.get("phase") == PHASE_INDEXING:
+                # En segundo plano, para seguir reclamando otros trabajos
+                self._start_background(self.run_job(job))
+                continue
+            if not os.path.exists(job["file_path"]):
+                logger.error(f"Cannot resume {job['_id']}: {job['file_path']} is gone")
+                scope = new_scope(
+                    self.database, job["_id"], job["storage_layout"], job["variant_schema"]
+                )
+                await self._fail_job(job, scope, "Archivo temporal no encontrado")
+                continue
+            logger.info(
+                f"Resuming ingest {job['_id']} after {job['records_committed']} records"
+            )
+            # Vuelve a la cola conservando su posición; mientras espera renueva su reserva
+            self._start_background(self._run_scheduled(job))
+
+    async def recovery_loop(self):
+        """Busca periódicamente trabajos abandonados hasta que se cancele"""
+        while True:
+            try:
+                await self.resume_jobs()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error resuming ingest jobs: {e}")
+            await asyncio.sleep(settings.INGEST_RECOVERY_INTERVAL)
+
+    async def _process_chunk_parallel(
+        self, chunk, scope, first_record: int = 0, collection=None
+    ):
         """
         Process a single chunk of genes in parallel.
 
         :param chunk: Chunk of genes to process
-        :param genes_collection: Collection to insert genes into
+        :param scope: Variant scope (collection and partition) to insert genes into
+        :param first_record: Position of the chunk's first record in the file
+        :param collection: Collection handle to insert with, e.g. with a relaxed
+            write concern; defaults to the scope's collection
         """
+        collection = scope.collection if collection is None else collection
+        documents = [
+            scope.prepare(gene.model_dump(), seq)
+            for seq, gene in enumerate(chunk, first_record)
+        ]
         try:
-            await genes_collection.insert_many(
-                [gene.model_dump() for gene in chunk], ordered=False
-            )
+            with INSERT_BATCH_SECONDS.time():
+                result = await collection.insert_many(documents, ordered=False)
+            RECORDS_INGESTED.inc(len(result.inserted_ids))
+        except BulkWriteError as e:
+            # Al reanudar, los registros ya escritos antes de la caída son duplicados
+            details = e.details
+            if details.get("writeConcernErrors") or any(
+                error.get("code") != DUPLICATE_KEY_ERROR
+                for error in details.get("writeErrors", [])
+            ):
+                logger.error(f"Error inserting chunk into database: {str(e)}")
+                raise
+            RECORDS_INGESTED.inc(details.get("nInserted", 0))
         except Exception as e:
-            logger.error(f"Error inserting chunk into database: {str(e)}")
+            # Sin estos registros el checkpoint no debe avanzar
+            logger.error(
+                f"Error inserting records {first_record}-{first_record + len(chunk) - 1}: {e}"
+            )
             raise
@@ -0,0 +1,265 @@
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.models.gene import FilterOperator, GenePredicate, GeneSearchCriteria
+
+# Campos filtrables y el tipo de sus valores
+FIELD_TYPES = {
+    "chromosome": str,
+    "position": int,
+    "id": str,
+    "reference": str,
+    "alternate": str,
+    "quality": float,
+    "filter_status": str,
+    "format": str,
+    "allele_count": int,
+    "allele_number": int,
+    "allele_frequency": float,
+    "het_count": int,
+    "hom_alt_count": int,
+    "missing_count": int,
+    "call_rate": float,
+}
+
+PREDICATE_PATTERN = re.compile(
+    r"^\s*(?P<field>\w+)\s*"
+    r"(?P<operator>>=|<=|!=|=|>|<|\s(?:in|between)\s)"
+    r"\s*(?P<value>.+?)\s*$",
+    re.IGNORECASE,
+)
+
+EQUALITY_OPERATORS = {FilterOperator.EQ, FilterOperator.IN}
+
+MONGO_OPERATORS = {
+    FilterOperator.NE: "$ne",
+    FilterOperator.GT: "$gt",
+    FilterOperator.GTE: "$gte",
+    FilterOperator.LT: "$lt",
+    FilterOperator.LTE: "$lte",
+}
+
+
+def _convert(field_name: str, raw: str):
+    try:
+        return FIELD_TYPES[field_name](raw.strip())
+    except ValueError:
+        raise ValueError(f"Valor inválido para {field_name}: {raw.strip()}")
+
+
+def parse_predicate(text: str) -> GenePredicate:
+    """
+    Convierte un filtro textual en un predicado tipado.
+
+    Ejemplos: ``quality>=30``, ``filter_status=PASS``,
+    ``chromosome in chr01,chr02``, ``position between 1000..5000``.
+    """
+    match = PREDICATE_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"Filtro inválido: {text}")
+
+    field_name = match.group("field")
+    if field_name not in FIELD_TYPES:
+        raise ValueError(f"Campo no filtrable: {field_name}")
+    operator = FilterOperator(match.group("operator").strip().lower())
+    raw = match.group("value")
+
+    if operator == FilterOperator.IN:
+        value = [_convert(field_name, item) for item in raw.split(",") if item.strip()]
+        if not value:
+            raise ValueError(f"Lista vacía en el filtro: {text}")
+    elif operator == FilterOperator.BETWEEN:
+        bounds = re.split(r"\.\.|,", raw)
+        if len(bounds) != 2:
+            raise ValueError(f"Rango inválido, use inicio..fin: {text}")
+        value = [_convert(field_name, bound) for bound in bounds]
+    else:
+        value = _convert(field_name, raw)
+
+    return GenePredicate(field=field_name, operator=operator, value=value)
+
+
+def criteria_predicates(criteria: GeneSearchCriteria) -> List[GenePredicate]:
+    """Predicados del criterio, incluidos los atajos de frecuencia y formato"""
+    predicates = list(criteria.filters)
+    if criteria.format:
+        predicates.append(
+            GenePredicate(field="format", operator="=", value=criteria.format)
+        )
+    if criteria.min_allele_frequency is not None:
+        predicates.append(
+            GenePredicate(
+                field="allele_frequency",
+                operator=">=",
+                value=criteria.min_allele_frequency,
+            )
+        )
+    if criteria.max_allele_frequency is not None:
+        predicates.append(
+            GenePredicate(
+                field="allele_frequency",
+                operator="<=",
+                value=criteria.max_allele_frequency,
+            )
+        )
+    if criteria.min_call_rate is not None:
+        predicates.append(
+            GenePredicate(field="call_rate", operator=">=", value=criteria.min_call_rate)
+        )
+    return predicates
+
+
+def predicate_to_mongo(predicate: GenePredicate) -> Dict[str, Any]:
+    if predicate.operator == FilterOperator.EQ:
+        return {predicate.field: predicate.value}
+    if predicate.operator == FilterOperator.IN:
+        return {predicate.field: {"$in": predicate.value}}
+    if predicate.operator == FilterOperator.BETWEEN:
+        low, high = predicate.value
+        return {predicate.field: {"$gte": low, "$lte": high}}
+    return {predicate.field: {MONGO_OPERATORS[predicate.operator]: predicate.value}}
+
+
+@dataclass
+class QueryPlan:
+    query: dict
+    sort: List[Tuple[str, int]]
+    hint: Optional[str] = None
+    notes: List[str] = field(default_factory=list)
+    # Ordenar los campos de diccionario por valor y no por código
+    value_sort: bool = False
+
+
+class GeneQueryPlanner:
+    """
+    Elige la forma de la consulta a partir de los índices existentes.
+
+    Sigue la regla igualdad-orden-rango: un índice sirve si sus primeras
+    claves son campos con igualdad, seguidas del campo de orden y luego
+    de un campo con rango.
+    """
+
+    def __init__(self, unindexed_sort_limit: int = None):
+        self.unindexed_sort_limit = (
+            settings.SEARCH_UNINDEXED_SORT_LIMIT
+            if unindexed_sort_limit is None
+            else unindexed_sort_limit
+        )
+
+    @staticmethod
+    def build_match(
+        predicates: List[GenePredicate],
+        search: Optional[str] = None,
+        base_filter: Optional[dict] = None,
+    ) -> dict:
+        conditions = [{key: value} for key, value in (base_filter or {}).items()]
+        if search:
+            search_term = re.escape(search.strip())
+            conditions.append(
+                {
+                    "$or": [
+                        {"chromosome": {"$regex": search_term, "$options": "i"}},
+                        {"filter_status": {"$regex": search_term, "$options": "i"}},
+                        {"info": {"$regex": search_term, "$options": "i"}},
+                        {"format": {"$regex": search_term, "$options": "i"}},
+                    ]
+                }
+            )
+        conditions += [predicate_to_mongo(predicate) for predicate in predicates]
+
+        # Fusionar las condiciones sobre campos distintos en un solo documento
+        merged: Dict[str, Any] = {}
+        remaining = []
+        for condition in conditions:
+            (key, value), = condition.items()
+            if key not in merged:
+                merged[key] = value
+            elif isinstance(merged[key], dict) and isinstance(value, dict) and not (
+                merged[key].keys() & value.keys()
+            ):
+                merged[key] = {**merged[key], **value}
+            else:
+                remaining.append(condition)
+        if remaining:
+            return {"$and": [merged] + remaining}
+        return merged
+
+    def _score(self, keys, equality_fields, range_fields, sort_field):
+        position = 0
+        while position < len(keys) and keys[position][0] in equality_fields:
+            position += 1
+        equality_prefix = position
+
+        sort_supported = sort_field is None or sort_field in equality_fields
+        if not sort_supported and position < len(keys) and keys[position][0] == sort_field:
+            sort_supported = True
+            position += 1
+
+        uses_range = position < len(keys) and keys[position][0] in range_fields
+        return sort_supported, equality_prefix + int(uses_range), -len(keys)
+
+    def plan(
+        self,
+        criteria: GeneSearchCriteria,
+        indexes: Dict[str, List[Tuple[str, int]]],
+        document_count: int,
+        base_filter: Optional[dict] = None,
+    ) -> QueryPlan:
+        """
+        :param criteria: Criterio de búsqueda
+        :param indexes: Índices de la colección, nombre -> claves
+        :param document_count: Número estimado de documentos de la colección
+        :param base_filter: Igualdades fijas que se añaden a toda consulta
+        :raises ValueError: Si el orden pedido no tiene índice y la colección es grande
+        """
+        predicates = criteria_predicates(criteria)
+        sort_field = criteria.sort_by
+        if sort_field is not None and sort_field not in FIELD_TYPES:
+            raise ValueError(f"Campo de orden no soportado: {sort_field}")
+        direction = -1 if criteria.sort_direction == "desc" else 1
+
+        equality_fields = set(base_filter or {})
+        range_fields = set()
+        for predicate in predicates:
+            if predicate.operator in EQUALITY_OPERATORS:
+                equality_fields.add(predicate.field)
+            else:
+                range_fields.add(predicate.field)
+
+        query = self.build_match(predicates, criteria.search, base_filter)
+        plan = QueryPlan(query=query, sort=[("_id", 1)])
+
+        best_name, best_score = None, None
+        for name, keys in indexes.items():
+            if name == "_id_":
+                continue
+            score = self._score(keys, equality_fields, range_fields, sort_field)
+            filters = score[1] > 0
+            if (filters or (sort_field and score[0])) and (
+                best_score is None or score > best_score
+            ):
+                best_name, best_score = name, score
+
+        if sort_field is not None:
+            if best_score is None or not best_score[0]:
+                if document_count > self.unindexed_sort_limit:
+                    raise ValueError(
+                        f"No se puede ordenar por {sort_field}: no hay un índice "
+                        f"compatible y la colección tiene {document_count} documentos"
+                    )
+                plan.notes.append("orden en memoria")
+            plan.sort = [(sort_field, direction)]
+        elif best_name is not None:
+            # Sin orden pedido, paginar en el orden del índice elegido
+            plan.sort = list(indexes[best_name])
+
+        # _id desempata los valores iguales: cada página se pide en varias
+        # subconsultas y todas deben ver el mismo orden total
+        if all(key != "_id" for key, _ in plan.sort):
+            plan.sort.append(("_id", 1))
+
+        if best_name is not None and (best_score[0] or sort_field is None):
+            plan.hint = best_name
+        return plan
@@ -1,114 +1,247 @@
-import re
+import time
 import asyncio
 from fastapi import HTTPException
 from app.models.gene import GeneSearchResult, GeneCreate
+from app.config import settings
 from app.db.mongodb import get_async_database
+from app.db.variant_store import VariantScope, resolve_scope
+from app.services.gene_query_planner import (
+    GeneQueryPlanner,
+    QueryPlan,
+    criteria_predicates,
+)
+from app.services.slow_query_service import SlowQueryLogService
+from app.services.variant_snapshot_service import VariantSnapshotService
+from app.utils.metrics import SEARCH_LATENCY, SEARCH_SECONDS, SNAPSHOT_SEARCHES
+
+GENOTYPE_SUMMARY_FIELDS = (
+    "allele_count",
+    "allele_number",
+    "allele_frequency",
+    "het_count",
+    "hom_alt_count",
+    "missing_count",
+    "call_rate",
+)
+
+RESULT_PROJECTION = {
+    "_id": 0,
+    "chromosome": 1,
+    "position": 1,
+    "id": 1,
+    "reference": 1,
+    "alternate": 1,
+    "quality": 1,
+    "filter_status": 1,
+    "info": 1,
+    "format": 1,
+    "outputs": 1,
+    **{field: 1 for field in GENOTYPE_SUMMARY_FIELDS},
+}
+
+
+def document_to_gene(doc) -> GeneCreate:
+    return GeneCreate(
+        chromosome=doc["chromosome"],
+        position=doc.get("position", 0),
+        id=doc.get("id", ""),
+        reference=doc.get("reference", ""),
+        alternate=doc.get("alternate", ""),
+        quality=doc.get("quality"),
+        filter_status=doc["filter_status"],
+        info=doc.get("info", ""),
+        format=doc.get("format", ""),
+        outputs=doc.get("outputs", {}),
+        **{field: doc.get(field) for field in GENOTYPE_SUMMARY_FIELDS},
+    )
+
+
+# Los índices solo cambian al terminar una ingesta
+COLLECTION_INFO_TTL = 60
+_COLLECTION_INFO_CACHE = {}
 
 
 class GeneSearchService:
     def __init__(self):
         self.db = get_async_database()
+        self.planner = GeneQueryPlanner()
+        self.slow_queries = SlowQueryLogService()
+        self.snapshots = VariantSnapshotService()
 
-    async def parallel_search(self, query, skip, limit, collection_name: str):
-        pipeline = [
-            {"$match": query},
-            {"$sort": {"_id": 1}},
-            {"$skip": skip},
-            {"$limit": limit},
-            {
-                "$project": {
-                    "_id": 0,
-                    "chromosome": 1,
-                    "position": 1,
-                    "id": 1,
-                    "reference": 1,
-                    "alternate": 1,
-                    "quality": 1,
-                    "filter_status": 1,
-                    "info": 1,
-                    "format": 1,
-                    "outputs": 1,
-                }
-            },
-        ]
-        cursor = self.db[collection_name].aggregate(pipeline)
-        return await cursor.to_list(length=limit)
+    async def _collection_info(self, scope: VariantScope):
+        """Índices y tamaño estimado de la colección, con caché de corta duración"""
+        cached = _COLLECTION_INFO_CACHE.get(scope.name)
+        if cached and time.monotonic() - cached[0] < COLLECTION_INFO_TTL:
+            return cached[1], cached[2]
+
+        if not scope.indexes_ready:
+            # Índices en construcción: planificar solo con _id hasta que terminen
+            return {"_id_": [("_id", 1)]}, await scope.document_count()
+
+        # El planificador trabaja con nombres lógicos de campo
+        index_information = await scope.collection.index_information()
+        indexes = {
+            name: [
+                (scope.codec.logical(key), direction) for key, direction in info["key"]
+            ]
+            for name, info in index_information.items()
+        }
+        document_count = await scope.document_count()
+        _COLLECTION_INFO_CACHE[scope.name] = (
+            time.monotonic(),
+            indexes,
+            document_count,
+        )
+        return indexes, document_count
+
+    async def plan(self, criteria, scope: VariantScope) -> QueryPlan:
+        indexes, document_count = await self._collection_info(scope)
+        try:
+            plan = self.planner.plan(
+                criteria, indexes, document_count, base_filter=scope.base_filter
+            )
+            plan.query = scope.codec.translate_query(plan.query)
+            plan.sort = scope.codec.translate_keys(plan.sort)
+            if criteria.sort_by and scope.codec.dictionary_sort(plan.sort):
+                # El índice ordena por código; el orden por valor es en memoria
+                if document_count > self.planner.unindexed_sort_limit:
+                    raise ValueError(
+                        f"No se puede ordenar por {criteria.sort_by} en una colección "
+                        f"compacta de {document_count} documentos"
+                    )
+                plan.notes.append("orden por valor de diccionario")
+                plan.value_sort = True
+            return plan
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
     async def search(
         self, criteria, page=1, per_page=25, timeout=30, collection_name: str = "genes"
     ):
-        search_term = re.escape(criteria.search.strip())
-        query = {
-            "$or": [
-                {"chromosome": {"$regex": search_term, "$options": "i"}},
-                {"filter_status": {"$regex": search_term, "$options": "i"}},
-                {"info": {"$regex": search_term, "$options": "i"}},
-                {"format": {"$regex": search_term, "$options": "i"}},
-            ]
-        }
+        snapshot = await self.snapshots.get(collection_name)
+        if snapshot is not None:
+            result = await self.snapshot_search(
+                snapshot, criteria, page, per_page, timeout, collection_name
+            )
+            if result is not None:
+                return result
+
+        scope = await resolve_scope(self.db, collection_name)
+        plan = await self.plan(criteria, scope)
         skip = (page - 1) * per_page
         tasks = []
-        partition_size = per_page // 4  # Divide en 4 subconsultas paralelas
+        # Divide en 4 subconsultas paralelas, repartiendo el resto
+        partition_size, remainder = divmod(per_page, 4)
+        offset = skip
         for i in range(4):
-            tasks.append(
-                self.parallel_search(
-                    query, skip + i * partition_size, partition_size, collection_name
-                )
-            )
+            limit = partition_size + (1 if i < remainder else 0)
+            if limit:
+                tasks.append(self.parallel_search(plan, offset, limit, scope))
+            offset += limit
+        start = time.perf_counter()
         try:
             async with asyncio.timeout(timeout):
                 results = await asyncio.gather(*tasks)
+                elapsed = time.perf_counter() - start
+                SEARCH_SECONDS.labels("search").observe(elapsed)
+                SEARCH_LATENCY.observe(elapsed)
                 flattened_results = [item for sublist in results for item in sublist]
                 total_results = len(flattened_results)
+                if self.slow_queries.is_slow(elapsed):
+                    self.slow_queries.record(
+                        scope,
+                        plan,
+                        self.pipeline(plan, skip, per_page, scope),
+                        elapsed,
+                        total_results,
+                    )
 
                 return GeneSearchResult(
                     total_results=total_results,
                     page=page,
                     per_page=per_page,
                     results=[
-                        GeneCreate(
-                            chromosome=doc["chromosome"],
-                            position=doc.get("position", 0),
-                            id=doc.get("id", ""),
-                            reference=doc.get("reference", ""),
-                            alternate=doc.get("alternate", ""),
-                            quality=doc.get("quality", 0.0),
-                            filter_status=doc["filter_status"],
-                            info=doc.get("info", ""),
-                            format=doc.get("format", ""),
-                            outputs=doc.get("outputs", {}),
-                        )
+                        document_to_gene(scope.codec.decode_document(doc))
                         for doc in flattened_results
                     ],
                 )
 
         except asyncio.TimeoutError:
+            # Una búsqueda que agota el tiempo también cuenta como lenta
+            SEARCH_LATENCY.observe(timeout)
+            if settings.SLOW_QUERY_LOG_ENABLED:
+                self.slow_queries.record(
+                    scope,
+                    plan,
+                    self.pipeline(plan, skip, per_page, scope),
+                    timeout,
+                    0,
+                    timed_out=True,
+                )
+            raise HTTPException(
+                status_code=408,
+                detail="La búsqueda tomó demasiado tiempo.",
+            )
+
+    async def snapshot_search(
+        self, snapshot, criteria, page, per_page, timeout, collection_name
+    ):
+        """
+        Resuelve la búsqueda con el snapshot columnar, ordenada por el campo
+        pedido o por _id. Devuelve None si el snapshot no puede resolverla.
+        """
+        predicates = criteria_predicates(criteria)
+        sort = []
+        if criteria.sort_by:
+            sort = [(criteria.sort_by, -1 if criteria.sort_direction == "desc" else 1)]
+        if not snapshot.supports(predicates, sort):
+            SNAPSHOT_SEARCHES.labels("fallback").inc()
+            return None
+
+        start = time.perf_counter()
+        try:
+            async with asyncio.timeout(timeout):
+                docs = await asyncio.to_thread(
+                    snapshot.search,
+                    predicates,
+                    criteria.search,
+                    sort,
+                    (page - 1) * per_page,
+                    per_page,
+                )
+        except asyncio.TimeoutError:
+            SEARCH_LATENCY.observe(timeout)
             raise HTTPException(
                 status_code=408,
                 detail="La búsqueda tomó demasiado tiempo.",
             )
+        elapsed = time.perf_counter() - start
+        SEARCH_SECONDS.labels("search").observe(elapsed)
+        SEARCH_LATENCY.observe(elapsed)
+        SNAPSHOT_SEARCHES.labels("snapshot").inc()
+        return GeneSearchResult(
+            total_results=len(docs),
+            page=page,
+            per_page=per_page,
+            results=[document_to_gene(doc) for doc in docs],
+        )
 
-    async def parallel_search(self, query, skip, limit, collection_name: str):
-        pipeline = [
-            {"$match": query},
-            {"$sort": {"_id": 1}},
+    @staticmethod
+    def pipeline(plan: QueryPlan, skip, limit, scope: VariantScope) -> list:
+        if plan.value_sort:
+            sort = scope.codec.sort_stages(plan.sort)
+        else:
+            sort = [{"$sort": dict(plan.sort)}]
+        return [
+            {"$match": plan.query},
+            *sort,
             {"$skip": skip},
             {"$limit": limit},
-            {
-                "$project": {
-                    "_id": 0,
-                    "chromosome": 1,
-                    "position": 1,
-                    "id": 1,
-                    "reference": 1,
-                    "alternate": 1,
-                    "quality": 1,
-                    "filter_status": 1,
-                    "info": 1,
-                    "format": 1,
-                    "outputs": 1,
-                }
-            },
+            {"$project": scope.codec.translate_projection(RESULT_PROJECTION)},
         ]
-        cursor = self.db[collection_name].aggregate(pipeline)
+
+    async def parallel_search(self, plan: QueryPlan, skip, limit, scope: VariantScope):
+        pipeline = self.pipeline(plan, skip, limit, scope)
+        options = {"hint": plan.hint} if plan.hint else {}
+        cursor = scope.collection.aggregate(pipeline, **options)
         return await cursor.to_list(length=limit)
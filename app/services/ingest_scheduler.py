@@ -0,0 +1,505 @@
+import os
+import shutil
+import socket
+import asyncio
+import logging
+from contextlib import asynccontextmanager, suppress
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, List, Optional
+
+from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from app.config import settings
+from app.db.mongodb import get_async_database
+from app.utils.metrics import INGEST_THROTTLE_SECONDS, SEARCH_LATENCY
+
+logger = logging.getLogger(__name__)
+
+# Estados de un turno en la colección ingest_queue
+TICKET_RESERVED = "reserved"  # Solo reserva disco; aún no pide turno
+TICKET_WAITING = "waiting"
+TICKET_ACTIVE = "active"
+
+# Documentos de ingest_scheduler: cerrojo de admisión y latencias por proceso
+ADMISSION_LOCK = "admission"
+SEARCH_LATENCY_PREFIX = "search_latency:"
+ADMISSION_LOCK_SECONDS = 10
+
+# Código de error de createIndexes con un índice igual de otras opciones
+INDEX_OPTIONS_CONFLICT = 85
+
+ANONYMOUS_USER = "anonymous"
+
+# El cerrojo de MongoDB es por proceso; este ordena las admisiones del proceso
+_LOCAL_ADMISSION = asyncio.Lock()
+
+
+def fair_order(waiting: List[dict], active_per_user: dict) -> List[dict]:
+    """
+    Orden de admisión de los turnos en espera: por turnos entre usuarios,
+    empezando por el que menos cargas tiene en curso y, a igualdad, por el
+    que lleva más tiempo esperando.
+
+    :param waiting: Turnos en espera ordenados por llegada
+    :param active_per_user: Cargas en curso por usuario
+    """
+    queues = {}
+    for ticket in waiting:
+        queues.setdefault(ticket["user"], []).append(ticket)
+    load = {user: active_per_user.get(user, 0) for user in queues}
+    order = []
+    while queues:
+        user = min(queues, key=lambda name: (load[name], queues[name][0]["enqueued_at"]))
+        order.append(queues[user].pop(0))
+        load[user] += 1
+        if not queues[user]:
+            del queues[user]
+    return order
+
+
+class IngestSchedulerService:
+    """
+    Control de admisión de las cargas, compartido por todos los workers.
+
+    Cada carga pide un turno en ingest_queue y espera a que haya un hueco
+    libre en el límite global y en el de su usuario, y espacio en el
+    presupuesto de disco de UPLOAD_FOLDER. Los turnos tienen una reserva que
+    renueva el proceso que los sostiene: si el proceso cae, su hueco se
+    libera al vencer. Mientras tanto, las inserciones se pausan cuando la
+    latencia de las búsquedas supera el objetivo.
+    """
+
+    def __init__(self):
+        self.database = get_async_database()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._latency_cache = (None, 0.0)
+
+    async def ensure_indexes(self):
+        """Los turnos abandonados se eliminan un tiempo después de vencer"""
+        try:
+            await self.database.ingest_queue.create_index(
+                [("lease_expires", 1)],
+                name="lease_expires_ttl",
+                expireAfterSeconds=settings.INGEST_QUEUE_LEASE_SECONDS,
+            )
+        except OperationFailure as e:
+            if e.code != INDEX_OPTIONS_CONFLICT:
+                raise
+            # El índice existe con otro plazo: se ajusta sin reconstruirlo
+            await self.database.command(
+                {
+                    "collMod": "ingest_queue",
+                    "index": {
+                        "name": "lease_expires_ttl",
+                        "expireAfterSeconds": settings.INGEST_QUEUE_LEASE_SECONDS,
+                    },
+                }
+            )
+
+    def _lease_expiration(self) -> datetime:
+        return datetime.now(tz=timezone.utc) + timedelta(
+            seconds=settings.INGEST_QUEUE_LEASE_SECONDS
+        )
+
+    @staticmethod
+    def user_key(user=None, client_host: Optional[str] = None) -> str:
+        """Identidad para el límite por usuario: el correo o, sin sesión, la IP"""
+        if user is not None:
+            return user.email
+        if client_host:
+            return f"ip:{client_host}"
+        return ANONYMOUS_USER
+
+    def _free_bytes(self) -> int:
+        os.makedirs(settings.UPLOAD_FOLDER, exist_ok=True)
+        return shutil.disk_usage(settings.UPLOAD_FOLDER).free
+
+    def _disk_fits(self, used: int, pending: int, size: int) -> bool:
+        """
+        Si caben size bytes más en el presupuesto y en el disco.
+
+        :param used: Bytes de las reservas vigentes, que cuentan para el presupuesto
+        :param pending: Parte de esas reservas aún sin escribir ni preasignar;
+            solo esos bytes se descuentan del espacio libre, que ya refleja el resto
+        """
+        budget = settings.INGEST_DISK_BUDGET_BYTES
+        if budget and used + size > budget:
+            return False
+        return self._free_bytes() - pending - size >= settings.INGEST_DISK_MIN_FREE_BYTES
+
+    async def _live_tickets(self) -> List[dict]:
+        return await self.database.ingest_queue.find(
+            {"lease_expires": {"$gte": datetime.now(tz=timezone.utc)}}
+        ).sort("enqueued_at", 1).to_list(length=None)
+
+    @staticmethod
+    def _disk_used(tickets: List[dict]) -> int:
+        return sum(ticket["size"] for ticket in tickets if ticket["on_disk"])
+
+    @staticmethod
+    def _disk_pending(tickets: List[dict]) -> int:
+        return sum(
+            max(ticket["size"] - ticket.get("allocated", 0), 0)
+            for ticket in tickets
+            if ticket["on_disk"]
+        )
+
+    async def enqueue(
+        self,
+        ticket_id: str,
+        user: str,
+        size: int,
+        on_disk: bool = False,
+        allocated: int = 0,
+        status: str = TICKET_WAITING,
+    ):
+        """
+        Pide un turno; si ya existía (carga retomada) conserva su posición.
+        Un turno que solo reservaba disco pasa a la cola en este momento.
+
+        :param ticket_id: Identificador de la carga (nombre de la colección)
+        :param user: Identidad para el límite por usuario
+        :param size: Bytes que ocupa el archivo en UPLOAD_FOLDER
+        :param on_disk: Si el archivo ya ocupa disco antes de la admisión
+        :param allocated: Bytes del archivo ya escritos o preasignados
+        :param status: TICKET_RESERVED para reservar disco sin pedir turno
+        """
+        budget = settings.INGEST_DISK_BUDGET_BYTES
+        if budget and size > budget:
+            raise HTTPException(
+                status_code=413,
+                detail=f"El archivo supera el presupuesto de disco de {budget} bytes",
+            )
+        now = datetime.now(tz=timezone.utc)
+        await self.database.ingest_queue.update_one(
+            {"_id": ticket_id},
+            {
+                "$set": {
+                    "holder": self.owner,
+                    "lease_expires": self._lease_expiration(),
+                },
+                "$max": {"on_disk": on_disk, "allocated": allocated},
+                "$setOnInsert": {
+                    "user": user,
+                    "size": size,
+                    "status": status,
+                    "enqueued_at": now,
+                },
+            },
+            upsert=True,
+        )
+        if status == TICKET_WAITING:
+            await self.database.ingest_queue.update_one(
+                {"_id": ticket_id, "status": TICKET_RESERVED},
+                {"$set": {"status": TICKET_WAITING, "enqueued_at": now}},
+            )
+
+    async def reserve_disk(self, ticket_id: str, user: str, size: int):
+        """
+        Reserva disco para un archivo que se escribe antes de pedir turno
+        (cargas sin espera y subidas por partes). La reserva vence como un
+        turno si no se renueva con hold o se convierte en turno con slot.
+
+        :raises HTTPException: 507 si no cabe en el presupuesto de disco
+        """
+        await self.enqueue(ticket_id, user, size, on_disk=True, status=TICKET_RESERVED)
+        tickets = await self._live_tickets()
+        used = self._disk_used(tickets) - size
+        pending = self._disk_pending(tickets) - size
+        if not self._disk_fits(used, pending, size):
+            await self.release(ticket_id)
+            raise HTTPException(
+                status_code=507,
+                detail="No hay espacio en disco para la carga; inténtelo más tarde",
+            )
+
+    async def hold(self, ticket_id: str, user: str, size: int, allocated: int = 0):
+        """Renueva la reserva de disco de un archivo que aún no pide turno"""
+        await self.enqueue(
+            ticket_id,
+            user,
+            size,
+            on_disk=True,
+            allocated=allocated,
+            status=TICKET_RESERVED,
+        )
+
+    async def mark_allocated(self, ticket_id: str, allocated: int):
+        """Registra los bytes del archivo que ya ocupan disco"""
+        await self.database.ingest_queue.update_one(
+            {"_id": ticket_id, "holder": self.owner},
+            {"$max": {"allocated": allocated}},
+        )
+
+    async def release(self, ticket_id: str):
+        await self.database.ingest_queue.delete_one(
+            {"_id": ticket_id, "holder": self.owner}
+        )
+
+    async def _acquire_admission_lock(self) -> bool:
+        now = datetime.now(tz=timezone.utc)
+        try:
+            await self.database.ingest_scheduler.update_one(
+                {
+                    "_id": ADMISSION_LOCK,
+                    "$or": [{"lease_expires": {"$lt": now}}, {"owner": self.owner}],
+                },
+                {
+                    "$set": {
+                        "owner": self.owner,
+                        "lease_expires": now + timedelta(seconds=ADMISSION_LOCK_SECONDS),
+                    }
+                },
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            # Otro proceso está admitiendo turnos
+            return False
+        return True
+
+    async def _release_admission_lock(self):
+        await self.database.ingest_scheduler.update_one(
+            {"_id": ADMISSION_LOCK, "owner": self.owner},
+            {"$set": {"lease_expires": datetime.now(tz=timezone.utc)}},
+        )
+
+    async def admit(self) -> int:
+        """
+        Admite los turnos en espera que quepan, en orden justo. Un turno que
+        no cabe en disco bloquea a los siguientes que también necesitan disco,
+        para que los archivos grandes no esperen indefinidamente; los que ya
+        están en disco pueden pasar.
+
+        :return: Turnos admitidos
+        """
+        async with _LOCAL_ADMISSION:
+            if not await self._acquire_admission_lock():
+                return 0
+            try:
+                return await self._admit_waiting()
+            finally:
+                await self._release_admission_lock()
+
+    async def _admit_waiting(self) -> int:
+        tickets = await self._live_tickets()
+        active = [ticket for ticket in tickets if ticket["status"] == TICKET_ACTIVE]
+        active_per_user = {}
+        for ticket in active:
+            active_per_user[ticket["user"]] = active_per_user.get(ticket["user"], 0) + 1
+        used = self._disk_used(tickets)
+        pending = self._disk_pending(tickets)
+        running = len(active)
+        admitted = 0
+        disk_blocked = False
+
+        waiting = [ticket for ticket in tickets if ticket["status"] == TICKET_WAITING]
+        for ticket in fair_order(waiting, active_per_user):
+            if running >= settings.INGEST_MAX_CONCURRENT:
+                break
+            if active_per_user.get(ticket["user"], 0) >= settings.INGEST_MAX_PER_USER:
+                continue
+            extra = 0 if ticket["on_disk"] else ticket["size"]
+            if extra and (disk_blocked or not self._disk_fits(used, pending, extra)):
+                disk_blocked = True
+                continue
+            result = await self.database.ingest_queue.update_one(
+                {"_id": ticket["_id"], "status": TICKET_WAITING},
+                {
+                    "$set": {
+                        "status": TICKET_ACTIVE,
+                        "on_disk": True,
+                        "admitted_at": datetime.now(tz=timezone.utc),
+                    }
+                },
+            )
+            if result.modified_count:
+                running += 1
+                used += extra
+                pending += extra
+                active_per_user[ticket["user"]] = active_per_user.get(ticket["user"], 0) + 1
+                admitted += 1
+        return admitted
+
+    async def wait_for_slot(
+        self, ticket_id: str, on_wait: Optional[Callable[[], Awaitable]] = None
+    ):
+        """
+        Espera a que el turno sea admitido.
+
+        :param on_wait: Llamada en cada espera, p. ej. para renovar la
+            reserva del trabajo de carga
+        """
+        logged_position = None
+        while True:
+            result = await self.database.ingest_queue.update_one(
+                {"_id": ticket_id, "holder": self.owner},
+                {"$set": {"lease_expires": self._lease_expiration()}},
+            )
+            if result.matched_count == 0:
+                raise RuntimeError(f"El turno {ticket_id} ya no existe")
+            await self.admit()
+            ticket = await self.describe(ticket_id)
+            if ticket["status"] == TICKET_ACTIVE:
+                return
+            if ticket["position"] != logged_position:
+                logged_position = ticket["position"]
+                logger.info(f"Ingest {ticket_id} waiting at position {logged_position}")
+            if on_wait is not None:
+                await on_wait()
+            await asyncio.sleep(settings.INGEST_QUEUE_POLL_SECONDS)
+
+    async def _heartbeat(self, ticket_id: str):
+        """Renueva la reserva del turno mientras dura la carga"""
+        while True:
+            await asyncio.sleep(settings.INGEST_QUEUE_LEASE_SECONDS / 3)
+            await self.database.ingest_queue.update_one(
+                {"_id": ticket_id, "holder": self.owner},
+                {"$set": {"lease_expires": self._lease_expiration()}},
+            )
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        ticket_id: str,
+        user: str,
+        size: int,
+        on_disk: bool = False,
+        on_wait: Optional[Callable[[], Awaitable]] = None,
+        allocated: int = 0,
+    ):
+        """Espera un hueco para la carga y lo libera al terminar"""
+        await self.enqueue(ticket_id, user, size, on_disk, allocated)
+        heartbeat = None
+        try:
+            await self.wait_for_slot(ticket_id, on_wait)
+            heartbeat = asyncio.create_task(self._heartbeat(ticket_id))
+            yield
+        finally:
+            if heartbeat is not None:
+                heartbeat.cancel()
+                with suppress(asyncio.CancelledError):
+                    await heartbeat
+            await self.release(ticket_id)
+
+    @staticmethod
+    def _positions(tickets: List[dict]) -> dict:
+        active_per_user = {}
+        for ticket in tickets:
+            if ticket["status"] == TICKET_ACTIVE:
+                active_per_user[ticket["user"]] = active_per_user.get(ticket["user"], 0) + 1
+        waiting = [ticket for ticket in tickets if ticket["status"] == TICKET_WAITING]
+        return {
+            ticket["_id"]: position
+            for position, ticket in enumerate(fair_order(waiting, active_per_user), 1)
+        }
+
+    @staticmethod
+    def _describe_ticket(ticket: dict, position: Optional[int]) -> dict:
+        return {
+            "collection_name": ticket["_id"],
+            "user": ticket["user"],
+            "size": ticket["size"],
+            "status": ticket["status"],
+            "position": position,
+            "enqueued_at": ticket["enqueued_at"],
+            "admitted_at": ticket.get("admitted_at"),
+        }
+
+    async def describe(self, ticket_id: str) -> Optional[dict]:
+        """Estado del turno y su posición en la cola, o None si no existe"""
+        tickets = await self._live_tickets()
+        positions = self._positions(tickets)
+        for ticket in tickets:
+            if ticket["_id"] == ticket_id:
+                return self._describe_ticket(ticket, positions.get(ticket_id))
+        return None
+
+    async def describe_queue(self) -> dict:
+        """Cargas en curso y en espera, límites, uso de disco y latencia de búsqueda"""
+        tickets = await self._live_tickets()
+        positions = self._positions(tickets)
+        latency = await self.search_latency()
+        jobs = [
+            self._describe_ticket(ticket, positions.get(ticket["_id"]))
+            for ticket in tickets
+        ]
+        jobs.sort(key=lambda job: (job["position"] or 0, job["enqueued_at"]))
+        return {
+            "max_concurrent": settings.INGEST_MAX_CONCURRENT,
+            "max_per_user": settings.INGEST_MAX_PER_USER,
+            "disk": {
+                "reserved_bytes": self._disk_used(tickets),
+                "unwritten_bytes": self._disk_pending(tickets),
+                "budget_bytes": settings.INGEST_DISK_BUDGET_BYTES or None,
+                "free_bytes": self._free_bytes(),
+            },
+            "search_latency_seconds": latency,
+            "throttled": self._throttle_delay(latency) > 0,
+            "jobs": jobs,
+        }
+
+    async def publish_search_latency(self):
+        """Comparte la latencia de búsqueda de este proceso con los demás"""
+        await self.database.ingest_scheduler.update_one(
+            {"_id": f"{SEARCH_LATENCY_PREFIX}{self.owner}"},
+            {
+                "$set": {
+                    "seconds": SEARCH_LATENCY.value(),
+                    "updated_at": datetime.now(tz=timezone.utc),
+                }
+            },
+            upsert=True,
+        )
+
+    async def latency_loop(self):
+        """Publica periódicamente la latencia de búsqueda hasta que se cancele"""
+        while True:
+            try:
+                await self.publish_search_latency()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error publishing search latency: {e}")
+            await asyncio.sleep(settings.SEARCH_LATENCY_PUBLISH_SECONDS)
+
+    async def search_latency(self) -> float:
+        """
+        Latencia media de búsqueda más alta entre los procesos activos,
+        consultada como mucho una vez por intervalo de publicación.
+        """
+        checked_at, shared = self._latency_cache
+        now = datetime.now(tz=timezone.utc)
+        interval = timedelta(seconds=settings.SEARCH_LATENCY_PUBLISH_SECONDS)
+        if checked_at is None or now - checked_at >= interval:
+            shared = 0.0
+            async for entry in self.database.ingest_scheduler.find(
+                {
+                    "_id": {"$regex": f"^{SEARCH_LATENCY_PREFIX}"},
+                    "updated_at": {"$gte": now - 3 * interval},
+                },
+                {"seconds": 1},
+            ):
+                shared = max(shared, entry["seconds"])
+            self._latency_cache = (now, shared)
+        return max(shared, SEARCH_LATENCY.value())
+
+    @staticmethod
+    def _throttle_delay(latency: float) -> float:
+        target = settings.SEARCH_LATENCY_TARGET_SECONDS
+        if target <= 0 or latency <= target:
+            return 0.0
+        # La pausa crece con el exceso sobre el objetivo
+        return min(settings.INGEST_THROTTLE_MAX_DELAY, latency / target - 1)
+
+    async def throttle(self) -> float:
+        """
+        Pausa antes de insertar un bloque si las búsquedas van lentas.
+
+        :return: Segundos de pausa
+        """
+        delay = self._throttle_delay(await self.search_latency())
+        if delay:
+            INGEST_THROTTLE_SECONDS.inc(delay)
+            await asyncio.sleep(delay)
+        return delay
@@ -0,0 +1,382 @@
+import asyncio
+import hashlib
+import logging
+import math
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Optional
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.config import settings
+from app.db.mongodb import get_async_database
+from app.db.variant_store import new_collection_name
+from app.services.ingest_scheduler import IngestSchedulerService
+from app.models.upload import UploadInitRequest
+from app.utils.FileStorageService import FileStorageService
+
+logger = logging.getLogger(__name__)
+
+# Estados de una subida por partes en la colección upload_sessions
+SESSION_UPLOADING = "uploading"
+SESSION_COMPLETE = "complete"
+SESSION_ABORTED = "aborted"
+
+# Bytes acumulados de una parte antes de escribirlos en disco
+PART_WRITE_BUFFER = 4 * 1024 * 1024
+# Una parte reservada que no se registra en este tiempo puede recibirse de nuevo
+PART_CLAIM_SECONDS = 300
+
+
+def uploaded_bytes(session: dict) -> int:
+    """Bytes del prefijo contiguo del archivo cuyas partes ya llegaron"""
+    parts = session["parts"]
+    part_number = 1
+    while str(part_number) in parts:
+        part_number += 1
+    return min((part_number - 1) * session["part_size"], session["file_size"])
+
+
+class MultipartUploadService:
+    """
+    Subidas de archivos grandes en partes numeradas que pueden enviarse en
+    paralelo y reintentarse por separado.
+
+    Cada parte se recibe en un archivo temporal, se verifica con su SHA-256
+    y solo entonces se copia a su posición de un archivo reservado con el
+    tamaño final. Una parte aceptada no se puede reemplazar, así que la
+    ingesta puede procesar el prefijo contiguo ya recibido mientras llegan
+    las demás.
+    """
+
+    def __init__(self):
+        self.database = get_async_database()
+        self.file_storage = FileStorageService()
+        self.scheduler = IngestSchedulerService()
+
+    async def ensure_indexes(self):
+        """Las subidas sin actividad se eliminan al caducar"""
+        await self.database.upload_sessions.create_index(
+            [("expires_at", 1)], name="expires_at_ttl", expireAfterSeconds=0
+        )
+
+    def _expiration(self) -> datetime:
+        return datetime.now(tz=timezone.utc) + timedelta(
+            seconds=settings.UPLOAD_SESSION_TTL_SECONDS
+        )
+
+    async def initiate(self, request: UploadInitRequest, user: str) -> dict:
+        """
+        Reserva el archivo y registra la subida.
+
+        :param request: Nombre, tamaño total y tamaño de parte
+        :param user: Usuario dueño de la subida, el único que puede enviar
+            partes, cerrarla o cancelarla; también cuenta para su límite en
+            el planificador
+        :return: Sesión de subida
+        """
+        if request.file_size > settings.MAX_FILE_SIZE:
+            raise HTTPException(
+                status_code=413,
+                detail=f"El archivo supera el máximo de {settings.MAX_FILE_SIZE} bytes",
+            )
+        part_size = request.part_size or settings.UPLOAD_PART_SIZE
+        if part_size < settings.UPLOAD_MIN_PART_SIZE and part_size < request.file_size:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Las partes deben tener al menos {settings.UPLOAD_MIN_PART_SIZE} bytes",
+            )
+        part_count = math.ceil(request.file_size / part_size)
+        if part_count > settings.UPLOAD_MAX_PARTS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Demasiadas partes ({part_count}); use partes más grandes",
+            )
+
+        # El archivo ocupa disco desde ahora, antes de que la ingesta tenga turno
+        collection_name = new_collection_name()
+        await self.scheduler.reserve_disk(collection_name, user, request.file_size)
+        try:
+            file_path = await asyncio.to_thread(
+                self.file_storage.allocate_file, request.filename, request.file_size
+            )
+            await self.scheduler.mark_allocated(collection_name, request.file_size)
+        except BaseException:
+            await self.scheduler.release(collection_name)
+            raise
+        now = datetime.now(tz=timezone.utc)
+        session = {
+            "_id": str(ObjectId()),
+            "status": SESSION_UPLOADING,
+            "filename": request.filename,
+            "file_size": request.file_size,
+            "part_size": part_size,
+            "part_count": part_count,
+            "file_path": file_path,
+            "collection_name": collection_name,
+            "owner": user,
+            "parts": {},
+            "created_at": now,
+            "expires_at": self._expiration(),
+        }
+        await self.database.upload_sessions.insert_one(session)
+        return session
+
+    async def get_session(self, upload_id: str, owner: Optional[str] = None) -> dict:
+        """
+        :param owner: Si se indica, la subida de otro usuario se trata como
+            inexistente
+        """
+        session = await self.database.upload_sessions.find_one({"_id": upload_id})
+        if session is None or (owner is not None and session.get("owner") != owner):
+            raise HTTPException(status_code=404, detail="Subida no encontrada")
+        return session
+
+    @staticmethod
+    def describe(session: dict) -> dict:
+        """Estado de la subida, con las partes que faltan para reanudarla"""
+        parts = session["parts"]
+        return {
+            "upload_id": session["_id"],
+            "status": session["status"],
+            "filename": session["filename"],
+            "collection_name": session["collection_name"],
+            "file_size": session["file_size"],
+            "part_size": session["part_size"],
+            "part_count": session["part_count"],
+            "received_parts": len(parts),
+            "missing_parts": [
+                number
+                for number in range(1, session["part_count"] + 1)
+                if str(number) not in parts
+            ],
+            "contiguous_bytes": uploaded_bytes(session),
+        }
+
+    async def upload_part(
+        self,
+        upload_id: str,
+        part_number: int,
+        checksum: str,
+        chunks: AsyncIterator[bytes],
+        owner: str,
+    ) -> dict:
+        """
+        Recibe una parte y la copia en su posición del archivo.
+
+        :param upload_id: Identificador de la subida
+        :param part_number: Número de parte, desde 1
+        :param checksum: SHA-256 de la parte en hexadecimal
+        :param chunks: Contenido de la parte
+        :param owner: Usuario que envía la parte
+        :return: Parte registrada
+        """
+        session = await self.get_session(upload_id, owner)
+        if session["status"] != SESSION_UPLOADING:
+            raise HTTPException(
+                status_code=409, detail=f"La subida está en estado {session['status']}"
+            )
+        if not 1 <= part_number <= session["part_count"]:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Número de parte fuera de rango (1-{session['part_count']})",
+            )
+
+        checksum = checksum.strip().lower()
+        key = str(part_number)
+        recorded = session["parts"].get(key)
+        if recorded is not None:
+            # Reintento de una parte ya aceptada
+            if recorded["sha256"] != checksum:
+                raise HTTPException(
+                    status_code=409, detail="La parte ya fue recibida con otro contenido"
+                )
+            return {"part_number": part_number, **recorded}
+
+        offset = (part_number - 1) * session["part_size"]
+        expected = min(session["part_size"], session["file_size"] - offset)
+        # La parte se recibe en un archivo aparte y solo se copia a su
+        # posición cuando está verificada y reservada: un reintento con otro
+        # contenido no toca bytes que la ingesta pudo haber leído ya
+        part_path = f"{session['file_path']}.part{part_number}-{ObjectId()}"
+        try:
+            received = await self._receive_part(part_path, expected, checksum, chunks)
+            if not await self._claim_part(upload_id, key, checksum):
+                # Un reintento simultáneo con el mismo contenido ya la registró
+                session = await self.get_session(upload_id)
+                return {"part_number": part_number, **session["parts"][key]}
+            await asyncio.to_thread(
+                self.file_storage.copy_into,
+                part_path,
+                session["file_path"],
+                offset,
+            )
+        finally:
+            await asyncio.to_thread(self.file_storage.delete_file, part_path)
+
+        part = {
+            "size": received,
+            "sha256": checksum,
+            "received_at": datetime.now(tz=timezone.utc),
+        }
+        result = await self.database.upload_sessions.update_one(
+            {
+                "_id": upload_id,
+                "status": SESSION_UPLOADING,
+                f"parts.{key}": {"$exists": False},
+                f"pending_parts.{key}.sha256": checksum,
+            },
+            {
+                "$set": {f"parts.{key}": part, "expires_at": self._expiration()},
+                "$unset": {f"pending_parts.{key}": ""},
+            },
+        )
+        if result.matched_count == 0:
+            # Otra petición registró la misma parte o la subida cambió de estado
+            session = await self.get_session(upload_id)
+            recorded = session["parts"].get(key)
+            if recorded is None or recorded["sha256"] != checksum:
+                raise HTTPException(
+                    status_code=409, detail="La parte no se pudo registrar"
+                )
+        return {"part_number": part_number, **part}
+
+    async def _receive_part(
+        self, part_path: str, expected: int, checksum: str, chunks: AsyncIterator[bytes]
+    ) -> int:
+        """
+        Escribe la parte en su archivo temporal y verifica tamaño y SHA-256.
+
+        :return: Bytes recibidos
+        """
+        digest = hashlib.sha256()
+        received = 0
+        written = 0
+        buffer = bytearray()
+        async for data in chunks:
+            received += len(data)
+            if received > expected:
+                raise HTTPException(
+                    status_code=400, detail=f"La parte debe tener {expected} bytes"
+                )
+            digest.update(data)
+            buffer += data
+            if len(buffer) >= PART_WRITE_BUFFER:
+                await asyncio.to_thread(
+                    self.file_storage.write_at, part_path, written, bytes(buffer)
+                )
+                written += len(buffer)
+                buffer.clear()
+        await asyncio.to_thread(self.file_storage.write_at, part_path, written, bytes(buffer))
+
+        if received != expected:
+            raise HTTPException(
+                status_code=400,
+                detail=f"La parte tiene {received} bytes y debe tener {expected}",
+            )
+        if digest.hexdigest() != checksum:
+            raise HTTPException(
+                status_code=400, detail="El checksum SHA-256 de la parte no coincide"
+            )
+        return received
+
+    async def _claim_part(self, upload_id: str, key: str, checksum: str) -> bool:
+        """
+        Reserva la posición de la parte antes de copiarla. Las copias
+        simultáneas del mismo contenido se permiten; una reserva con otro
+        contenido se respeta hasta que caduca.
+
+        :return: False si la parte ya se registró con el mismo contenido
+        """
+        now = datetime.now(tz=timezone.utc)
+        result = await self.database.upload_sessions.update_one(
+            {
+                "_id": upload_id,
+                "status": SESSION_UPLOADING,
+                f"parts.{key}": {"$exists": False},
+                "$or": [
+                    {f"pending_parts.{key}": {"$exists": False}},
+                    {f"pending_parts.{key}.sha256": checksum},
+                    {
+                        f"pending_parts.{key}.claimed_at": {
+                            "$lt": now - timedelta(seconds=PART_CLAIM_SECONDS)
+                        }
+                    },
+                ],
+            },
+            {
+                "$set": {
+                    f"pending_parts.{key}": {
+                        "sha256": checksum,
+                        "claimed_at": now,
+                    }
+                }
+            },
+        )
+        if result.matched_count == 0:
+            session = await self.get_session(upload_id)
+            recorded = session["parts"].get(key)
+            if recorded is not None and recorded["sha256"] == checksum:
+                return False
+            if session["status"] != SESSION_UPLOADING:
+                raise HTTPException(
+                    status_code=409, detail=f"La subida está en estado {session['status']}"
+                )
+            raise HTTPException(
+                status_code=409, detail="La parte se está recibiendo con otro contenido"
+            )
+        return True
+
+    async def complete(self, upload_id: str, owner: str) -> dict:
+        """
+        Cierra la subida cuando llegaron todas las partes.
+
+        :param owner: Usuario que cierra la subida
+        :return: Sesión completada
+        """
+        session = await self.get_session(upload_id, owner)
+        if session["status"] == SESSION_COMPLETE:
+            return session
+        if session["status"] != SESSION_UPLOADING:
+            raise HTTPException(
+                status_code=409, detail=f"La subida está en estado {session['status']}"
+            )
+        missing = self.describe(session)["missing_parts"]
+        if missing:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Faltan {len(missing)} partes, por ejemplo {missing[:20]}",
+            )
+
+        now = datetime.now(tz=timezone.utc)
+        result = await self.database.upload_sessions.update_one(
+            {"_id": upload_id, "status": SESSION_UPLOADING},
+            {
+                "$set": {
+                    "status": SESSION_COMPLETE,
+                    "completed_at": now,
+                    "expires_at": self._expiration(),
+                }
+            },
+        )
+        if result.matched_count == 0:
+            return await self.complete(upload_id, owner)
+        session["status"] = SESSION_COMPLETE
+        return session
+
+    async def abort(self, upload_id: str, owner: str):
+        """
+        Cancela la subida; la ingesta en curso se detiene y elimina el
+        archivo y las variantes parciales.
+
+        :param owner: Usuario que cancela la subida
+        """
+        result = await self.database.upload_sessions.update_one(
+            {"_id": upload_id, "status": SESSION_UPLOADING, "owner": owner},
+            {"$set": {"status": SESSION_ABORTED}},
+        )
+        if result.matched_count == 0:
+            session = await self.get_session(upload_id, owner)
+            raise HTTPException(
+                status_code=409, detail=f"La subida está en estado {session['status']}"
+            )
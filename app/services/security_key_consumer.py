@@ -46,4 +46,8 @@ def start_consumer():
     channel.basic_consume(
         queue="security_key_queue", on_message_callback=callback, auto_ack=True
     )
-    channel.start_consuming()
+    try:
+        channel.start_consuming()
+    finally:
+        if connection.is_open:
+            connection.close()
@@ -0,0 +1,54 @@
+import json
+import logging
+from collections import deque
+
+import pika
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+SECURITY_KEY_QUEUE = "security_key_queue"
+
+
+class RabbitMQSecurityKeyPublisher:
+    """Publica la clave en RabbitMQ; el consumidor la envía por SendGrid"""
+
+    def publish(self, email: str, security_key: str):
+        connection = pika.BlockingConnection(pika.ConnectionParameters("localhost"))
+        channel = connection.channel()
+        channel.queue_declare(queue=SECURITY_KEY_QUEUE)
+
+        message = {"email": email, "security_key": security_key}
+        channel.basic_publish(
+            exchange="", routing_key=SECURITY_KEY_QUEUE, body=json.dumps(message)
+        )
+        connection.close()
+
+
+class MemorySecurityKeyPublisher:
+    """
+    Sustituto local de RabbitMQ y SendGrid para desarrollo y pruebas de
+    carga: guarda los últimos mensajes en memoria en lugar de enviarlos.
+    """
+
+    def __init__(self, max_messages: int = 10000):
+        self.outbox = deque(maxlen=max_messages)
+
+    def publish(self, email: str, security_key: str):
+        self.outbox.append({"email": email, "security_key": security_key})
+
+
+_PUBLISHERS = {
+    "rabbitmq": RabbitMQSecurityKeyPublisher,
+    "memory": MemorySecurityKeyPublisher,
+}
+_publisher = None
+
+
+def get_security_key_publisher():
+    """Publicador configurado en settings.SECURITY_KEY_PUBLISHER"""
+    global _publisher
+    if _publisher is None:
+        _publisher = _PUBLISHERS[settings.SECURITY_KEY_PUBLISHER]()
+    return _publisher
@@ -0,0 +1,271 @@
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from bson import json_util
+from pymongo.errors import CollectionInvalid, PyMongoError
+
+from app.config import settings
+from app.db.mongodb import get_async_database
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERIES = "slow_queries"
+
+# Un solo explain a la vez por proceso: con la base de datos ya lenta, las
+# búsquedas lentas que llegan mientras tanto se registran sin plan
+_EXPLAIN_SLOTS = asyncio.Semaphore(1)
+# Registros pendientes, para que no se pierdan las tareas en curso
+_PENDING = set()
+
+
+def _find_planner_output(explain: dict) -> Optional[dict]:
+    """
+    Parte de la salida de explain con queryPlanner: en la raíz si todo el
+    pipeline se resolvió en la consulta, o dentro de la etapa $cursor.
+    """
+    if "queryPlanner" in explain:
+        return explain
+    for stage in explain.get("stages", []):
+        if "$cursor" in stage:
+            return stage["$cursor"]
+    for shard in (explain.get("shards") or {}).values():
+        found = _find_planner_output(shard)
+        if found is not None:
+            return found
+    return None
+
+
+def summarize_plan(plan: dict) -> List[dict]:
+    """
+    Cadena de etapas del plan ganador, de la más externa a la más interna,
+    con el índice y las claves de las etapas IXSCAN.
+    """
+    stages = []
+    # En el motor de ejecución SBE el plan está dentro de queryPlan
+    plan = plan.get("queryPlan", plan)
+    while plan:
+        stage = {"stage": plan.get("stage")}
+        if "indexName" in plan:
+            stage["index"] = plan["indexName"]
+            stage["keys"] = list(plan.get("keyPattern", {}))
+        stages.append(stage)
+        if "inputStage" in plan:
+            plan = plan["inputStage"]
+        elif plan.get("inputStages"):
+            # OR y similares: se resume solo la primera rama
+            plan = plan["inputStages"][0]
+        else:
+            plan = None
+    return stages
+
+
+def summarize_explain(explain: dict) -> dict:
+    """Plan ganador y documentos examinados de la salida de explain"""
+    planner = _find_planner_output(explain)
+    if planner is None:
+        return {"winning_plan": None}
+    summary = {
+        "winning_plan": summarize_plan(planner["queryPlanner"].get("winningPlan", {})),
+    }
+    stats = planner.get("executionStats")
+    if stats:
+        summary.update(
+            {
+                "docs_examined": stats.get("totalDocsExamined"),
+                "keys_examined": stats.get("totalKeysExamined"),
+                "explain_returned": stats.get("nReturned"),
+                "explain_millis": stats.get("executionTimeMillis"),
+            }
+        )
+    return summary
+
+
+def query_shape(query: dict, sort, codec) -> dict:
+    """Campos lógicos filtrados y de orden, para agrupar consultas parecidas"""
+    fields = set()
+
+    def walk(node):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if key.startswith("$"):
+                    walk(value)
+                else:
+                    fields.add(codec.logical(key))
+        elif isinstance(node, list):
+            for item in node:
+                walk(item)
+
+    walk(query)
+    return {
+        "filter": sorted(fields),
+        "sort": [codec.logical(key) for key, _ in sort],
+    }
+
+
+class SlowQueryLogService:
+    """
+    Registro de búsquedas lentas en la colección limitada slow_queries.
+
+    Cada búsqueda que supera SLOW_QUERY_THRESHOLD_SECONDS, o que agota su
+    tiempo, se guarda con su pipeline, la colección, los documentos
+    devueltos y, según SLOW_QUERY_EXPLAIN_VERBOSITY, el plan ganador y los
+    documentos examinados que informa explain. El explain se ejecuta
+    después de responder y con límite de tiempo.
+    """
+
+    def __init__(self):
+        self.db = get_async_database()
+
+    async def ensure_indexes(self):
+        """Crea la colección limitada si el registro está activado"""
+        if not settings.SLOW_QUERY_LOG_ENABLED:
+            return
+        if SLOW_QUERIES not in await self.db.list_collection_names():
+            try:
+                await self.db.create_collection(
+                    SLOW_QUERIES, capped=True, size=settings.SLOW_QUERY_LOG_BYTES
+                )
+            except CollectionInvalid:
+                pass  # Otro worker la creó primero
+        await self.db.slow_queries.create_index(
+            [("collection_name", 1), ("recorded_at", -1)], name="collection_recorded_index"
+        )
+
+    @staticmethod
+    def is_slow(seconds: float) -> bool:
+        return (
+            settings.SLOW_QUERY_LOG_ENABLED
+            and seconds >= settings.SLOW_QUERY_THRESHOLD_SECONDS
+        )
+
+    def record(
+        self, scope, plan, pipeline: list, seconds: float, returned: int, timed_out=False
+    ):
+        """
+        Registra la búsqueda en segundo plano para no retrasar la respuesta.
+
+        :param scope: Ámbito de variantes consultado
+        :param plan: Plan de consulta usado (filtro, orden e índice sugerido)
+        :param pipeline: Pipeline de agregación de la página completa
+        :param seconds: Duración de la búsqueda
+        :param returned: Documentos devueltos
+        :param timed_out: Si la búsqueda agotó su tiempo
+        """
+        task = asyncio.create_task(
+            self._record(scope, plan, pipeline, seconds, returned, timed_out)
+        )
+        _PENDING.add(task)
+        task.add_done_callback(_PENDING.discard)
+
+    async def _explain(self, scope, pipeline: list, hint: Optional[str]) -> dict:
+        if _EXPLAIN_SLOTS.locked():
+            return {"winning_plan": None, "explain_skipped": "Otro explain en curso"}
+        async with _EXPLAIN_SLOTS:
+            aggregate = {
+                "aggregate": scope.collection.name,
+                "pipeline": pipeline,
+                "cursor": {},
+            }
+            if hint:
+                aggregate["hint"] = hint
+            verbosity = settings.SLOW_QUERY_EXPLAIN_VERBOSITY
+            try:
+                explain = await self.db.command(
+                    {
+                        "explain": aggregate,
+                        "verbosity": verbosity,
+                        "maxTimeMS": settings.SLOW_QUERY_EXPLAIN_MAX_TIME_MS,
+                    }
+                )
+            except PyMongoError as e:
+                if verbosity == "queryPlanner":
+                    return {"winning_plan": None, "explain_error": str(e)}
+                # Sin ejecutar la consulta de nuevo se obtiene al menos el plan
+                logger.warning(f"Explain with {verbosity} failed, retrying plan only: {e}")
+                explain = await self.db.command(
+                    {"explain": aggregate, "verbosity": "queryPlanner"}
+                )
+            return summarize_explain(explain)
+
+    async def _record(self, scope, plan, pipeline, seconds, returned, timed_out):
+        entry = {
+            "recorded_at": datetime.now(tz=timezone.utc),
+            "collection_name": scope.name,
+            "namespace": scope.collection.name,
+            "duration_ms": round(seconds * 1000, 1),
+            "timed_out": timed_out,
+            "returned": returned,
+            "hint": plan.hint,
+            "planner_notes": plan.notes,
+            "shape": query_shape(plan.query, plan.sort, scope.codec),
+            # Los operadores ($match, $and...) no se pueden guardar como claves
+            "pipeline": json_util.dumps(pipeline),
+        }
+        try:
+            entry.update(await self._explain(scope, pipeline, plan.hint))
+        except Exception as e:
+            entry.update({"winning_plan": None, "explain_error": str(e)})
+        try:
+            await self.db.slow_queries.insert_one(entry)
+        except Exception as e:
+            logger.error(f"Error recording slow query: {e}")
+
+    async def recent(
+        self, collection_name: Optional[str] = None, min_duration_ms: float = 0, limit: int = 50
+    ) -> List[dict]:
+        """Búsquedas lentas más recientes, con el pipeline ya decodificado"""
+        query = {}
+        if collection_name:
+            query["collection_name"] = collection_name
+        if min_duration_ms:
+            query["duration_ms"] = {"$gte": min_duration_ms}
+        entries = await self.db.slow_queries.find(query).sort("$natural", -1).to_list(
+            length=limit
+        )
+        for entry in entries:
+            entry["_id"] = str(entry["_id"])
+            entry["pipeline"] = json_util.loads(entry["pipeline"])
+        return entries
+
+    async def shapes(self, collection_name: Optional[str] = None) -> List[dict]:
+        """
+        Búsquedas lentas agrupadas por colección y forma de consulta, con las
+        que recorren la colección entera primero: candidatas a un índice nuevo.
+        """
+        match = {"collection_name": collection_name} if collection_name else {}
+        groups = await self.db.slow_queries.aggregate(
+            [
+                {"$match": match},
+                {
+                    "$group": {
+                        "_id": {
+                            "collection_name": "$collection_name",
+                            "shape": "$shape",
+                        },
+                        "count": {"$sum": 1},
+                        "timeouts": {"$sum": {"$cond": ["$timed_out", 1, 0]}},
+                        "avg_duration_ms": {"$avg": "$duration_ms"},
+                        "max_duration_ms": {"$max": "$duration_ms"},
+                        "max_docs_examined": {"$max": "$docs_examined"},
+                        "plans": {"$addToSet": "$winning_plan.stage"},
+                        "last_seen": {"$max": "$recorded_at"},
+                    }
+                },
+            ]
+        ).to_list(length=None)
+
+        result = []
+        for group in groups:
+            plans = [stages for stages in group.pop("plans") if stages]
+            result.append(
+                {
+                    **group.pop("_id"),
+                    **group,
+                    "collection_scan": any("COLLSCAN" in stages for stages in plans),
+                    "plans": plans,
+                }
+            )
+        result.sort(key=lambda item: (not item["collection_scan"], -item["count"]))
+        return result
@@ -0,0 +1,182 @@
+import json
+from typing import AsyncGenerator
+
+from fastapi import HTTPException
+
+from app.db.mongodb import get_async_database
+from app.db.variant_store import INDEXES_READY, resolve_scope
+from app.models.gene import CompareMode
+
+# Orden de la unión: debe coincidir con el índice genomic_position_index
+MERGE_KEY = ("chromosome", "position", "reference", "alternate")
+MERGE_INDEX = "genomic_position_index"
+
+COMPARE_PROJECTION = {
+    "_id": 0,
+    "chromosome": 1,
+    "position": 1,
+    "reference": 1,
+    "alternate": 1,
+    "id": 1,
+    "quality": 1,
+    "filter_status": 1,
+    "allele_frequency": 1,
+}
+
+# Lotes leídos de cada cursor y líneas agrupadas por escritura
+READ_BATCH_SIZE = 5000
+WRITE_BATCH_LINES = 1000
+
+
+def _merge_key(doc):
+    return tuple(doc.get(field) for field in MERGE_KEY)
+
+
+class VariantCompareService:
+    def __init__(self):
+        self.db = get_async_database()
+
+    async def validate(self, *collection_names: str):
+        for collection_name in collection_names:
+            record = await self.db.uploaded_files.find_one(
+                {"collection_name": collection_name}, {"_id": 1, "index_status": 1}
+            )
+            if record is None:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Colección no encontrada: {collection_name}",
+                )
+            # La unión recorre el índice genomic_position_index
+            if record.get("index_status", INDEXES_READY) != INDEXES_READY:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Los índices de {collection_name} aún no están listos",
+                )
+            # Las colecciones anteriores a ese índice, o cargadas sin él en
+            # VARIANT_INDEX_SET, no se pueden recorrer en orden; se comprueba
+            # antes de empezar a emitir la respuesta
+            scope = await resolve_scope(self.db, collection_name)
+            if MERGE_INDEX not in await scope.collection.index_information():
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"{collection_name} no tiene el índice {MERGE_INDEX}",
+                )
+
+    async def _chromosomes(self, scope) -> set:
+        if scope.codec.compact:
+            return set(scope.codec.dictionaries.values["chromosome"])
+        return set(await scope.collection.distinct("chromosome", scope.match({})))
+
+    async def _sorted_variants(self, scope, chromosomes):
+        """
+        Variantes del archivo en orden (cromosoma, posición, ref, alt).
+
+        Se recorre cromosoma por cromosoma en orden lexicográfico: en el
+        esquema compacto el índice ordena por código y los códigos de dos
+        archivos no coinciden.
+        """
+        codec = scope.codec
+        projection = codec.translate_projection(COMPARE_PROJECTION)
+        sort = codec.translate_keys([(field, 1) for field in MERGE_KEY])
+        for chromosome in chromosomes:
+            query = codec.translate_query({"chromosome": chromosome})
+            cursor = (
+                scope.collection.find(
+                    scope.match(query), projection, batch_size=READ_BATCH_SIZE
+                )
+                .sort(sort)
+                .hint(MERGE_INDEX)
+            )
+            while batch := await cursor.to_list(length=READ_BATCH_SIZE):
+                for doc in batch:
+                    yield codec.decode_document(doc)
+
+    @staticmethod
+    async def _grouped(variants):
+        """
+        Agrupa las variantes consecutivas con la misma clave de unión.
+
+        Un archivo puede repetir una variante; al unir grupos completos
+        cada repetición se compara con todas las del otro lado en lugar de
+        emparejarse una a una.
+        """
+        key, group = None, []
+        async for doc in variants:
+            doc_key = _merge_key(doc)
+            if group and doc_key != key:
+                yield key, group
+                group = []
+            key = doc_key
+            group.append(doc)
+        if group:
+            yield key, group
+
+    async def compare(
+        self, left: str, right: str, mode: CompareMode
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        Unión por mezcla de dos colecciones ordenadas por el mismo índice.
+        Usa memoria constante y emite NDJSON: una línea por variante del
+        modo pedido y una línea final con el resumen. Las variantes
+        compartidas salen en una línea por clave con las listas de
+        registros de cada lado; el resumen cuenta registros.
+        """
+        emit_left = mode in (CompareMode.LEFT_ONLY, CompareMode.DIFFERENCE)
+        emit_right = mode in (CompareMode.RIGHT_ONLY, CompareMode.DIFFERENCE)
+        emit_shared = mode == CompareMode.INTERSECTION
+        counts = {"shared_left": 0, "shared_right": 0, "left_only": 0, "right_only": 0}
+
+        left_scope = await resolve_scope(self.db, left)
+        right_scope = await resolve_scope(self.db, right)
+        chromosomes = sorted(
+            await self._chromosomes(left_scope) | await self._chromosomes(right_scope)
+        )
+        left_iter = self._grouped(self._sorted_variants(left_scope, chromosomes))
+        right_iter = self._grouped(self._sorted_variants(right_scope, chromosomes))
+        left_group = await anext(left_iter, None)
+        right_group = await anext(right_iter, None)
+        lines = []
+
+        while left_group is not None or right_group is not None:
+            if right_group is None or (
+                left_group is not None and left_group[0] < right_group[0]
+            ):
+                counts["left_only"] += len(left_group[1])
+                if emit_left:
+                    lines.extend(
+                        {"side": "left", "variant": doc} for doc in left_group[1]
+                    )
+                left_group = await anext(left_iter, None)
+            elif left_group is None or right_group[0] < left_group[0]:
+                counts["right_only"] += len(right_group[1])
+                if emit_right:
+                    lines.extend(
+                        {"side": "right", "variant": doc} for doc in right_group[1]
+                    )
+                right_group = await anext(right_iter, None)
+            else:
+                counts["shared_left"] += len(left_group[1])
+                counts["shared_right"] += len(right_group[1])
+                if emit_shared:
+                    lines.append(
+                        {"side": "both", "left": left_group[1], "right": right_group[1]}
+                    )
+                left_group = await anext(left_iter, None)
+                right_group = await anext(right_iter, None)
+
+            if len(lines) >= WRITE_BATCH_LINES:
+                yield "".join(json.dumps(line) + "\n" for line in lines).encode()
+                lines = []
+
+        summary = {
+            "summary": {
+                "left": left,
+                "right": right,
+                "mode": mode.value,
+                "left_total": counts["shared_left"] + counts["left_only"],
+                "right_total": counts["shared_right"] + counts["right_only"],
+                **counts,
+            }
+        }
+        lines.append(summary)
+        yield "".join(json.dumps(line) + "\n" for line in lines).encode()
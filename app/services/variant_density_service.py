@@ -0,0 +1,159 @@
+import numpy as np
+from fastapi import HTTPException
+
+from app.config import settings
+from app.db.mongodb import get_async_database
+from app.utils.DensityTileService import (
+    ALL_VARIANTS,
+    TILE_BINS,
+    TILE_RESOLUTIONS,
+    DensityTileService,
+    build_tiles,
+)
+
+# Documentos insertados por lote al guardar las teselas
+TILE_WRITE_BATCH = 1000
+
+
+class VariantDensityService:
+    """
+    Teselas de densidad de variantes por cromosoma a varias resoluciones.
+
+    Durante la ingesta cada checkpoint guarda en density_tile_deltas los
+    conteos a 1 kb de los registros desde el checkpoint anterior, con un
+    _id formado por el trabajo y el primer registro: al reanudar una carga
+    el delta se reescribe en lugar de sumarse dos veces. Al terminar la
+    carga se combinan los deltas y se guardan las teselas en density_tiles.
+    """
+
+    def __init__(self):
+        self.db = get_async_database()
+
+    async def ensure_indexes(self):
+        await self.db.density_tiles.create_index(
+            [
+                ("collection_name", 1),
+                ("category", 1),
+                ("resolution", 1),
+                ("chromosome", 1),
+                ("tile", 1),
+            ],
+            name="tile_window_index",
+        )
+        await self.db.density_tile_deltas.create_index(
+            [("job_id", 1), ("seq_start", 1)], name="job_seq_index"
+        )
+
+    async def save_delta(self, job_id: str, seq_start: int, tiles: DensityTileService):
+        """Guarda los conteos acumulados desde el registro seq_start"""
+        delta = tiles.to_delta()
+        if not delta:
+            return
+        await self.db.density_tile_deltas.replace_one(
+            {"_id": f"{job_id}:{seq_start:012d}"},
+            {"job_id": job_id, "seq_start": seq_start, "series": delta},
+            upsert=True,
+        )
+
+    async def build(self, collection_name: str) -> list:
+        """
+        Combina los deltas de la carga y reemplaza las teselas del archivo.
+
+        :return: Categorías disponibles
+        """
+        deltas = [
+            delta["series"]
+            async for delta in self.db.density_tile_deltas.find(
+                {"job_id": collection_name}, {"series": 1}
+            ).sort("seq_start", 1)
+        ]
+        await self.db.density_tiles.delete_many({"collection_name": collection_name})
+
+        categories = set()
+        batch = []
+        for tile in build_tiles(deltas):
+            categories.add(tile["category"])
+            batch.append({"collection_name": collection_name, **tile})
+            if len(batch) >= TILE_WRITE_BATCH:
+                await self.db.density_tiles.insert_many(batch, ordered=False)
+                batch = []
+        if batch:
+            await self.db.density_tiles.insert_many(batch, ordered=False)
+        return sorted(categories)
+
+    async def delete_deltas(self, collection_name: str):
+        await self.db.density_tile_deltas.delete_many({"job_id": collection_name})
+
+    async def discard(self, collection_name: str):
+        """Elimina teselas y deltas de una carga fallida"""
+        await self.db.density_tiles.delete_many({"collection_name": collection_name})
+        await self.delete_deltas(collection_name)
+
+    async def window(
+        self,
+        collection_name: str,
+        chromosome: str,
+        start: int,
+        end: int,
+        resolution: int,
+        category: str = ALL_VARIANTS,
+    ) -> dict:
+        """
+        Conteos de una ventana del cromosoma a la resolución pedida.
+
+        :return: Inicio y fin alineados a la resolución y un conteo por intervalo
+        """
+        if resolution not in TILE_RESOLUTIONS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Resolución no soportada; use una de {TILE_RESOLUTIONS}",
+            )
+        if end <= start:
+            raise HTTPException(status_code=400, detail="El fin debe ser mayor que el inicio")
+        first_bin = start // resolution
+        last_bin = (end - 1) // resolution
+        if last_bin - first_bin + 1 > settings.DENSITY_MAX_BINS:
+            raise HTTPException(
+                status_code=400,
+                detail=(
+                    f"La ventana tiene más de {settings.DENSITY_MAX_BINS} intervalos; "
+                    "use una resolución menor"
+                ),
+            )
+
+        file_record = await self.db.uploaded_files.find_one(
+            {"collection_name": collection_name}, {"_id": 0, "density": 1}
+        )
+        if file_record is None:
+            raise HTTPException(status_code=404, detail="Colección no encontrada")
+        if "density" not in file_record:
+            raise HTTPException(
+                status_code=404, detail="La colección no tiene teselas de densidad"
+            )
+
+        counts = np.zeros(last_bin - first_bin + 1, dtype=np.int64)
+        cursor = self.db.density_tiles.find(
+            {
+                "collection_name": collection_name,
+                "category": category,
+                "resolution": resolution,
+                "chromosome": chromosome,
+                "tile": {"$gte": first_bin // TILE_BINS, "$lte": last_bin // TILE_BINS},
+            },
+            {"_id": 0, "tile": 1, "offsets": 1, "counts": 1},
+        )
+        async for tile in cursor:
+            bins = tile["tile"] * TILE_BINS + np.asarray(tile["offsets"], dtype=np.int64)
+            inside = (bins >= first_bin) & (bins <= last_bin)
+            counts[bins[inside] - first_bin] = np.asarray(tile["counts"])[inside]
+
+        return {
+            "collection_name": collection_name,
+            "chromosome": chromosome,
+            "category": category,
+            "resolution": resolution,
+            "start": first_bin * resolution,
+            "end": (last_bin + 1) * resolution,
+            "counts": counts.tolist(),
+            "categories": file_record["density"]["categories"],
+        }
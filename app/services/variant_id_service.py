@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+
+from bson import Binary
+from fastapi import HTTPException
+
+from app.config import settings
+from app.db.mongodb import get_async_database
+from app.db.variant_store import resolve_scope
+from app.models.gene import VariantIdLookupResult
+from app.services.gene_search_service import RESULT_PROJECTION, document_to_gene
+from app.utils.BloomFilter import BloomFilter
+from app.utils.metrics import SEARCH_LATENCY, SEARCH_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Margen bajo el límite de 16 MB de un documento BSON
+BLOOM_FILTER_MAX_BYTES = 15 * 1024 * 1024
+# Identificadores leídos y añadidos al filtro por lote
+BLOOM_BUILD_BATCH = 10000
+ID_INDEX = "id_index"
+
+# Filtros cargados en este proceso y construcciones en curso
+_BLOOM_FILTERS = {}
+_BLOOM_BUILDS = {}
+
+
+class VariantIdLookupService:
+    def __init__(self):
+        self.db = get_async_database()
+
+    async def lookup(self, collection_name: str, ids) -> VariantIdLookupResult:
+        """
+        Resolver identificadores de variantes con una sola consulta $in
+        sobre el índice de id.
+        """
+        requested = list(dict.fromkeys(variant_id for variant_id in ids if variant_id))
+        if len(requested) > settings.ID_LOOKUP_MAX_IDS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Máximo {settings.ID_LOOKUP_MAX_IDS} identificadores por petición",
+            )
+
+        start = time.perf_counter()
+        candidates = requested
+        if settings.ID_BLOOM_FILTER_ENABLED:
+            bloom = await self.get_bloom_filter(collection_name)
+            if bloom is not None:
+                # Los identificadores ausentes del filtro no existen
+                candidates = [variant_id for variant_id in requested if variant_id in bloom]
+
+        docs = []
+        if candidates:
+            scope = await resolve_scope(self.db, collection_name)
+            codec = scope.codec
+            cursor = scope.collection.find(
+                scope.match(codec.translate_query({"id": {"$in": candidates}})),
+                codec.translate_projection(RESULT_PROJECTION),
+            )
+            docs = [
+                codec.decode_document(doc)
+                for doc in await cursor.to_list(length=None)
+            ]
+        elapsed = time.perf_counter() - start
+        SEARCH_SECONDS.labels("ids").observe(elapsed)
+        SEARCH_LATENCY.observe(elapsed)
+
+        found_ids = {doc.get("id") for doc in docs}
+        return VariantIdLookupResult(
+            requested=len(requested),
+            found=len(found_ids),
+            missing=[variant_id for variant_id in requested if variant_id not in found_ids],
+            results=[document_to_gene(doc) for doc in docs],
+        )
+
+    async def get_bloom_filter(self, collection_name: str):
+        """
+        Filtro de Bloom de la colección, o None mientras se construye.
+        Las colecciones no cambian después de la ingesta, así que el filtro
+        se construye una vez y se guarda en id_bloom_filters.
+        """
+        bloom = _BLOOM_FILTERS.get(collection_name)
+        if bloom is not None:
+            return bloom
+
+        stored = await self.db.id_bloom_filters.find_one(
+            {"collection_name": collection_name}
+        )
+        if stored is not None:
+            bloom = BloomFilter(stored["num_bits"], stored["num_hashes"], stored["bits"])
+            _BLOOM_FILTERS[collection_name] = bloom
+            return bloom
+
+        scope = await resolve_scope(self.db, collection_name)
+        if not scope.indexes_ready:
+            # El recorrido usa id_index: esperar a que esté construido
+            return None
+
+        if collection_name not in _BLOOM_BUILDS:
+            _BLOOM_BUILDS[collection_name] = asyncio.create_task(
+                self._build_bloom_filter(collection_name)
+            )
+        return None
+
+    async def _build_bloom_filter(self, collection_name: str):
+        try:
+            scope = await resolve_scope(self.db, collection_name)
+            capacity = await scope.document_count()
+            bloom = BloomFilter.for_capacity(
+                capacity,
+                settings.ID_BLOOM_FILTER_ERROR_RATE,
+                max_bytes=BLOOM_FILTER_MAX_BYTES,
+            )
+
+            # Recorrido cubierto por el índice de id; las colecciones sin él
+            # (anteriores al índice o sin él en VARIANT_INDEX_SET) se recorren
+            # enteras una sola vez
+            id_field = scope.codec.field("id")
+            cursor = scope.collection.find(
+                scope.match({id_field: {"$gt": ""}}),
+                {"_id": 0, id_field: 1},
+                batch_size=BLOOM_BUILD_BATCH,
+            )
+            if ID_INDEX in await scope.collection.index_information():
+                cursor = cursor.hint(ID_INDEX)
+            while batch := await cursor.to_list(length=BLOOM_BUILD_BATCH):
+                # El cálculo de los hashes no bloquea el bucle de eventos
+                await asyncio.to_thread(bloom.update, [doc[id_field] for doc in batch])
+
+            await self.db.id_bloom_filters.replace_one(
+                {"collection_name": collection_name},
+                {
+                    "collection_name": collection_name,
+                    "num_bits": bloom.num_bits,
+                    "num_hashes": bloom.num_hashes,
+                    "bits": Binary(bloom.to_bytes()),
+                },
+                upsert=True,
+            )
+            _BLOOM_FILTERS[collection_name] = bloom
+            logger.info(f"Filtro de Bloom de ids construido para {collection_name}")
+        except Exception as e:
+            logger.error(f"Error construyendo el filtro de Bloom: {e}")
+        finally:
+            _BLOOM_BUILDS.pop(collection_name, None)
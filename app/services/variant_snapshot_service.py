@@ -0,0 +1,246 @@
+import os
+import time
+import shutil
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.config import settings
+from app.db.mongodb import get_async_database
+from app.db.variant_store import resolve_scope
+from app.utils.ColumnarSnapshotService import (
+    META_FILE,
+    ColumnarSnapshotService,
+    ColumnarSnapshotWriter,
+)
+
+logger = logging.getLogger(__name__)
+
+# Estados de la construcción de un snapshot en uploaded_files.snapshot
+SNAPSHOT_BUILDING = "building"
+SNAPSHOT_READY = "ready"
+SNAPSHOT_FAILED = "failed"
+
+# Una construcción sin avances en este tiempo se da por abandonada
+SNAPSHOT_BUILD_STALE_SECONDS = 300
+
+# Snapshots abiertos por colección: (comprobado en, ruta, snapshot)
+SNAPSHOT_CACHE_TTL = 60
+_SNAPSHOT_CACHE = {}
+
+# Construcciones en segundo plano de este proceso
+_BUILDS = set()
+
+
+async def cancel_snapshot_builds():
+    """Cancela las construcciones en curso de este proceso al apagar el servidor"""
+    for task in list(_BUILDS):
+        task.cancel()
+    await asyncio.gather(*_BUILDS, return_exceptions=True)
+
+
+def _directory_size(path: str) -> int:
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+class VariantSnapshotService:
+    """
+    Snapshots columnares de colecciones cuya carga terminó.
+
+    La colección se copia en orden de _id a columnas en SNAPSHOT_FOLDER que
+    después se abren con memoria mapeada; las búsquedas que el snapshot
+    puede resolver no pasan por MongoDB. Cada construcción escribe en un
+    directorio nuevo y el anterior se elimina al terminar, así que las
+    búsquedas siguen usando el snapshot viejo mientras tanto.
+    """
+
+    def __init__(self):
+        self.db = get_async_database()
+
+    @staticmethod
+    def _require_folder():
+        if not settings.SNAPSHOT_FOLDER:
+            raise HTTPException(status_code=400, detail="SNAPSHOT_FOLDER no está configurado")
+
+    async def _claim(self, collection_name: str):
+        """
+        Marca el snapshot como en construcción.
+
+        :raises HTTPException: 404 si la colección no existe, 409 si la carga
+            no terminó o ya hay una construcción en curso
+        """
+        record = await self.db.uploaded_files.find_one(
+            {"collection_name": collection_name}, {"_id": 1}
+        )
+        if record is None:
+            raise HTTPException(status_code=404, detail="Colección no encontrada")
+        job = await self.db.ingest_jobs.find_one({"_id": collection_name}, {"status": 1})
+        # Los archivos anteriores a los trabajos de carga no tienen trabajo
+        if job is not None and job["status"] != "completed":
+            raise HTTPException(status_code=409, detail="La carga de la colección no ha terminado")
+
+        now = datetime.now(tz=timezone.utc)
+        result = await self.db.uploaded_files.update_one(
+            {
+                "collection_name": collection_name,
+                "$or": [
+                    {"snapshot.status": {"$ne": SNAPSHOT_BUILDING}},
+                    {
+                        "snapshot.updated_at": {
+                            "$lt": now - timedelta(seconds=SNAPSHOT_BUILD_STALE_SECONDS)
+                        }
+                    },
+                ],
+            },
+            {
+                "$set": {
+                    "snapshot.status": SNAPSHOT_BUILDING,
+                    "snapshot.started_at": now,
+                    "snapshot.updated_at": now,
+                    "snapshot.error": None,
+                }
+            },
+        )
+        if result.matched_count == 0:
+            raise HTTPException(status_code=409, detail="El snapshot ya se está construyendo")
+
+    async def start_build(self, collection_name: str) -> dict:
+        """
+        Inicia la construcción del snapshot en segundo plano.
+
+        :return: Estado del snapshot
+        """
+        self._require_folder()
+        await self._claim(collection_name)
+        task = asyncio.create_task(self._build(collection_name))
+        _BUILDS.add(task)
+        task.add_done_callback(_BUILDS.discard)
+        return await self.status(collection_name)
+
+    async def build(self, collection_name: str):
+        """Construye el snapshot y espera a que termine"""
+        self._require_folder()
+        await self._claim(collection_name)
+        await self._build(collection_name)
+
+    async def _set_status(self, collection_name: str, fields: dict):
+        await self.db.uploaded_files.update_one(
+            {"collection_name": collection_name},
+            {"$set": {f"snapshot.{key}": value for key, value in fields.items()}},
+        )
+
+    async def _build(self, collection_name: str):
+        scope = await resolve_scope(self.db, collection_name)
+        path = os.path.join(settings.SNAPSHOT_FOLDER, f"{collection_name}-{ObjectId()}")
+        writer = await asyncio.to_thread(ColumnarSnapshotWriter, path)
+        start = time.perf_counter()
+        try:
+            cursor = (
+                scope.collection.find(scope.match({}))
+                .sort("_id", 1)
+                .batch_size(settings.SNAPSHOT_BUILD_BATCH)
+            )
+            batch = []
+            async for doc in cursor:
+                batch.append(scope.codec.decode_document(doc))
+                if len(batch) >= settings.SNAPSHOT_BUILD_BATCH:
+                    await asyncio.to_thread(writer.append, batch)
+                    batch = []
+                    await self._set_status(
+                        collection_name,
+                        {"rows": writer.rows, "updated_at": datetime.now(tz=timezone.utc)},
+                    )
+            await asyncio.to_thread(writer.append, batch)
+            meta = await asyncio.to_thread(writer.close)
+        except BaseException as e:
+            writer.abort()
+            shutil.rmtree(path, ignore_errors=True)
+            cancelled = isinstance(e, asyncio.CancelledError)
+            await self._set_status(
+                collection_name,
+                {
+                    "status": SNAPSHOT_FAILED,
+                    "error": "Construcción interrumpida" if cancelled else str(e),
+                    "updated_at": datetime.now(tz=timezone.utc),
+                },
+            )
+            if cancelled:
+                raise
+            logger.error(f"Error building snapshot of {collection_name}: {e}")
+            return
+
+        record = await self.db.uploaded_files.find_one(
+            {"collection_name": collection_name}, {"snapshot.path": 1}
+        )
+        previous = (record.get("snapshot") or {}).get("path")
+        build_seconds = time.perf_counter() - start
+        now = datetime.now(tz=timezone.utc)
+        await self._set_status(
+            collection_name,
+            {
+                "status": SNAPSHOT_READY,
+                "path": path,
+                "rows": meta["rows"],
+                "bytes": _directory_size(path),
+                "build_seconds": build_seconds,
+                "built_at": now,
+                "updated_at": now,
+            },
+        )
+        _SNAPSHOT_CACHE.pop(collection_name, None)
+        if previous and previous != path:
+            # Los procesos que aún lo tengan mapeado siguen leyéndolo sin problema
+            shutil.rmtree(previous, ignore_errors=True)
+        logger.info(
+            f"Snapshot of {collection_name} built: {meta['rows']} rows in {build_seconds:.1f} s"
+        )
+
+    async def status(self, collection_name: str) -> dict:
+        record = await self.db.uploaded_files.find_one(
+            {"collection_name": collection_name}, {"_id": 0, "snapshot": 1}
+        )
+        if record is None:
+            raise HTTPException(status_code=404, detail="Colección no encontrada")
+        return {"collection_name": collection_name, "snapshot": record.get("snapshot")}
+
+    async def delete(self, collection_name: str):
+        """Elimina el snapshot; las búsquedas vuelven a MongoDB"""
+        record = await self.db.uploaded_files.find_one_and_update(
+            {"collection_name": collection_name},
+            {"$unset": {"snapshot": ""}},
+            projection={"snapshot": 1},
+        )
+        if record is None:
+            raise HTTPException(status_code=404, detail="Colección no encontrada")
+        _SNAPSHOT_CACHE.pop(collection_name, None)
+        path = (record.get("snapshot") or {}).get("path")
+        if path:
+            shutil.rmtree(path, ignore_errors=True)
+
+    async def get(self, collection_name: str) -> Optional[ColumnarSnapshotService]:
+        """
+        Snapshot de la colección si existe en este servidor, con caché de
+        corta duración.
+        """
+        if not settings.SNAPSHOT_FOLDER:
+            return None
+        cached = _SNAPSHOT_CACHE.get(collection_name)
+        if cached and time.monotonic() - cached[0] < SNAPSHOT_CACHE_TTL:
+            return cached[2]
+
+        record = await self.db.uploaded_files.find_one(
+            {"collection_name": collection_name}, {"_id": 0, "snapshot.path": 1}
+        )
+        path = ((record or {}).get("snapshot") or {}).get("path")
+        snapshot = None
+        if path and os.path.exists(os.path.join(path, META_FILE)):
+            if cached and cached[1] == path:
+                snapshot = cached[2]
+            else:
+                snapshot = await asyncio.to_thread(ColumnarSnapshotService, path)
+        _SNAPSHOT_CACHE[collection_name] = (time.monotonic(), path, snapshot)
+        return snapshot
@@ -0,0 +1,378 @@
+import json
+import mmap
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from app.models.gene import FilterOperator, GenePredicate
+
+SNAPSHOT_VERSION = 1
+META_FILE = "meta.json"
+
+# Fixed-width columns; optional counts use MISSING_INT and optional floats NaN
+NUMERIC_COLUMNS = {
+    "position": "int64",
+    "quality": "float64",
+    "allele_count": "int64",
+    "allele_number": "int64",
+    "allele_frequency": "float64",
+    "het_count": "int64",
+    "hom_alt_count": "int64",
+    "missing_count": "int64",
+    "call_rate": "float64",
+}
+MISSING_INT = -1
+# Low-cardinality strings stored as int32 codes into a per-snapshot dictionary
+DICTIONARY_COLUMNS = ("chromosome", "filter_status", "format")
+# Variable-length strings stored as UTF-8 in a blob with row offsets
+STRING_COLUMNS = ("id", "reference", "alternate", "info")
+# Genotypes stored as one JSON object per row, also offsets plus blob
+OUTPUTS_COLUMN = "outputs"
+BLOB_COLUMNS = STRING_COLUMNS + (OUTPUTS_COLUMN,)
+
+# Fields the free-text search matches, as in GeneQueryPlanner.build_match
+SEARCH_FIELDS = ("chromosome", "filter_status", "info", "format")
+
+# Rows evaluated per block; results in row order stop at the first full page
+SCAN_BLOCK_ROWS = 1 << 16
+
+ROW_ORDER = "_id"
+
+
+class ColumnarSnapshotWriter:
+    """
+    Writes variant documents into a columnar snapshot directory, one batch at
+    a time, so collections larger than memory can be materialized.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self.rows = 0
+        self.dictionaries: Dict[str, Dict[str, int]] = {
+            column: {} for column in DICTIONARY_COLUMNS
+        }
+        self._files = {}
+        self._blob_sizes = {column: 0 for column in BLOB_COLUMNS}
+        for column in NUMERIC_COLUMNS:
+            self._files[column] = open(os.path.join(path, f"{column}.bin"), "wb")
+        for column in DICTIONARY_COLUMNS:
+            self._files[column] = open(os.path.join(path, f"{column}.codes"), "wb")
+        for column in BLOB_COLUMNS:
+            self._files[f"{column}.offsets"] = open(
+                os.path.join(path, f"{column}.offsets"), "wb"
+            )
+            self._files[f"{column}.blob"] = open(os.path.join(path, f"{column}.blob"), "wb")
+            # Offsets hold rows + 1 entries, starting at 0
+            np.zeros(1, dtype=np.int64).tofile(self._files[f"{column}.offsets"])
+
+    def append(self, docs: List[dict]):
+        """
+        Append a batch of variant documents with logical field names.
+
+        :param docs: Decoded documents, in the order the rows should keep
+        """
+        if not docs:
+            return
+        for column, dtype in NUMERIC_COLUMNS.items():
+            if dtype == "int64":
+                values = [
+                    MISSING_INT if doc.get(column) is None else doc[column] for doc in docs
+                ]
+            else:
+                values = [
+                    np.nan if doc.get(column) is None else doc[column] for doc in docs
+                ]
+            np.asarray(values, dtype=dtype).tofile(self._files[column])
+
+        for column in DICTIONARY_COLUMNS:
+            dictionary = self.dictionaries[column]
+            codes = [
+                dictionary.setdefault(doc.get(column) or "", len(dictionary))
+                for doc in docs
+            ]
+            np.asarray(codes, dtype=np.int32).tofile(self._files[column])
+
+        for column in BLOB_COLUMNS:
+            if column == OUTPUTS_COLUMN:
+                encoded = [
+                    json.dumps(doc.get(column) or {}, separators=(",", ":")).encode()
+                    for doc in docs
+                ]
+            else:
+                encoded = [(doc.get(column) or "").encode() for doc in docs]
+            lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+            offsets = self._blob_sizes[column] + np.cumsum(lengths)
+            self._files[f"{column}.blob"].write(b"".join(encoded))
+            offsets.tofile(self._files[f"{column}.offsets"])
+            self._blob_sizes[column] = int(offsets[-1])
+
+        self.rows += len(docs)
+
+    def close(self) -> dict:
+        """
+        Flush the columns and write the metadata.
+
+        :return: Snapshot metadata
+        """
+        for handle in self._files.values():
+            handle.close()
+        meta = {
+            "version": SNAPSHOT_VERSION,
+            "rows": self.rows,
+            "numeric_columns": NUMERIC_COLUMNS,
+            "dictionaries": {
+                column: list(dictionary) for column, dictionary in self.dictionaries.items()
+            },
+            "blob_columns": list(BLOB_COLUMNS),
+        }
+        with open(os.path.join(self.path, META_FILE), "w") as handle:
+            json.dump(meta, handle)
+        return meta
+
+    def abort(self):
+        for handle in self._files.values():
+            handle.close()
+
+
+def _map_blob(path: str):
+    if os.path.getsize(path) == 0:
+        return b""
+    with open(path, "rb") as handle:
+        return mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class ColumnarSnapshotService:
+    """
+    Read-only, memory-mapped view of a columnar snapshot that answers
+    searches with vectorized scans over the columns.
+
+    Supports the typed filters on numeric and dictionary-coded fields, the
+    free-text search (case-insensitive substring, like the Mongo ``$regex``
+    search), and sorting by any numeric or dictionary field. ``search``
+    returns None for anything else so the caller can fall back to Mongo.
+    Pages hold only the documents of the page: like the Mongo path,
+    ``total_results`` is the page size.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, META_FILE)) as handle:
+            self.meta = json.load(handle)
+        self.rows = self.meta["rows"]
+        self.columns = {}
+        for column, dtype in self.meta["numeric_columns"].items():
+            self.columns[column] = self._map_array(f"{column}.bin", dtype, self.rows)
+        self.dictionaries = self.meta["dictionaries"]
+        self.codes = {
+            column: self._map_array(f"{column}.codes", "int32", self.rows)
+            for column in self.dictionaries
+        }
+        self.offsets = {
+            column: self._map_array(f"{column}.offsets", "int64", self.rows + 1)
+            for column in self.meta["blob_columns"]
+        }
+        self.blobs = {
+            column: _map_blob(os.path.join(path, f"{column}.blob"))
+            for column in self.meta["blob_columns"]
+        }
+
+    def _map_array(self, filename: str, dtype: str, length: int) -> np.ndarray:
+        if length == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(
+            os.path.join(self.path, filename), dtype=dtype, mode="r", shape=(length,)
+        )
+
+    def supports(
+        self, predicates: List[GenePredicate], sort: List[Tuple[str, int]]
+    ) -> bool:
+        """Whether the snapshot can answer the query without Mongo"""
+        for predicate in predicates:
+            if predicate.field not in self.columns and predicate.field not in self.codes:
+                return False
+        for field, _ in sort:
+            if field != ROW_ORDER and field not in self.columns and field not in self.codes:
+                return False
+        return True
+
+    # -- Filters -----------------------------------------------------------
+
+    @staticmethod
+    def _compare(values, operator: FilterOperator, value):
+        if operator == FilterOperator.EQ:
+            return values == value
+        if operator == FilterOperator.NE:
+            return values != value
+        if operator == FilterOperator.GT:
+            return values > value
+        if operator == FilterOperator.GTE:
+            return values >= value
+        if operator == FilterOperator.LT:
+            return values < value
+        if operator == FilterOperator.LTE:
+            return values <= value
+        if operator == FilterOperator.IN:
+            return np.isin(values, value)
+        low, high = value
+        return (values >= low) & (values <= high)
+
+    def _matching_codes(self, column: str, predicate: GenePredicate) -> List[int]:
+        """Dictionary codes whose value satisfies the predicate"""
+        dictionary = self.dictionaries[column]
+        values = np.asarray(dictionary, dtype=object)
+        matches = self._compare(values, predicate.operator, predicate.value)
+        return np.flatnonzero(np.asarray(matches, dtype=bool)).tolist()
+
+    def _predicate_mask(self, predicate: GenePredicate, start: int, stop: int) -> np.ndarray:
+        if predicate.field in self.codes:
+            codes = self.codes[predicate.field][start:stop]
+            return np.isin(codes, self._matching_codes(predicate.field, predicate))
+        values = self.columns[predicate.field][start:stop]
+        mask = self._compare(values, predicate.operator, predicate.value)
+        # Missing values only match "!=", as null does in Mongo
+        if predicate.operator != FilterOperator.NE and values.dtype == np.int64:
+            mask &= values != MISSING_INT
+        return mask
+
+    def _scan_text(self, column: str, pattern, start: int, stop: int) -> np.ndarray:
+        """Rows in [start, stop) whose string in column matches pattern"""
+        offsets = self.offsets[column]
+        blob = self.blobs[column]
+        found = np.zeros(stop - start, dtype=bool)
+        position, end = int(offsets[start]), int(offsets[stop])
+        while position < end:
+            match = pattern.search(blob, position, end)
+            if match is None:
+                break
+            row = int(np.searchsorted(offsets, match.start(), side="right")) - 1
+            row_end = int(offsets[row + 1])
+            # A match running into the next row is not a match
+            if match.end() <= row_end:
+                found[row - start] = True
+            # One match per row is enough: continue with the next row
+            position = row_end
+        return found
+
+    def _search_mask(self, search: str, start: int, stop: int, candidates: np.ndarray):
+        term = re.escape(search.strip())
+        text_pattern = re.compile(term, re.IGNORECASE)
+        mask = np.zeros(stop - start, dtype=bool)
+        for column in SEARCH_FIELDS:
+            if column in self.codes:
+                codes = [
+                    code
+                    for code, value in enumerate(self.dictionaries[column])
+                    if text_pattern.search(value)
+                ]
+                if codes:
+                    mask |= np.isin(self.codes[column][start:stop], codes)
+        if (candidates & ~mask).any():
+            blob_pattern = re.compile(term.encode(), re.IGNORECASE)
+            mask |= self._scan_text("info", blob_pattern, start, stop)
+        return mask
+
+    def _block_matches(self, predicates, search, start: int, stop: int) -> np.ndarray:
+        mask = np.ones(stop - start, dtype=bool)
+        for predicate in predicates:
+            mask &= self._predicate_mask(predicate, start, stop)
+            if not mask.any():
+                return mask
+        if search:
+            mask &= self._search_mask(search, start, stop, mask)
+        return mask
+
+    def match_rows(
+        self,
+        predicates: List[GenePredicate],
+        search: Optional[str] = None,
+        stop_after: Optional[int] = None,
+    ) -> np.ndarray:
+        """
+        Row numbers matching every predicate and the free-text search.
+
+        :param stop_after: Stop scanning once this many rows matched
+        """
+        found = []
+        matched = 0
+        for start in range(0, self.rows, SCAN_BLOCK_ROWS):
+            stop = min(start + SCAN_BLOCK_ROWS, self.rows)
+            rows = start + np.flatnonzero(self._block_matches(predicates, search, start, stop))
+            found.append(rows)
+            matched += len(rows)
+            if stop_after is not None and matched >= stop_after:
+                break
+        if not found:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(found)
+
+    # -- Sorting and documents ---------------------------------------------
+
+    def _sort_key(self, field: str, rows: np.ndarray, direction: int) -> np.ndarray:
+        if field in self.codes:
+            # Order by the string value, not by the code
+            rank = np.empty(len(self.dictionaries[field]), dtype=np.int64)
+            rank[np.argsort(np.asarray(self.dictionaries[field], dtype=object))] = np.arange(
+                len(rank)
+            )
+            key = rank[self.codes[field][rows]]
+        else:
+            key = np.asarray(self.columns[field][rows], dtype=np.float64)
+            # Missing values sort first, as null does in Mongo
+            key = np.where(np.isnan(key), -np.inf, key)
+            if self.columns[field].dtype == np.int64:
+                key = np.where(key == MISSING_INT, -np.inf, key)
+        return key if direction > 0 else -key
+
+    def _string(self, column: str, row: int) -> str:
+        offsets = self.offsets[column]
+        return self.blobs[column][int(offsets[row]) : int(offsets[row + 1])].decode()
+
+    def document(self, row: int) -> dict:
+        """Variant document of a row, with logical field names"""
+        doc = {}
+        for column, values in self.columns.items():
+            value = values[row].item()
+            if values.dtype == np.int64:
+                doc[column] = None if value == MISSING_INT else value
+            else:
+                doc[column] = None if np.isnan(value) else value
+        for column, codes in self.codes.items():
+            doc[column] = self.dictionaries[column][codes[row]]
+        for column in STRING_COLUMNS:
+            doc[column] = self._string(column, row)
+        doc[OUTPUTS_COLUMN] = json.loads(self._string(OUTPUTS_COLUMN, row))
+        return doc
+
+    def search(
+        self,
+        predicates: List[GenePredicate],
+        search: Optional[str],
+        sort: List[Tuple[str, int]],
+        skip: int,
+        limit: int,
+    ) -> Optional[List[dict]]:
+        """
+        One page of matching documents.
+
+        :param predicates: Typed filters with logical field names
+        :param search: Free-text term, or None
+        :param sort: (field, direction) pairs; row order if empty
+        :return: Documents, or None if the snapshot cannot answer the query
+        """
+        if not self.supports(predicates, sort):
+            return None
+        sort = [(field, direction) for field, direction in sort if field != ROW_ORDER]
+        if not sort:
+            rows = self.match_rows(predicates, search, stop_after=skip + limit)
+            page = rows[skip : skip + limit]
+        else:
+            rows = self.match_rows(predicates, search)
+            # np.lexsort sorts by its last key first; the row number breaks ties
+            keys = [rows] + [
+                self._sort_key(field, rows, direction) for field, direction in reversed(sort)
+            ]
+            page = rows[np.lexsort(keys)][skip : skip + limit]
+        return [self.document(int(row)) for row in page]
+
@@ -0,0 +1,129 @@
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+from app.models.gene import GeneCreate
+from app.utils.VariantStatsService import VariantStatsService
+
+# Bin widths in bases, finest first; coarser levels are derived from the finest
+TILE_RESOLUTIONS = [1_000, 10_000, 100_000, 1_000_000]
+BASE_RESOLUTION = TILE_RESOLUTIONS[0]
+# Bins stored per tile document
+TILE_BINS = 1000
+
+ALL_VARIANTS = "all"
+
+
+class DensityTileService:
+    """
+    Counts variants per chromosome in fixed-width bins at the finest
+    resolution while chunks stream through ingest.
+
+    Besides the ``all`` series, counts can be split by FILTER value
+    (``filter:PASS``) and by variant type (``type:snp``).
+    """
+
+    def __init__(self, splits: Iterable[str] = ()):
+        self.splits = set(splits)
+        # (chromosome, category) -> {bin: count}
+        self.series: Dict[Tuple[str, str], Dict[int, int]] = {}
+
+    def _categories(self, gene: GeneCreate) -> List[str]:
+        categories = [ALL_VARIANTS]
+        if "filter" in self.splits:
+            categories.append(f"filter:{gene.filter_status}")
+        if "type" in self.splits:
+            categories.append(
+                f"type:{VariantStatsService.classify(gene.reference, gene.alternate)}"
+            )
+        return categories
+
+    def add_chunk(self, genes: List[GeneCreate]):
+        """Add a parsed chunk to the base-resolution counts."""
+        if not genes:
+            return
+        keys = [
+            (gene.chromosome, category)
+            for gene in genes
+            for category in self._categories(gene)
+        ]
+        repeat = len(keys) // len(genes)
+        bins = np.repeat(
+            np.fromiter((gene.position for gene in genes), dtype=np.int64, count=len(genes))
+            // BASE_RESOLUTION,
+            repeat,
+        )
+
+        # Group the (series, bin) pairs and count them in one pass
+        series_index = {}
+        codes = np.fromiter(
+            (series_index.setdefault(key, len(series_index)) for key in keys),
+            dtype=np.int64,
+            count=len(keys),
+        )
+        pairs, counts = np.unique(
+            np.stack([codes, bins], axis=1), axis=0, return_counts=True
+        )
+        series_keys = list(series_index)
+        for (code, bin_number), count in zip(pairs.tolist(), counts.tolist()):
+            series = self.series.setdefault(series_keys[code], {})
+            series[bin_number] = series.get(bin_number, 0) + count
+
+    def to_delta(self) -> List[dict]:
+        """Serialize the counts accumulated so far, one entry per series."""
+        delta = []
+        for (chromosome, category), series in self.series.items():
+            bins = sorted(series)
+            delta.append(
+                {
+                    "chromosome": chromosome,
+                    "category": category,
+                    "bins": bins,
+                    "counts": [series[bin_number] for bin_number in bins],
+                }
+            )
+        return delta
+
+    def reset(self):
+        self.series = {}
+
+
+def build_tiles(deltas: Iterable[List[dict]]) -> Iterable[dict]:
+    """
+    Merge base-resolution deltas and derive every resolution.
+
+    :param deltas: Series lists produced by DensityTileService.to_delta
+    :yields: Tile documents with the bins of one TILE_BINS-wide window,
+        stored sparsely as offsets within the tile and counts
+    """
+    merged: Dict[Tuple[str, str], Tuple[list, list]] = {}
+    for delta in deltas:
+        for series in delta:
+            bins, counts = merged.setdefault(
+                (series["chromosome"], series["category"]), ([], [])
+            )
+            bins.extend(series["bins"])
+            counts.extend(series["counts"])
+
+    for (chromosome, category), (bins, counts) in merged.items():
+        bins = np.asarray(bins, dtype=np.int64)
+        counts = np.asarray(counts, dtype=np.int64)
+        for resolution in TILE_RESOLUTIONS:
+            coarse = bins // (resolution // BASE_RESOLUTION)
+            level_bins, inverse = np.unique(coarse, return_inverse=True)
+            level_counts = np.bincount(inverse, weights=counts).astype(np.int64)
+
+            tiles = level_bins // TILE_BINS
+            boundaries = np.flatnonzero(np.diff(tiles)) + 1
+            for tile_bins, tile_counts in zip(
+                np.split(level_bins, boundaries), np.split(level_counts, boundaries)
+            ):
+                tile = int(tile_bins[0] // TILE_BINS)
+                yield {
+                    "chromosome": chromosome,
+                    "category": category,
+                    "resolution": resolution,
+                    "tile": tile,
+                    "offsets": (tile_bins - tile * TILE_BINS).tolist(),
+                    "counts": tile_counts.tolist(),
+                    "total": int(tile_counts.sum()),
+                }
@@ -0,0 +1,81 @@
+import re
+from typing import List
+
+import numpy as np
+from app.models.gene import GeneCreate
+
+ALLELE_SEPARATOR = re.compile(r"[/|]")
+
+
+class GenotypeSummaryService:
+    """Computes per-variant allele counts and genotype summaries with NumPy."""
+
+    # Columns of the per-genotype lookup table
+    ALT_ALLELES, CALLED_ALLELES, HET, HOM_ALT, MISSING = range(5)
+
+    @classmethod
+    def _genotype_row(cls, genotype: str) -> List[int]:
+        """Allele counts for a single GT string such as 0/1, 1|1 or ./."""
+        alleles = ALLELE_SEPARATOR.split(genotype) if genotype else ["."]
+        called = [allele for allele in alleles if allele != "."]
+        alt = sum(1 for allele in called if allele != "0")
+        fully_called = len(called) == len(alleles)
+        return [
+            alt,
+            len(called),
+            int(fully_called and len(set(called)) > 1),
+            int(fully_called and len(set(called)) == 1 and called[0] != "0"),
+            int(not called),
+        ]
+
+    def summarize_chunk(self, genes: List[GeneCreate]):
+        """
+        Fill in allele and genotype summary fields for a parsed chunk.
+
+        Genotype strings are decoded once per distinct value and the counts
+        are gathered and summed across samples as array operations.
+
+        :param genes: Chunk of parsed genes, updated in place
+        """
+        rows = [
+            index
+            for index, gene in enumerate(genes)
+            if gene.outputs and gene.format.startswith("GT")
+        ]
+        if not rows:
+            return
+
+        n_samples = max(len(genes[index].outputs) for index in rows)
+        matrix = np.full((len(rows), n_samples), ".", dtype=object)
+        for row, index in enumerate(rows):
+            values = list(genes[index].outputs.values())
+            matrix[row, : len(values)] = values
+
+        # GT is always the first FORMAT key
+        genotypes = np.char.partition(matrix.astype(str), ":")[..., 0]
+        distinct, inverse = np.unique(genotypes, return_inverse=True)
+        table = np.array(
+            [self._genotype_row(genotype) for genotype in distinct], dtype=np.int64
+        )
+        counts = table[inverse.reshape(genotypes.shape)].sum(axis=1)
+
+        allele_number = counts[:, self.CALLED_ALLELES]
+        allele_count = counts[:, self.ALT_ALLELES]
+        missing = counts[:, self.MISSING]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            frequency = np.where(
+                allele_number > 0, allele_count / allele_number, np.nan
+            )
+        call_rate = (n_samples - missing) / n_samples
+
+        for row, index in enumerate(rows):
+            gene = genes[index]
+            gene.allele_count = int(allele_count[row])
+            gene.allele_number = int(allele_number[row])
+            gene.allele_frequency = (
+                None if np.isnan(frequency[row]) else float(frequency[row])
+            )
+            gene.het_count = int(counts[row, self.HET])
+            gene.hom_alt_count = int(counts[row, self.HOM_ALT])
+            gene.missing_count = int(missing[row])
+            gene.call_rate = float(call_rate[row])
@@ -1,7 +1,8 @@
 import logging
 import mmap
-from typing import List, AsyncGenerator
+from typing import List, AsyncGenerator, Optional, Tuple
 from app.models.gene import GeneCreate
+from app.utils.metrics import PARSE_ERRORS
 
 # Logging Configuration
 logging.basicConfig(level=logging.INFO)
@@ -14,6 +15,33 @@ class VCFParserService:
     def __init__(self, chunk_size=1000):
         self.chunk_size = chunk_size
 
+    def read_header(
+        self, filepath: str, end_offset: Optional[int] = None
+    ) -> Optional[Tuple[List[str], int]]:
+        """
+        Read the VCF header.
+
+        :param filepath: Path to the VCF file
+        :param end_offset: Number of bytes of the file already available
+        :return: Sample names and the byte offset of the first data line, or
+            None if the header is not complete within end_offset
+        """
+        sample_names = []
+        with open(filepath, "rb") as f:
+            offset = 0
+            for raw_line in f:
+                if end_offset is not None and (
+                    offset + len(raw_line) > end_offset or not raw_line.endswith(b"\n")
+                ):
+                    return None
+                if not raw_line.startswith(b"#"):
+                    break
+                if raw_line.startswith(b"#CHROM"):
+                    # Extract sample names from header line
+                    sample_names = raw_line.decode("utf-8").strip().split("\t")[9:]
+                offset += len(raw_line)
+        return sample_names, offset
+
     async def parse_vcf(
         self,
         filepath: str,
@@ -22,33 +50,60 @@ class VCFParserService:
         Asynchronous generator to parse VCF file and yield gene chunks.
 
         :param filepath: Path to the VCF file
-        :param file_record: Metadata about the research file
         :yields: Chunks of parsed genes
         """
+        async for genes, _ in self.parse_vcf_with_offsets(filepath):
+            yield genes
+
+    async def parse_vcf_with_offsets(
+        self,
+        filepath: str,
+        start_offset: Optional[int] = None,
+        sample_names: Optional[List[str]] = None,
+        end_offset: Optional[int] = None,
+    ) -> AsyncGenerator[Tuple[List[GeneCreate], int], None]:
+        """
+        Parse a VCF file and yield gene chunks with the byte offset where the
+        next chunk starts, so an interrupted ingest can resume from there.
+
+        :param filepath: Path to the VCF file
+        :param start_offset: Offset of a data line to start from; None reads
+            the header first
+        :param sample_names: Sample names when resuming past the header
+        :param end_offset: Stop before the first line not complete within this
+            many bytes, for files that are still being written
+        :yields: (chunk of parsed genes, offset after the chunk)
+        """
+        if start_offset is None:
+            sample_names, start_offset = self.read_header(filepath)
+        sample_names = sample_names or []
         genes = []
 
         try:
             with open(filepath, "rb") as f:
                 mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
-
-                # Skip metadata lines
-                line = mm.readline().decode("utf-8")
-                sample_names = []
-                while line.startswith("#"):
-                    if line.startswith("#CHROM"):
-                        # Extract sample names from header line
-                        sample_names = line.strip().split("\t")[9:]
-                    line = mm.readline().decode("utf-8")
-
-                while line:
-                    if not line.strip():
-                        line = mm.readline().decode("utf-8")
+                mm.seek(start_offset)
+                line_start = start_offset
+                raw_line = mm.readline()
+
+                while raw_line:
+                    if end_offset is not None and (
+                        mm.tell() > end_offset or not raw_line.endswith(b"\n")
+                    ):
+                        # The rest of the line has not been written yet
+                        break
+                    line = raw_line.decode("utf-8")
+                    if not line.strip() or line.startswith("#"):
+                        line_start = mm.tell()
+                        raw_line = mm.readline()
                         continue
 
                     fields = line.strip().split("\t")
                     if len(fields) < 8:
+                        PARSE_ERRORS.inc()
                         logger.warning(f"Incorrect line format: {line.strip()}")
-                        line = mm.readline().decode("utf-8")
+                        line_start = mm.tell()
+                        raw_line = mm.readline()
                         continue
 
                     try:
@@ -65,7 +120,7 @@ class VCFParserService:
                             id=id_ if id_ != "." else "",
                             reference=ref,
                             alternate=alt,
-                            quality=float(qual) if qual != "." else 0.0,
+                            quality=float(qual) if qual != "." else None,
                             filter_status=(
                                 filter_status if filter_status != "." else "PASS"
                             ),
@@ -75,19 +130,21 @@ class VCFParserService:
                         )
                         genes.append(gene)
 
-                        if len(genes) >= self.chunk_size:
-                            yield genes
-                            genes = []
-
                     except (ValueError, IndexError) as e:
+                        PARSE_ERRORS.inc()
                         logger.warning(
                             f"Error processing line: {line.strip()} - {str(e)}"
                         )
 
-                    line = mm.readline().decode("utf-8")
+                    if len(genes) >= self.chunk_size:
+                        yield genes, mm.tell()
+                        genes = []
+
+                    line_start = mm.tell()
+                    raw_line = mm.readline()
 
                 if genes:
-                    yield genes
+                    yield genes, line_start
 
         except Exception as e:
             logger.error(f"Error reading VCF file: {str(e)}")
@@ -0,0 +1,150 @@
+import bisect
+from typing import Dict, List
+from app.models.gene import GeneCreate
+
+# Upper edges of the QUAL histogram bins; the last bin is open-ended
+QUAL_BIN_EDGES = [10, 20, 30, 40, 50, 60, 80, 100, 200, 500, 1000]
+
+
+class VariantStatsService:
+    """Accumulates per-file variant statistics as chunks stream through ingest."""
+
+    def __init__(self):
+        self.total = 0
+        self.by_chromosome: Dict[str, int] = {}
+        self.by_filter: Dict[str, int] = {}
+        self.variant_types = {
+            "snp": 0,
+            "mnp": 0,
+            "insertion": 0,
+            "deletion": 0,
+            "complex": 0,
+            "other": 0,
+        }
+        self.multiallelic = 0
+        self.qual_histogram = [0] * (len(QUAL_BIN_EDGES) + 1)
+        self.qual_min = None
+        self.qual_max = None
+        self.qual_sum = 0.0
+        # QUAL "." has no value and stays out of min, max, mean and histogram
+        self.qual_missing = 0
+
+    @staticmethod
+    def classify(reference: str, alternate: str) -> str:
+        """
+        Classify a variant by comparing REF against each ALT allele.
+
+        :return: snp, mnp, insertion, deletion, complex or other
+        """
+        kinds = set()
+        for alt in alternate.split(","):
+            if not alt or alt in (".", "*") or alt[0] in "<[]" or alt[-1] in "[]":
+                # Missing, symbolic and breakend alleles
+                kinds.add("other")
+            elif len(alt) == len(reference):
+                kinds.add("snp" if len(alt) == 1 else "mnp")
+            elif len(alt) > len(reference):
+                kinds.add("insertion")
+            else:
+                kinds.add("deletion")
+        if len(kinds) == 1:
+            return kinds.pop()
+        return "complex"
+
+    def add_chunk(self, genes: List[GeneCreate]):
+        """Update the statistics with a parsed chunk."""
+        by_chromosome = self.by_chromosome
+        by_filter = self.by_filter
+        variant_types = self.variant_types
+        histogram = self.qual_histogram
+
+        for gene in genes:
+            by_chromosome[gene.chromosome] = by_chromosome.get(gene.chromosome, 0) + 1
+            by_filter[gene.filter_status] = by_filter.get(gene.filter_status, 0) + 1
+            variant_types[self.classify(gene.reference, gene.alternate)] += 1
+            if "," in gene.alternate:
+                self.multiallelic += 1
+
+            quality = gene.quality
+            if quality is None:
+                self.qual_missing += 1
+                continue
+            histogram[bisect.bisect_right(QUAL_BIN_EDGES, quality)] += 1
+            self.qual_sum += quality
+            if self.qual_min is None or quality < self.qual_min:
+                self.qual_min = quality
+            if self.qual_max is None or quality > self.qual_max:
+                self.qual_max = quality
+
+        self.total += len(genes)
+
+    def to_dict(self) -> dict:
+        """
+        Serialize the statistics for storage in MongoDB.
+
+        Chromosome and filter names go in lists instead of document keys,
+        since they may contain dots.
+        """
+        qual_count = self.total - self.qual_missing
+        lower_edges = [0] + QUAL_BIN_EDGES
+        upper_edges = QUAL_BIN_EDGES + [None]
+        return {
+            "total_variants": self.total,
+            "by_chromosome": [
+                {"chromosome": chrom, "count": count}
+                for chrom, count in self.by_chromosome.items()
+            ],
+            "by_filter": [
+                {"filter_status": status, "count": count}
+                for status, count in sorted(
+                    self.by_filter.items(), key=lambda item: -item[1]
+                )
+            ],
+            "variant_types": dict(self.variant_types),
+            "multiallelic": self.multiallelic,
+            "quality": {
+                "min": self.qual_min,
+                "max": self.qual_max,
+                "mean": self.qual_sum / qual_count if qual_count else None,
+                "missing": self.qual_missing,
+                "histogram": [
+                    {"min": low, "max": high, "count": count}
+                    for low, high, count in zip(
+                        lower_edges, upper_edges, self.qual_histogram
+                    )
+                ],
+            },
+        }
+
+    def to_state(self) -> dict:
+        """Serialize the running accumulators so an interrupted ingest can resume."""
+        return {
+            "total": self.total,
+            "by_chromosome": [[key, count] for key, count in self.by_chromosome.items()],
+            "by_filter": [[key, count] for key, count in self.by_filter.items()],
+            "variant_types": dict(self.variant_types),
+            "multiallelic": self.multiallelic,
+            "qual_histogram": list(self.qual_histogram),
+            "qual_min": self.qual_min,
+            "qual_max": self.qual_max,
+            "qual_sum": self.qual_sum,
+            "qual_missing": self.qual_missing,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "VariantStatsService":
+        """Rebuild the accumulators saved by to_state."""
+        stats = cls()
+        if not state:
+            return stats
+        stats.total = state["total"]
+        stats.by_chromosome = {key: count for key, count in state["by_chromosome"]}
+        stats.by_filter = {key: count for key, count in state["by_filter"]}
+        stats.variant_types.update(state["variant_types"])
+        stats.multiallelic = state["multiallelic"]
+        stats.qual_histogram = list(state["qual_histogram"])
+        stats.qual_min = state["qual_min"]
+        stats.qual_max = state["qual_max"]
+        stats.qual_sum = state["qual_sum"]
+        stats.qual_missing = state.get("qual_missing", 0)
+        return stats
@@ -0,0 +1,143 @@
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Buckets en segundos para operaciones cortas (peticiones, búsquedas, lotes)
+FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+# Buckets en segundos para etapas largas de ingesta (guardado, parseo, índices)
+SLOW_BUCKETS = (0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Duración de las peticiones HTTP",
+    ["method", "route", "status"],
+    buckets=FAST_BUCKETS,
+)
+UPLOAD_SAVE_SECONDS = Histogram(
+    "upload_save_seconds",
+    "Tiempo de guardado en disco de un archivo subido",
+    buckets=SLOW_BUCKETS,
+)
+PARSE_SECONDS = Histogram(
+    "vcf_parse_seconds",
+    "Tiempo de parseo de un archivo VCF (sin contar inserciones)",
+    buckets=SLOW_BUCKETS,
+)
+INSERT_BATCH_SECONDS = Histogram(
+    "insert_batch_seconds",
+    "Latencia de inserción de un lote de variantes",
+    buckets=FAST_BUCKETS,
+)
+INDEX_BUILD_SECONDS = Histogram(
+    "index_build_seconds",
+    "Tiempo de creación de índices de una colección",
+    buckets=SLOW_BUCKETS,
+)
+# Sin etiqueta de colección: cada carga crea una nueva y las series no se
+# eliminan nunca de los archivos de métricas de los workers
+SEARCH_SECONDS = Histogram(
+    "search_latency_seconds",
+    "Latencia de búsqueda de genes por endpoint (search, ids)",
+    ["endpoint"],
+    buckets=FAST_BUCKETS,
+)
+RECORDS_INGESTED = Counter(
+    "records_ingested_total", "Registros de variantes insertados"
+)
+PARSE_ERRORS = Counter(
+    "vcf_parse_errors_total", "Líneas VCF descartadas por errores de formato"
+)
+SNAPSHOT_SEARCHES = Counter(
+    "snapshot_searches_total",
+    "Búsquedas en colecciones con snapshot, resueltas en él o en MongoDB",
+    ["outcome"],
+)
+INGEST_THROTTLE_SECONDS = Counter(
+    "ingest_throttle_seconds_total",
+    "Pausas de las inserciones para dar paso a las búsquedas",
+)
+AUTH_OPERATIONS = Counter(
+    "auth_operations_total",
+    "Operaciones de autenticación",
+    ["operation", "outcome"],
+)
+
+
+class LatencyEWMA:
+    """
+    Exponentially weighted moving average of a latency. With no new samples
+    the average decays towards zero, so an idle service reads as fast.
+    """
+
+    def __init__(self, alpha=0.2, half_life=10.0):
+        self.alpha = alpha
+        self.half_life = half_life
+        self.average = 0.0
+        self.updated = None
+
+    def observe(self, seconds):
+        if self.updated is None:
+            self.average = seconds
+        else:
+            self.average = self.value() + self.alpha * (seconds - self.value())
+        self.updated = time.monotonic()
+
+    def value(self):
+        if self.updated is None:
+            return 0.0
+        idle = time.monotonic() - self.updated
+        return self.average * 0.5 ** (idle / self.half_life)
+
+
+# Latencia de búsqueda de este proceso, usada para frenar las inserciones
+SEARCH_LATENCY = LatencyEWMA()
+
+
+def render_metrics():
+    """Serializar las métricas en formato de texto de Prometheus"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Con varios workers se agregan los valores de todos los procesos
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+class RequestTimingMiddleware:
+    """Middleware ASGI que registra la duración de cada petición HTTP."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Usar la plantilla de la ruta para no crear una serie por URL
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.labels(
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                str(status),
+            ).observe(time.perf_counter() - start)
@@ -0,0 +1,82 @@
+"""
+Shared setup for benchmarks: settings defaults and database selection.
+
+App modules read their configuration at import time, so ``configure_settings``
+must run before anything under ``app`` is imported.
+"""
+import os
+from typing import Optional
+
+BENCH_DATABASE = "gene_search_bench"
+
+
+def configure_settings(
+    mongo_url: Optional[str],
+    database: str = BENCH_DATABASE,
+    schema: Optional[str] = None,
+    layout: Optional[str] = None,
+):
+    """Fill in the settings the app requires, without overriding real env vars."""
+    defaults = {
+        "MONGODB_URL": mongo_url or "mongodb://localhost:27017",
+        "MONGODB_DATABASE": database,
+        "SECRET_KEY": "benchmark",
+        "RABBITMQ_HOST": "localhost",
+        "RABBITMQ_PORT": "5672",
+        "UPLOAD_FOLDER": "/tmp/research_files",
+        "SENDGRID": "benchmark",
+        "SENDGRID_EMAIL": "benchmark@example.com",
+        # Keep RabbitMQ and SendGrid out of benchmark runs
+        "SECURITY_KEY_PUBLISHER": "memory",
+    }
+    if mongo_url:
+        os.environ["MONGODB_URL"] = mongo_url
+    os.environ["MONGODB_DATABASE"] = database
+    if schema:
+        os.environ["VARIANT_SCHEMA"] = schema
+    if layout:
+        os.environ["VARIANT_STORAGE_LAYOUT"] = layout
+    if not mongo_url:
+        # mongomock-motor's with_options returns a synchronous collection
+        defaults["INGEST_BULK_LOAD"] = "false"
+    for key, value in defaults.items():
+        os.environ.setdefault(key, value)
+
+
+async def open_database(mongo_url: Optional[str]) -> str:
+    """
+    Point the app's shared client at a local mongod or an in-process stand-in.
+
+    :param mongo_url: URL of a running mongod; None uses mongomock-motor
+    :return: Name of the backend in use
+    """
+    from app.db.mongodb import AsyncMongoDB, connect_to_mongo
+    from app.config import settings
+
+    if mongo_url:
+        await connect_to_mongo()
+        await AsyncMongoDB.client.drop_database(settings.MONGODB_DATABASE)
+        return "mongod"
+
+    try:
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        raise SystemExit(
+            "No --mongo-url given and mongomock-motor is not installed "
+            "(pip install -r benchmarks/requirements.txt)"
+        )
+    AsyncMongoDB.client = AsyncMongoMockClient()
+    AsyncMongoDB.db = AsyncMongoDB.client[settings.MONGODB_DATABASE]
+    return "mongomock"
+
+
+async def close_database(backend: str):
+    from app.db.mongodb import AsyncMongoDB, close_mongo_connection
+    from app.config import settings
+
+    if backend == "mongod":
+        await AsyncMongoDB.client.drop_database(settings.MONGODB_DATABASE)
+        await close_mongo_connection()
+    else:
+        AsyncMongoDB.client = None
+        AsyncMongoDB.db = None
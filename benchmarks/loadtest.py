@@ -0,0 +1,315 @@
+"""
+HTTP load test for the auth and search endpoints.
+
+Seeds users through ``/users/register`` and a synthetic gene collection
+through ``/upload/upload``, logs every user in, then drives a weighted mix
+of endpoints at a target request rate from many concurrent async clients:
+
+- ``login``: ``POST /users/login`` (bcrypt and security-key publishing)
+- ``me``: ``GET /users/me`` (JWT and a user lookup)
+- ``search``: ``GET /search/`` (JWT and a gene search)
+
+Requests are scheduled open-loop: latency is measured from the scheduled
+send time, so a stalled server shows up as latency instead of as a lower
+request rate. Reports throughput, latency percentiles and error rates per
+endpoint as JSON.
+
+Without --base-url the app runs in-process behind httpx with an in-memory
+MongoDB and the in-memory security-key publisher instead of RabbitMQ and
+SendGrid; the report then includes event-loop lag, which exposes blocking
+calls in request handlers. The in-memory MongoDB itself runs queries on the
+event loop, so use --mongo-url when the lag figures matter. With
+--base-url, start the server with
+SECURITY_KEY_PUBLISHER=memory to leave RabbitMQ and SendGrid out of it.
+
+Usage:
+    python -m benchmarks.loadtest --rps 100 --duration 30 --clients 64 \\
+        --mix login=1,me=4,search=10 --output load.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.environment import configure_settings, open_database, close_database
+from benchmarks.run_benchmarks import SEARCH_TERMS, git_commit, percentile
+from benchmarks.vcf_generator import generate_vcf
+
+SEARCH_FILTERS = ["quality>=30", "filter_status=PASS", "allele_frequency>=0.5"]
+PASSWORD = "LoadTest123!"
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(","):
+        name, _, weight = item.partition("=")
+        if name not in ("login", "me", "search"):
+            raise argparse.ArgumentTypeError(f"Unknown endpoint in mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+class LoopLagMonitor:
+    """Measures how late the event loop wakes up a periodic timer."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append((time.perf_counter() - start - self.interval) * 1000)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    def report(self):
+        return {
+            "p50_ms": percentile(self.samples, 50),
+            "p99_ms": percentile(self.samples, 99),
+            "max_ms": max(self.samples, default=0.0),
+        }
+
+
+async def seed(client, users, records, samples, seed_value):
+    """Register users, upload a gene collection and log every user in."""
+    emails = [f"loadtest{i}@example.com" for i in range(users)]
+    for email in emails:
+        response = await client.post(
+            "/users/register", json={"username": email, "password": PASSWORD}
+        )
+        # 400 means the user already exists from an earlier run
+        if response.status_code not in (200, 400):
+            response.raise_for_status()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        vcf_path = os.path.join(workdir, "loadtest.vcf")
+        generate_vcf(vcf_path, records=records, samples=samples, seed=seed_value)
+        with open(vcf_path, "rb") as handle:
+            response = await client.post(
+                "/upload/upload", files={"file": ("loadtest.vcf", handle)}
+            )
+        response.raise_for_status()
+    collection_name = response.json()["collection_name"]
+
+    tokens = {}
+    for email in emails:
+        response = await client.post(
+            "/users/login", data={"username": email, "password": PASSWORD}
+        )
+        response.raise_for_status()
+        tokens[email] = response.json()["access_token"]
+    return collection_name, tokens
+
+
+def build_request(endpoint, rng, tokens, collection_name, per_page):
+    email = rng.choice(list(tokens))
+    if endpoint == "login":
+        return "POST", "/users/login", {
+            "data": {"username": email, "password": PASSWORD}
+        }
+    headers = {"Authorization": f"Bearer {tokens[email]}"}
+    if endpoint == "me":
+        return "GET", "/users/me", {"headers": headers}
+
+    params = {"collection_name": collection_name, "per_page": per_page}
+    if rng.random() < 0.5:
+        params["search"] = rng.choice(SEARCH_TERMS)
+    else:
+        params["filter"] = rng.choice(SEARCH_FILTERS)
+    return "GET", "/search/", {"headers": headers, "params": params}
+
+
+async def drive(client, args, tokens, collection_name):
+    """Send the endpoint mix at the target rate and collect per-request results."""
+    rng = random.Random(args.seed)
+    endpoints, weights = zip(*args.mix.items())
+    queue = asyncio.Queue()
+    results = []
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            endpoint, scheduled, method, url, options = item
+            sent = time.perf_counter()
+            try:
+                response = await client.request(method, url, **options)
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            done = time.perf_counter()
+            results.append(
+                {
+                    "endpoint": endpoint,
+                    "status": status,
+                    "latency_ms": (done - scheduled) * 1000,
+                    "service_ms": (done - sent) * 1000,
+                    "done": done,
+                }
+            )
+
+    workers = [asyncio.create_task(worker()) for _ in range(args.clients)]
+    start = time.perf_counter()
+    total = int(args.rps * args.duration)
+    for number in range(total):
+        scheduled = start + number / args.rps
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        endpoint = rng.choices(endpoints, weights)[0]
+        method, url, options = build_request(
+            endpoint, rng, tokens, collection_name, args.per_page
+        )
+        queue.put_nowait((endpoint, scheduled, method, url, options))
+    for _ in workers:
+        queue.put_nowait(None)
+    await asyncio.gather(*workers)
+    return results, start, time.perf_counter()
+
+
+def summarize(results, start, end):
+    elapsed = end - start
+
+    def stats(items):
+        errors = [
+            item
+            for item in items
+            if not (isinstance(item["status"], int) and item["status"] < 400)
+        ]
+        latencies = [item["latency_ms"] for item in items]
+        service = [item["service_ms"] for item in items]
+        return {
+            "requests": len(items),
+            "errors": len(errors),
+            "error_rate": len(errors) / len(items) if items else 0.0,
+            "error_statuses": sorted({str(item["status"]) for item in errors}),
+            "throughput_rps": len(items) / elapsed if elapsed else 0.0,
+            "latency_p50_ms": percentile(latencies, 50),
+            "latency_p90_ms": percentile(latencies, 90),
+            "latency_p99_ms": percentile(latencies, 99),
+            "latency_max_ms": max(latencies, default=0.0),
+            "service_p50_ms": percentile(service, 50),
+            "service_p99_ms": percentile(service, 99),
+        }
+
+    report = {"overall": stats(results), "endpoints": {}}
+    for endpoint in sorted({item["endpoint"] for item in results}):
+        report["endpoints"][endpoint] = stats(
+            [item for item in results if item["endpoint"] == endpoint]
+        )
+    return report
+
+
+async def run(args):
+    lag = None
+    backend = None
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout)
+        lifespan = None
+    else:
+        backend = await open_database(args.mongo_url)
+        from app.main import app
+
+        lifespan = app.router.lifespan_context(app)
+        await lifespan.__aenter__()
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://loadtest",
+            timeout=args.timeout,
+        )
+        lag = LoopLagMonitor()
+
+    try:
+        collection_name, tokens = await seed(
+            client, args.users, args.records, args.samples, args.seed
+        )
+        if lag is not None:
+            lag.start()
+        results, start, end = await drive(client, args, tokens, collection_name)
+        if lag is not None:
+            await lag.stop()
+    finally:
+        await client.aclose()
+        if lifespan is not None:
+            await lifespan.__aexit__(None, None, None)
+        if backend is not None:
+            await close_database(backend)
+
+    # Requests completed during the warm-up window are not reported
+    measured = [item for item in results if item["done"] - start >= args.warmup]
+    report = summarize(measured, start + args.warmup, end)
+    if lag is not None:
+        report["event_loop_lag"] = lag.report()
+    return {
+        "timestamp": datetime.now(tz=timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "target": args.base_url or f"in-process ({backend})",
+        "params": {
+            "rps": args.rps,
+            "duration": args.duration,
+            "warmup": args.warmup,
+            "clients": args.clients,
+            "mix": args.mix,
+            "users": args.users,
+            "records": args.records,
+            "per_page": args.per_page,
+            "seed": args.seed,
+        },
+        "results": report,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP load test for auth and search")
+    parser.add_argument("--base-url", help="Running server to test; defaults to in-process")
+    parser.add_argument(
+        "--mongo-url", help="Local mongod for in-process runs; defaults to an in-memory stand-in"
+    )
+    parser.add_argument("--rps", type=float, default=50.0, help="Target requests per second")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of load")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Seconds excluded from results")
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent connections")
+    parser.add_argument(
+        "--mix", type=parse_mix, default=parse_mix("login=1,me=4,search=10"),
+        help="Endpoint weights, e.g. login=1,me=4,search=10",
+    )
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--records", type=int, default=20000)
+    parser.add_argument("--samples", type=int, default=4)
+    parser.add_argument("--per-page", type=int, default=25)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="JSON file to write results to")
+    args = parser.parse_args()
+
+    if not args.base_url:
+        configure_settings(args.mongo_url)
+    report = asyncio.run(run(args))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as out:
+            out.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+Ingest and search benchmarks.
+
+Generates a synthetic VCF, then measures:
+
+- ``parse``: VCFParserService.parse_vcf records per second
+- ``ingest``: FileProcessorService.process_file end-to-end records per second,
+  with the time spent inserting versus building indexes afterwards
+- ``search``: GeneSearchService.search p50/p99 latency
+- ``storage``: bytes per variant document and, on a real mongod, collection
+  and index sizes (compare --schema full against --schema compact)
+
+Results are written as JSON so runs can be compared over time.
+
+Usage:
+    python -m benchmarks.run_benchmarks --records 200000 --samples 20 \\
+        --mongo-url mongodb://localhost:27017 --output results.json
+
+Without --mongo-url an in-process mongomock-motor stand-in is used.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.environment import configure_settings, open_database, close_database
+from benchmarks.vcf_generator import CHROMOSOMES, generate_vcf
+
+SEARCH_TERMS = CHROMOSOMES[:5] + ["PASS", "LowQual", "F0=1", "GT:DP"]
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def bench_parse(vcf_path, chunk_size):
+    from app.utils.VCFParserService import VCFParserService
+
+    parser = VCFParserService(chunk_size=chunk_size)
+    records = 0
+    start = time.perf_counter()
+    async for chunk in parser.parse_vcf(vcf_path):
+        records += len(chunk)
+    elapsed = time.perf_counter() - start
+    return {
+        "records": records,
+        "seconds": elapsed,
+        "records_per_sec": records / elapsed if elapsed else 0.0,
+    }
+
+
+async def bench_ingest(vcf_path):
+    from fastapi import UploadFile
+    from app.services.file_processor import FileProcessorService
+    from app.db.mongodb import get_async_database
+
+    processor = FileProcessorService()
+    with open(vcf_path, "rb") as handle:
+        upload = UploadFile(file=handle, filename=os.path.basename(vcf_path))
+        start = time.perf_counter()
+        result = await processor.process_file(upload)
+        elapsed = time.perf_counter() - start
+
+    if result["status"] != "success":
+        raise RuntimeError(f"Ingest failed: {result['message']}")
+
+    # Indexes build in the background after process_file returns
+    database = get_async_database()
+    while True:
+        record = await database.uploaded_files.find_one(
+            {}, sort=[("upload_time", -1)]
+        )
+        if record.get("index_status") != "building":
+            break
+        await asyncio.sleep(0.1)
+    indexed = time.perf_counter() - start
+
+    total = result["data"]["total_genes"]
+    timings = record.get("timings", {})
+    return record["collection_name"], {
+        "records": total,
+        "seconds": elapsed,
+        "records_per_sec": total / elapsed if elapsed else 0.0,
+        "file_bytes": os.path.getsize(vcf_path),
+        "parse_seconds": timings.get("parse_seconds"),
+        "insert_seconds": timings.get("insert_seconds"),
+        "index_seconds": timings.get("index_seconds"),
+        "seconds_until_indexed": indexed,
+        "index_status": record.get("index_status"),
+    }
+
+
+async def bench_storage(collection_name, backend, sample_size=1000):
+    import bson
+    from app.db.mongodb import get_async_database
+    from app.db.variant_store import resolve_scope
+
+    database = get_async_database()
+    scope = await resolve_scope(database, collection_name)
+    sample = await scope.collection.find(scope.match({})).to_list(length=sample_size)
+    result = {
+        "schema": scope.codec.schema,
+        "layout": scope.layout,
+        "avg_document_bytes": (
+            sum(len(bson.encode(doc)) for doc in sample) / len(sample) if sample else 0
+        ),
+    }
+
+    if backend == "mongod":
+        stats = await database.command("collStats", scope.collection.name)
+        result.update(
+            {
+                "data_bytes": stats["size"],
+                "storage_bytes": stats["storageSize"],
+                "index_bytes": stats["totalIndexSize"],
+                "documents": stats["count"],
+            }
+        )
+        if stats["count"]:
+            per_million = 1_000_000 / stats["count"]
+            result["storage_mb_per_million"] = (
+                stats["storageSize"] * per_million / 2**20
+            )
+            result["working_set_mb_per_million"] = (
+                (stats["size"] + stats["totalIndexSize"]) * per_million / 2**20
+            )
+    return result
+
+
+async def bench_search(collection_name, iterations, per_page, concurrency, seed):
+    from app.models.gene import GeneSearchCriteria
+    from app.services.gene_search_service import GeneSearchService
+
+    rng = random.Random(seed)
+    service = GeneSearchService()
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_search():
+        criteria = GeneSearchCriteria(search=rng.choice(SEARCH_TERMS))
+        async with semaphore:
+            start = time.perf_counter()
+            await service.search(
+                criteria=criteria, per_page=per_page, collection_name=collection_name
+            )
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_search() for _ in range(iterations)))
+    elapsed = time.perf_counter() - start
+    return {
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "per_page": per_page,
+        "p50_ms": percentile(latencies, 50),
+        "p99_ms": percentile(latencies, 99),
+        "mean_ms": sum(latencies) / len(latencies) if latencies else 0.0,
+        "searches_per_sec": iterations / elapsed if elapsed else 0.0,
+    }
+
+
+async def run(args):
+    backend = await open_database(args.mongo_url)
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            vcf_path = os.path.join(workdir, "synthetic.vcf")
+            start = time.perf_counter()
+            generate_vcf(
+                vcf_path,
+                records=args.records,
+                samples=args.samples,
+                info_fields=args.info_fields,
+                seed=args.seed,
+            )
+            generation_seconds = time.perf_counter() - start
+
+            results = {"parse": await bench_parse(vcf_path, args.chunk_size)}
+            collection_name, results["ingest"] = await bench_ingest(vcf_path)
+            results["storage"] = await bench_storage(collection_name, backend)
+            results["search"] = await bench_search(
+                collection_name,
+                args.search_iterations,
+                args.per_page,
+                args.concurrency,
+                args.seed,
+            )
+    finally:
+        await close_database(backend)
+
+    return {
+        "timestamp": datetime.now(tz=timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "environment": {
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "backend": backend,
+        },
+        "params": {
+            "records": args.records,
+            "samples": args.samples,
+            "info_fields": args.info_fields,
+            "chunk_size": args.chunk_size,
+            "seed": args.seed,
+            "generation_seconds": generation_seconds,
+        },
+        "results": results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest and search benchmarks")
+    parser.add_argument("--records", type=int, default=50000)
+    parser.add_argument("--samples", type=int, default=4)
+    parser.add_argument("--info-fields", type=int, default=3)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--search-iterations", type=int, default=200)
+    parser.add_argument("--per-page", type=int, default=25)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--mongo-url", help="Local mongod to use; defaults to an in-process stand-in"
+    )
+    parser.add_argument("--schema", choices=["full", "compact"], help="Variant schema")
+    parser.add_argument(
+        "--layout", choices=["per_collection", "consolidated"], help="Storage layout"
+    )
+    parser.add_argument("--output", help="JSON file to write results to")
+    args = parser.parse_args()
+
+    configure_settings(args.mongo_url, schema=args.schema, layout=args.layout)
+    report = asyncio.run(run(args))
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as out:
+            out.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Synthetic VCF generator for benchmarks.
+
+Produces VCF 4.2 files with a configurable number of records, samples and
+INFO fields. Output is deterministic for a given seed so runs can be
+compared over time.
+
+Usage: python -m benchmarks.vcf_generator out.vcf --records 100000 --samples 10
+"""
+import argparse
+import random
+from typing import List
+
+BASES = "ACGT"
+FILTERS = ["PASS", "PASS", "PASS", "PASS", "LowQual", "q10"]
+GENOTYPES = ["0/0", "0/0", "0/1", "0/1", "1/1", "./.", "0|1", "1|0"]
+# Grapevine (Vitis vinifera) has 19 chromosomes
+CHROMOSOMES = [f"chr{i:02d}" for i in range(1, 20)]
+
+
+def _random_allele(rng: random.Random, max_len: int) -> str:
+    return "".join(rng.choice(BASES) for _ in range(rng.randint(1, max_len)))
+
+
+def _header(sample_names: List[str], info_fields: int) -> List[str]:
+    lines = ["##fileformat=VCFv4.2", "##source=benchmarks.vcf_generator"]
+    for chrom in CHROMOSOMES:
+        lines.append(f"##contig=<ID={chrom}>")
+    for i in range(info_fields):
+        lines.append(
+            f'##INFO=<ID=F{i},Number=1,Type=Integer,Description="Synthetic field {i}">'
+        )
+    lines += [
+        '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">',
+        '##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Read depth">',
+        '##FORMAT=<ID=GQ,Number=1,Type=Integer,Description="Genotype quality">',
+        "\t".join(
+            ["#CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO", "FORMAT"]
+            + sample_names
+        ),
+    ]
+    return lines
+
+
+def generate_vcf(
+    path: str,
+    records: int = 10000,
+    samples: int = 4,
+    info_fields: int = 3,
+    indel_rate: float = 0.1,
+    seed: int = 42,
+) -> str:
+    """
+    Write a synthetic VCF file.
+
+    :param path: Destination path
+    :param records: Number of variant records
+    :param samples: Number of sample columns
+    :param info_fields: Number of key=value pairs in each INFO column
+    :param indel_rate: Fraction of records that are insertions or deletions
+    :param seed: Random seed
+    :return: The destination path
+    """
+    rng = random.Random(seed)
+    sample_names = [f"SAMPLE{i:04d}" for i in range(samples)]
+    per_chrom = max(records // len(CHROMOSOMES), 1)
+
+    with open(path, "w", buffering=1024 * 1024) as out:
+        out.write("\n".join(_header(sample_names, info_fields)) + "\n")
+
+        batch = []
+        current_chrom = None
+        for n in range(records):
+            chrom = CHROMOSOMES[min(n // per_chrom, len(CHROMOSOMES) - 1)]
+            if chrom != current_chrom:
+                current_chrom, position = chrom, 0
+            position += rng.randint(1, 400)
+
+            ref = rng.choice(BASES)
+            alt = rng.choice(BASES.replace(ref, ""))
+            if rng.random() < indel_rate:
+                if rng.random() < 0.5:
+                    alt = ref + _random_allele(rng, 6)
+                else:
+                    ref = ref + _random_allele(rng, 6)
+
+            variant_id = f"rs{n + 1}" if rng.random() < 0.7 else "."
+            qual = f"{rng.uniform(1, 1000):.1f}"
+            info = ";".join(f"F{i}={rng.randint(0, 500)}" for i in range(info_fields))
+            sample_values = [
+                f"{rng.choice(GENOTYPES)}:{rng.randint(0, 80)}:{rng.randint(0, 99)}"
+                for _ in range(samples)
+            ]
+            batch.append(
+                "\t".join(
+                    [
+                        chrom,
+                        str(position),
+                        variant_id,
+                        ref,
+                        alt,
+                        qual,
+                        rng.choice(FILTERS),
+                        info or ".",
+                        "GT:DP:GQ",
+                    ]
+                    + sample_values
+                )
+            )
+            if len(batch) >= 10000:
+                out.write("\n".join(batch) + "\n")
+                batch = []
+
+        if batch:
+            out.write("\n".join(batch) + "\n")
+
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic VCF file")
+    parser.add_argument("path", help="Output file")
+    parser.add_argument("--records", type=int, default=10000)
+    parser.add_argument("--samples", type=int, default=4)
+    parser.add_argument("--info-fields", type=int, default=3)
+    parser.add_argument("--indel-rate", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    generate_vcf(
+        args.path,
+        records=args.records,
+        samples=args.samples,
+        info_fields=args.info_fields,
+        indel_rate=args.indel_rate,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
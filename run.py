@@ -1,22 +1,19 @@
 import threading
 import uvicorn
-import asyncio
+from app.config import settings
 from app.services.security_key_consumer import start_consumer
 
 
-def run_consumer():
-    asyncio.run(start_consumer())
+def main():
+    # Iniciar el consumidor en un hilo demonio (no hace falta con el publicador en memoria)
+    if settings.SECURITY_KEY_PUBLISHER == "rabbitmq":
+        consumer_thread = threading.Thread(target=start_consumer)
+        consumer_thread.daemon = True  # Establecer el hilo como demonio
+        consumer_thread.start()
 
-
-async def main():
-    # Iniciar el consumidor en un hilo demonio
-    consumer_thread = threading.Thread(target=run_consumer)
-    consumer_thread.daemon = True  # Establecer el hilo como demonio
-    consumer_thread.start()
-
-    # Iniciar el servidor Uvicorn
+    # Iniciar el servidor Uvicorn en modo desarrollo (ver serve.py para producción)
     uvicorn.run("app.main:app", reload=True)
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()
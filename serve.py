@@ -0,0 +1,153 @@
+"""
+Punto de entrada de producción.
+
+Levanta un worker de uvicorn por CPU bajo gunicorn (con la aplicación
+precargada en el proceso maestro) y el consumidor de correos como un
+proceso supervisado aparte. Ante SIGTERM gunicorn deja de aceptar
+conexiones y espera hasta GRACEFUL_TIMEOUT segundos a que terminen las
+cargas y búsquedas en curso.
+
+Uso: python serve.py
+"""
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import threading
+import time
+
+from gunicorn.app.base import BaseApplication
+
+from app.config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def run_consumer():
+    """Proceso del consumidor: termina limpiamente con SIGTERM"""
+
+    def _stop(signum, frame):
+        raise SystemExit(0)
+
+    signal.signal(signal.SIGTERM, _stop)
+
+    from app.services.security_key_consumer import start_consumer
+
+    start_consumer()
+
+
+class ConsumerSupervisor:
+    """Mantiene vivo el proceso del consumidor, reiniciándolo con backoff."""
+
+    def __init__(self, min_delay=1.0, max_delay=30.0, stable_after=60.0):
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.stable_after = stable_after
+        self._context = multiprocessing.get_context("spawn")
+        self._stopping = threading.Event()
+        self._process = None
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._supervise, name="consumer-supervisor", daemon=True
+        )
+        self._thread.start()
+
+    def _supervise(self):
+        delay = self.min_delay
+        while not self._stopping.is_set():
+            self._process = self._context.Process(
+                target=run_consumer, name="security-key-consumer"
+            )
+            started = time.monotonic()
+            self._process.start()
+            logger.info(f"Consumidor de correos iniciado (pid {self._process.pid})")
+            self._process.join()
+            if self._stopping.is_set():
+                break
+
+            # Reiniciar con backoff exponencial si el proceso muere rápido
+            if time.monotonic() - started > self.stable_after:
+                delay = self.min_delay
+            logger.warning(
+                f"Consumidor terminó con código {self._process.exitcode}; "
+                f"reiniciando en {delay:.0f} s"
+            )
+            self._stopping.wait(delay)
+            delay = min(delay * 2, self.max_delay)
+
+    def stop(self, timeout=10.0):
+        self._stopping.set()
+        if self._process is not None and self._process.is_alive():
+            self._process.terminate()
+            self._process.join(timeout)
+            if self._process.is_alive():
+                self._process.kill()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+class GeneSearchApplication(BaseApplication):
+    """Aplicación gunicorn configurada desde settings."""
+
+    def __init__(self, options=None):
+        self.options = options or {}
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from app.main import app
+
+        return app
+
+
+def build_options(supervisor: ConsumerSupervisor) -> dict:
+    workers = settings.WEB_CONCURRENCY or multiprocessing.cpu_count()
+
+    def when_ready(server):
+        # Con el publicador en memoria no hay cola que consumir
+        if settings.SECURITY_KEY_PUBLISHER == "rabbitmq":
+            supervisor.start()
+
+    def on_exit(server):
+        supervisor.stop()
+
+    def child_exit(server, worker):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
+
+    return {
+        "bind": f"{settings.SERVER_HOST}:{settings.SERVER_PORT}",
+        "workers": workers,
+        "worker_class": "uvicorn.workers.UvicornWorker",
+        # Importar la aplicación una sola vez en el maestro y heredarla al hacer fork
+        "preload_app": True,
+        "graceful_timeout": settings.GRACEFUL_TIMEOUT,
+        # Las cargas de archivos grandes pueden tardar; el límite real es el drenaje
+        "timeout": 0,
+        "keepalive": 5,
+        "when_ready": when_ready,
+        "on_exit": on_exit,
+        "child_exit": child_exit,
+    }
+
+
+def prepare_metrics_dir():
+    """Directorio compartido para agregar las métricas de todos los workers"""
+    metrics_dir = os.environ.setdefault(
+        "PROMETHEUS_MULTIPROC_DIR", "/tmp/gene_search_metrics"
+    )
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+
+if __name__ == "__main__":
+    prepare_metrics_dir()
+    GeneSearchApplication(build_options(ConsumerSupervisor())).run()
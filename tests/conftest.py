@@ -0,0 +1,9 @@
+"""
+Settings for the unit tests.
+
+App modules read their configuration at import time, so the defaults are
+filled in here before any test module imports ``app``.
+"""
+from benchmarks.environment import configure_settings
+
+configure_settings(None, database="gene_search_test")
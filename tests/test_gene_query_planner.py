@@ -0,0 +1,136 @@
+import random
+from itertools import groupby
+
+import pytest
+
+from app.models.gene import FilterOperator, GeneSearchCriteria
+from app.services.gene_query_planner import GeneQueryPlanner, parse_predicate
+
+INDEXES = {
+    "_id_": [("_id", 1)],
+    "chromosome_index": [("chromosome", 1)],
+    "genomic_position_index": [("chromosome", 1), ("position", 1)],
+    "filter_status_index": [("filter_status", 1)],
+}
+
+
+def tie_heavy_documents(count=500, seed=7):
+    """Variants spread over few chromosomes, positions and qualities"""
+    rng = random.Random(seed)
+    return [
+        {
+            "_id": number,
+            "chromosome": rng.choice(["chr01", "chr02"]),
+            "position": rng.randint(1, 5),
+            "quality": rng.choice([10.0, 30.0, 60.0]),
+            "filter_status": rng.choice(["PASS", "LowQual"]),
+        }
+        for number in range(count)
+    ]
+
+
+def sort_documents(docs, sort):
+    """Order documents like $sort does, applying the keys from last to first"""
+    ordered = list(docs)
+    for key, direction in reversed(sort):
+        ordered.sort(key=lambda doc: doc[key], reverse=direction < 0)
+    return ordered
+
+
+def paginate(docs, sort, page_size, partitions=4):
+    """
+    Fetch every page as GeneSearchService.search does: each sub-query sees
+    the tied rows in its own arbitrary order before sorting.
+    """
+    pages = []
+    for skip in range(0, len(docs), page_size):
+        offset = skip
+        for number in range(partitions):
+            limit = page_size // partitions + (1 if number < page_size % partitions else 0)
+            shuffled = list(docs)
+            random.Random(skip * partitions + number).shuffle(shuffled)
+            pages += sort_documents(shuffled, sort)[offset : offset + limit]
+            offset += limit
+    return pages
+
+
+@pytest.mark.parametrize(
+    "criteria",
+    [
+        GeneSearchCriteria(sort_by="quality", sort_direction="desc"),
+        GeneSearchCriteria(sort_by="chromosome"),
+        GeneSearchCriteria(filters=[parse_predicate("chromosome=chr01")]),
+        GeneSearchCriteria(filters=[parse_predicate("filter_status in PASS,LowQual")]),
+        GeneSearchCriteria(),
+    ],
+)
+def test_sort_is_total_with_ties(criteria):
+    plan = GeneQueryPlanner().plan(criteria, INDEXES, document_count=500)
+    assert plan.sort[-1] == ("_id", 1)
+
+    docs = tie_heavy_documents()
+    keys = [tuple(doc[key] for key, _ in plan.sort) for doc in docs]
+    assert len(set(keys)) == len(docs)
+
+    pages = paginate(docs, plan.sort, page_size=25)
+    assert [doc["_id"] for doc in pages] == [
+        doc["_id"] for doc in sort_documents(docs, plan.sort)
+    ]
+
+
+def test_sort_by_single_field_without_tiebreak_repeats_rows():
+    docs = tie_heavy_documents()
+    pages = paginate(docs, [("quality", 1)], page_size=25)
+    assert len({doc["_id"] for doc in pages}) < len(docs)
+
+
+def test_index_order_keeps_index_keys_before_id():
+    criteria = GeneSearchCriteria(
+        filters=[parse_predicate("chromosome=chr01"), parse_predicate("position>=2")]
+    )
+    plan = GeneQueryPlanner().plan(criteria, INDEXES, document_count=500)
+    assert plan.hint == "genomic_position_index"
+    assert plan.sort == [("chromosome", 1), ("position", 1), ("_id", 1)]
+
+
+def test_sort_by_id_is_not_repeated():
+    plan = GeneQueryPlanner().plan(GeneSearchCriteria(), {"_id_": [("_id", 1)]}, 500)
+    assert plan.sort == [("_id", 1)]
+
+
+def test_unindexed_sort_on_large_collection_is_rejected():
+    planner = GeneQueryPlanner(unindexed_sort_limit=100)
+    with pytest.raises(ValueError):
+        planner.plan(GeneSearchCriteria(sort_by="quality"), INDEXES, document_count=500)
+
+
+@pytest.mark.parametrize(
+    "text, field, operator, value",
+    [
+        ("quality>=30", "quality", FilterOperator.GTE, 30.0),
+        ("position < 1000", "position", FilterOperator.LT, 1000),
+        ("filter_status=PASS", "filter_status", FilterOperator.EQ, "PASS"),
+        ("chromosome != chr02", "chromosome", FilterOperator.NE, "chr02"),
+        ("chromosome in chr01, chr02", "chromosome", FilterOperator.IN, ["chr01", "chr02"]),
+        ("position between 1000..5000", "position", FilterOperator.BETWEEN, [1000, 5000]),
+        ("position BETWEEN 1,5", "position", FilterOperator.BETWEEN, [1, 5]),
+    ],
+)
+def test_parse_predicate(text, field, operator, value):
+    predicate = parse_predicate(text)
+    assert (predicate.field, predicate.operator, predicate.value) == (field, operator, value)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "quality",
+        "outputs=1",
+        "position>=abc",
+        "chromosome in ,",
+        "position between 1..2..3",
+    ],
+)
+def test_parse_predicate_rejects_invalid_filters(text):
+    with pytest.raises(ValueError):
+        parse_predicate(text)